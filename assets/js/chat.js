@@ -114,8 +114,11 @@
             if (data.sources && data.sources.length > 0) {
                 responseText += '\n\n**Sources:**\n';
                 data.sources.forEach((source, idx) => {
-                    const confidence = Math.round(source.score * 100);
-                    responseText += `${idx + 1}. ${source.metadata.filename} (${confidence}% confidence)\n`;
+                    // Chunks found only by keyword search have no similarity score
+                    const match = source.score === null || source.score === undefined
+                        ? 'keyword match'
+                        : `${Math.round(source.score * 100)}% confidence`;
+                    responseText += `${idx + 1}. ${source.metadata.filename} (${match})\n`;
                 });
             }
             
@@ -2,25 +2,40 @@
 FastAPI RAG Backend Application
 Production-ready API for academic website chat system
 """
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, status
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from contextlib import asynccontextmanager
-from typing import List, Optional
-import hashlib
+from typing import Callable, List, Optional, Tuple, AsyncIterator
 from datetime import datetime
+import asyncio
+import hashlib
+import io
+import math
 import uuid
 import os
 import json
+import time
+import zipfile
 
 from config import settings
 from models import (
-    ChatRequest, ChatResponse, DocumentUploadResponse,
+    ChatRequest, ChatResponse, DocumentUploadResponse, BatchUploadResponse,
     DocumentListResponse, HealthResponse, ErrorResponse,
-    DocumentStatus, DocumentInfo, DocumentType
+    DocumentStatus, DocumentInfo, RetrievalResult
+)
+from services import (
+    DocumentProcessor, VectorStoreService, LLMService, AnswerCache,
+    DocumentRegistry, DocumentIndexer, Reranker, UploadQueue, RateLimiter, AdmissionLimiter
 )
-from services import DocumentProcessor, VectorStoreService, LLMService
+from services.backends import CircuitBreaker, CircuitOpenError, gemini_backend, pinecone_backend
+from services.rate_limiter import create_rate_limiter
 from utils.logger import get_logger
+from utils.metrics import HTTP_REQUEST_SECONDS, REQUESTS_IN_FLIGHT, render_metrics
+from utils.tracing import get_request_id, traced, tracer
 
 logger = get_logger(__name__)
 
@@ -30,32 +45,94 @@ logger = get_logger(__name__)
 doc_processor: Optional[DocumentProcessor] = None
 vector_store: Optional[VectorStoreService] = None
 llm_service: Optional[LLMService] = None
+answer_cache: Optional[AnswerCache] = None
+reranker: Optional[Reranker] = None
+indexer: Optional[DocumentIndexer] = None
+upload_queue: Optional[UploadQueue] = None
+rate_limiter: Optional[RateLimiter] = None
+chat_admission: Optional[AdmissionLimiter] = None
+
+# Durable document tracking shared by all workers
+registry: Optional[DocumentRegistry] = None
+
+NO_INFORMATION_ANSWER = (
+    "I don't have any information about that in the available documents. "
+    "Please ask about Tilak Parajuli's background, research, projects, or experience."
+)
 
-# Document tracking (in-memory for now, use DB in production)
-documents_db: dict = {}
+# Batch uploads are read in pieces of this size so limits stop them early
+UPLOAD_READ_CHUNK_BYTES = 1024 * 1024
+
+def clear_answer_cache(result: dict):
+    """New content can change the retrieval set of any cached answer"""
+    if answer_cache:
+        answer_cache.clear()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
-    global doc_processor, vector_store, llm_service
+    global doc_processor, vector_store, llm_service, answer_cache, reranker, registry, indexer, upload_queue
+    global rate_limiter, chat_admission
     
     logger.info("Starting RAG backend services...")
     
     try:
+        # Admission first: it protects the upstreams even in limited mode
+        if settings.RATE_LIMIT_ENABLED:
+            rate_limiter = create_rate_limiter(settings.RATE_LIMIT_STORE)
+        chat_admission = AdmissionLimiter(gemini_backend, settings.CHAT_MAX_IN_FLIGHT)
+        
         # Initialize services
         doc_processor = DocumentProcessor()
         vector_store = VectorStoreService()
         llm_service = LLMService()
+        registry = DocumentRegistry(settings.DOCUMENT_REGISTRY_PATH)
+        indexer = DocumentIndexer(
+            processor=doc_processor,
+            vector_store=vector_store,
+            registry=registry
+        )
+        upload_queue = UploadQueue(
+            indexer=indexer,
+            max_queued=settings.UPLOAD_QUEUE_SIZE,
+            workers=settings.UPLOAD_WORKERS,
+            on_indexed=clear_answer_cache
+        )
+        upload_queue.start()
+        
+        if settings.ANSWER_CACHE_ENABLED:
+            answer_cache = AnswerCache(
+                max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+                max_distance=settings.ANSWER_CACHE_MAX_DISTANCE
+            )
+        
+        if settings.RERANK_ENABLED:
+            reranker = Reranker(
+                model=settings.RERANK_MODEL,
+                candidates=settings.RERANK_CANDIDATES,
+                budget_ms=settings.RERANK_BUDGET_MS,
+                dense_weight=settings.RERANK_DENSE_WEIGHT,
+                max_workers=settings.RERANK_MAX_WORKERS,
+                max_timeouts=settings.RERANK_MAX_TIMEOUTS
+            )
         
         logger.info("All services initialized successfully")
         yield
-        
+    
     except Exception as e:
         logger.warning(f"Failed to initialize services: {str(e)}")
         logger.warning("Server will start in limited mode - some endpoints may not work")
         yield
     finally:
         logger.info("Shutting down RAG backend services...")
+        if upload_queue:
+            await upload_queue.stop()
+        if reranker:
+            reranker.shutdown()
+        gemini_backend.shutdown()
+        pinecone_backend.shutdown()
+        tracer.shutdown()
 
 # ============================================
 # FastAPI Application
@@ -78,12 +155,100 @@ allowed_origins = json.loads(os.getenv(
     '["http://localhost:4000", "https://parajuli-ai.github.io"]'
 ))
 
+# Route -> rate limit scope
+RATE_LIMITED_ROUTES = {
+    "/chat": "chat",
+    "/chat/stream": "chat",
+    "/upload": "upload",
+    "/upload/batch": "upload",
+}
+
+def client_key(request: Request) -> str:
+    """Rate limit key of the client: RATE_LIMIT_KEY_HEADER if set and present, else its IP"""
+    if settings.RATE_LIMIT_KEY_HEADER:
+        key = request.headers.get(settings.RATE_LIMIT_KEY_HEADER)
+        if key:
+            # Buckets (possibly in a shared file) never hold the key itself
+            return f"key:{hashlib.sha256(key.encode()).hexdigest()[:32]}"
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            return f"ip:{forwarded.split(',')[0].strip()}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+def retry_after_header(seconds: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+@app.middleware("http")
+async def rate_limit_requests(request: Request, call_next):
+    """Token bucket per client for chat and upload routes, checked before the body is read"""
+    scope = RATE_LIMITED_ROUTES.get(request.url.path) if request.method == "POST" else None
+    if scope is None or rate_limiter is None:
+        return await call_next(request)
+    
+    try:
+        retry_after = await rate_limiter.acquire(scope, client_key(request))
+    except Exception as e:
+        # Fail open: a broken limiter store must not take the API down
+        logger.error(f"Rate limiter failed: {str(e)}")
+        retry_after = 0
+    if retry_after:
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content=ErrorResponse(
+                error="Rate limit exceeded, retry later",
+                detail=f"{scope} requests are limited per client"
+            ).model_dump(),
+            headers=retry_after_header(retry_after)
+        )
+    return await call_next(request)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """In-flight gauge and latency histogram by route template (until response start)"""
+    if not settings.METRICS_ENABLED:
+        return await call_next(request)
+    
+    started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            request.method, route.path if route else "unmatched", str(status_code)
+        ).observe(time.perf_counter() - started)
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """Request ID for logs (X-Request-ID in and out) and, if sampled, the root span"""
+    with tracer.request(
+        f"{request.method} {request.url.path}",
+        request.headers.get("X-Request-ID"),
+        **{"http.method": request.method, "http.target": request.url.path}
+    ) as span:
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = get_request_id()
+        if span is not None:
+            route = request.scope.get("route")
+            if route:
+                span.name = f"{request.method} {route.path}"
+            span.set_attribute("http.status_code", response.status_code)
+        return response
+
+# Added last so it wraps the middlewares above: their early responses (e.g. 429)
+# still carry CORS headers the chat widget needs to read them
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 # ============================================
@@ -105,6 +270,30 @@ def get_vector_store() -> VectorStoreService:
         )
     return vector_store
 
+def get_registry() -> DocumentRegistry:
+    if registry is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Document registry not initialized"
+        )
+    return registry
+
+def get_indexer() -> DocumentIndexer:
+    if indexer is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Document indexer not initialized"
+        )
+    return indexer
+
+def get_upload_queue() -> UploadQueue:
+    if upload_queue is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Upload queue not initialized"
+        )
+    return upload_queue
+
 def get_llm_service() -> LLMService:
     if llm_service is None:
         raise HTTPException(
@@ -113,6 +302,257 @@ def get_llm_service() -> LLMService:
         )
     return llm_service
 
+def admit_chat() -> Callable[[], None]:
+    """
+    Admit a chat request past the in-flight cap in front of Gemini
+    
+    Returns:
+        Callback releasing the admission when the request is done (once, however often called)
+    
+    Raises:
+        HTTPException: 429 with Retry-After when the server is shedding load
+    """
+    if chat_admission is None:
+        return lambda: None
+    retry_after = chat_admission.try_acquire()
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Server is busy, retry later",
+            headers=retry_after_header(retry_after)
+        )
+    started = time.perf_counter()
+    released = False
+    
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            chat_admission.release(time.perf_counter() - started)
+    return release
+
+def chat_failure(e: Exception) -> HTTPException:
+    """HTTP error for a failed chat request: 429 for Gemini quota errors, 503 for open circuits, else 500"""
+    if isinstance(e, CircuitOpenError):
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers=retry_after_header(e.retry_after)
+        )
+    if gemini_backend.is_quota_error(e):
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Gemini quota exhausted, retry later",
+            headers=retry_after_header(gemini_backend.cooldown_remaining())
+        )
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"Failed to process chat request: {str(e)}"
+    )
+
+# ============================================
+# Chat Helpers
+# ============================================
+async def check_answer_cache(
+    request: ChatRequest,
+    vs: VectorStoreService,
+    llm: LLMService
+) -> Tuple[bool, Optional[List[float]], int, Optional[ChatResponse]]:
+    """
+    Look up a cached answer for the request
+    Answers depend on history, so only fresh conversations use the cache
+    
+    Returns:
+        (use_cache, query_embedding, corpus_version, cached_response); pass
+        corpus_version back to answer_cache.store with the new answer
+    """
+    if answer_cache is None or await llm.has_history(request.conversation_id):
+        return False, None, 0, None
+    
+    # Read before retrieval, so an answer racing a document change is not cached
+    corpus_version = await registry.generation() if registry else 0
+    query_embedding = await vs.embed_query(request.query)
+    cached = answer_cache.lookup(query_embedding, corpus_version)
+    if cached:
+        logger.info("Answer cache hit")
+        conv_id = await llm.record_exchange(request.query, cached.answer, request.conversation_id)
+        cached = cached.model_copy(update={
+            "conversation_id": conv_id,
+            "timestamp": datetime.utcnow()
+        })
+    return True, query_embedding, corpus_version, cached
+
+async def retrieve_context(
+    request: ChatRequest,
+    vs: VectorStoreService,
+    llm: LLMService,
+    query_embedding: Optional[List[float]]
+) -> List[RetrievalResult]:
+    """
+    Retrieve the chunks to answer a request from
+    Searches the query and its rewrites, over-fetching when a reranker
+    picks the final TOP_K_RESULTS
+    """
+    queries = await llm.query_variants(request.query, request.conversation_id)
+    candidates = await vs.search_many(
+        queries=queries,
+        top_k=max(reranker.candidates, settings.TOP_K_RESULTS) if reranker else settings.TOP_K_RESULTS,
+        query_embedding=query_embedding
+    )
+    if reranker is None:
+        return candidates
+    return await reranker.rerank(request.query, candidates, settings.TOP_K_RESULTS)
+
+def indexing_message(result: dict) -> str:
+    """Upload response message for indexing statistics"""
+    if result['unchanged']:
+        return f"Document unchanged, {result['chunks']} chunks already indexed"
+    return (
+        f"Document processed successfully with {result['chunks']} chunks "
+        f"({result['upserted']} new or changed, {result['deleted']} removed)"
+    )
+
+async def read_batch_uploads(files: List[UploadFile]) -> List[Tuple[str, bytes]]:
+    """
+    Read a batch upload in bounded chunks, stopping as soon as a limit is exceeded
+    
+    Args:
+        files: Uploaded files; zip archives may be up to BATCH_MAX_TOTAL_MB,
+            other files up to MAX_FILE_SIZE_MB
+    
+    Returns:
+        (filename, content) of each uploaded file
+    
+    Raises:
+        ValueError: A file or the batch exceeds its size limit
+    """
+    max_file_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+    max_total_bytes = settings.BATCH_MAX_TOTAL_MB * 1024 * 1024
+    uploads = []
+    total_bytes = 0
+    
+    for file in files:
+        is_zip = file.filename.lower().endswith(".zip")
+        content = bytearray()
+        while chunk := await file.read(UPLOAD_READ_CHUNK_BYTES):
+            content += chunk
+            total_bytes += len(chunk)
+            if total_bytes > max_total_bytes:
+                raise ValueError(f"Batch exceeds {settings.BATCH_MAX_TOTAL_MB}MB limit")
+            if not is_zip and len(content) > max_file_bytes:
+                raise ValueError(f"{file.filename}: file size exceeds {settings.MAX_FILE_SIZE_MB}MB limit")
+        uploads.append((file.filename, bytes(content)))
+    
+    return uploads
+
+def read_batch_files(uploads: List[Tuple[str, bytes]]) -> Tuple[List[Tuple[str, bytes]], List[Tuple[str, str]]]:
+    """
+    Expand zip archives and check a batch upload against the size and type limits
+    
+    Args:
+        uploads: (filename, content) of each uploaded file
+    
+    Returns:
+        (accepted (filename, content) pairs, rejected (filename, reason) pairs);
+        zip entries are named by their path inside the archive
+    
+    Raises:
+        ValueError: The batch exceeds BATCH_MAX_FILES or BATCH_MAX_TOTAL_MB
+    """
+    max_file_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+    max_total_bytes = settings.BATCH_MAX_TOTAL_MB * 1024 * 1024
+    accepted, rejected = [], []
+    total_bytes = 0
+    
+    def add(filename: str, size: int, read):
+        nonlocal total_bytes
+        if len(accepted) + len(rejected) >= settings.BATCH_MAX_FILES:
+            raise ValueError(f"Batch exceeds {settings.BATCH_MAX_FILES} files")
+        if f".{filename.rsplit('.', 1)[-1].lower()}" not in settings.SUPPORTED_EXTENSIONS:
+            rejected.append((filename, f"Unsupported file type. Supported: {', '.join(settings.SUPPORTED_EXTENSIONS)}"))
+        elif size > max_file_bytes:
+            rejected.append((filename, f"File size exceeds {settings.MAX_FILE_SIZE_MB}MB limit"))
+        else:
+            total_bytes += size
+            if total_bytes > max_total_bytes:
+                raise ValueError(f"Batch exceeds {settings.BATCH_MAX_TOTAL_MB}MB limit")
+            accepted.append((filename, read()))
+    
+    for filename, content in uploads:
+        if not filename.lower().endswith(".zip"):
+            add(filename, len(content), lambda: content)
+            continue
+        try:
+            with zipfile.ZipFile(io.BytesIO(content)) as archive:
+                for entry in archive.infolist():
+                    if entry.is_dir() or entry.filename.startswith("__MACOSX/"):
+                        continue
+                    # Declared sizes are checked before anything is decompressed, and
+                    # zipfile refuses to inflate an entry past its declared size
+                    add(entry.filename, entry.file_size, lambda entry=entry: archive.read(entry))
+        except zipfile.BadZipFile as e:
+            rejected.append((filename, f"Invalid zip archive: {str(e)}"))
+    
+    return accepted, rejected
+
+def format_sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def sse_response(events: AsyncIterator[str], on_close: Optional[Callable[[], None]] = None) -> StreamingResponse:
+    """Wrap an SSE generator in an unbuffered streaming response"""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also runs if the client disconnects before the stream starts
+        background=BackgroundTask(on_close) if on_close else None
+    )
+
+async def replay_answer(response: ChatResponse) -> AsyncIterator[str]:
+    """Emit an already complete answer as a single-token SSE stream"""
+    yield format_sse("metadata", {"sources": response.sources, "confidence": response.confidence})
+    yield format_sse("token", {"text": response.answer})
+    yield format_sse("done", {"conversation_id": response.conversation_id})
+
+async def stream_generated_answer(
+    request: ChatRequest,
+    retrieved_contexts: list,
+    llm: LLMService,
+    query_embedding: Optional[List[float]],
+    corpus_version: int,
+    release: Callable[[], None],
+    prepared: Optional[Tuple[str, list]] = None
+) -> AsyncIterator[str]:
+    """Relay LLM stream events as SSE and cache the completed answer, then release the admission"""
+    metadata: dict = {}
+    answer_parts: List[str] = []
+    
+    try:
+        async for event in llm.stream_answer(
+            query=request.query,
+            retrieved_contexts=retrieved_contexts,
+            conversation_id=request.conversation_id,
+            prepared=prepared
+        ):
+            if event["event"] == "metadata":
+                metadata = event["data"]
+            elif event["event"] == "token":
+                answer_parts.append(event["data"]["text"])
+            elif event["event"] == "done" and query_embedding is not None and answer_cache:
+                answer_cache.store(query_embedding, ChatResponse(
+                    answer="".join(answer_parts),
+                    sources=metadata["sources"],
+                    conversation_id=event["data"]["conversation_id"],
+                    confidence=metadata["confidence"]
+                ), corpus_version)
+            yield format_sse(event["event"], event["data"])
+    except Exception as e:
+        logger.error(f"Chat stream failed: {str(e)}")
+        yield format_sse("error", {"detail": "Failed to generate answer"})
+    finally:
+        release()
+
 # ============================================
 # API Routes
 # ============================================
@@ -126,6 +566,38 @@ async def root():
         "docs": "/docs"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms, cache, retry, throttle and token counters"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+@app.get("/debug/traces", include_in_schema=False)
+async def list_traces(
+    limit: int = Query(50, ge=1, le=500),
+    min_duration_ms: float = Query(0, ge=0)
+):
+    """Recent sampled traces in this worker, newest first"""
+    if not settings.TRACE_DEBUG_ENDPOINT:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trace debugging is disabled")
+    return {
+        "sample_rate": tracer.sample_rate,
+        "export_dropped": tracer.export_dropped,
+        "traces": tracer.recent(limit, min_duration_ms)
+    }
+
+@app.get("/debug/traces/{trace_id}", include_in_schema=False)
+async def get_trace(trace_id: str):
+    """One buffered trace by trace ID or request ID"""
+    if not settings.TRACE_DEBUG_ENDPOINT:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trace debugging is disabled")
+    trace = tracer.find(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Trace {trace_id} not found")
+    return trace
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check(
     vs: VectorStoreService = Depends(get_vector_store),
@@ -133,8 +605,10 @@ async def health_check(
 ):
     """
     Health check endpoint
-    Verifies all services are operational
+    Verifies all services are operational and reports upstream circuit breakers
     """
+    breakers = {backend.name: backend.breaker.get_stats() for backend in (gemini_backend, pinecone_backend)}
+    circuits_closed = all(breaker['state'] == CircuitBreaker.CLOSED for breaker in breakers.values())
     try:
         # Check vector store
         vs_stats = await vs.get_index_stats()
@@ -143,7 +617,9 @@ async def health_check(
         # Check LLM
         llm_status = "healthy" if await llm.check_health() else "degraded"
         
-        overall_status = "healthy" if vs_status == "healthy" and llm_status == "healthy" else "degraded"
+        overall_status = (
+            "healthy" if vs_status == "healthy" and llm_status == "healthy" and circuits_closed else "degraded"
+        )
         
         return HealthResponse(
             status=overall_status,
@@ -152,25 +628,50 @@ async def health_check(
                 "vector_store": vs_status,
                 "llm": llm_status,
                 "document_processor": "healthy"
-            }
+            },
+            circuit_breakers=breakers
         )
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
         return HealthResponse(
             status="unhealthy",
             version=settings.APP_VERSION,
-            services={"error": str(e)}
+            services={"error": str(e)},
+            circuit_breakers=breakers
         )
 
+@app.get("/stats", response_model=dict)
+async def get_stats(
+    vs: VectorStoreService = Depends(get_vector_store),
+    llm: LLMService = Depends(get_llm_service)
+):
+    """
+    Cache statistics
+    Hit/miss counters for the embedding and answer caches, conversation store size and evictions
+    """
+    return {
+        "embedding_cache": vs.embedder.get_cache_stats(),
+        "answer_cache": answer_cache.get_stats() if answer_cache else {},
+        "reranker": reranker.get_stats() if reranker else {},
+        "upload_queue": upload_queue.get_stats() if upload_queue else {},
+        "rate_limiter": rate_limiter.get_stats() if rate_limiter else {},
+        "chat_admission": chat_admission.get_stats() if chat_admission else {},
+        "conversations": llm.conversations.get_stats()
+    }
+
 @app.post("/upload", response_model=DocumentUploadResponse)
+@traced("upload_document")
 async def upload_document(
     file: UploadFile = File(...),
-    dp: DocumentProcessor = Depends(get_doc_processor),
-    vs: VectorStoreService = Depends(get_vector_store)
+    idx: DocumentIndexer = Depends(get_indexer),
+    uploads: UploadQueue = Depends(get_upload_queue)
 ):
     """
-    Upload and process a document
+    Upload a document for indexing
     Supports: PDF, TXT, MD, DOCX
+    
+    The document is queued and returned as pending; poll GET /documents/{document_id}
+    for its status and progress. With UPLOAD_WORKERS=0 it is indexed before responding.
     """
     try:
         # Validate file size
@@ -191,45 +692,47 @@ async def upload_document(
                 detail=f"Unsupported file type. Supported: {', '.join(settings.SUPPORTED_EXTENSIONS)}"
             )
         
-        # Generate document ID
-        document_id = hashlib.sha256(
-            f"{file.filename}{datetime.utcnow().isoformat()}".encode()
-        ).hexdigest()[:16]
+        # Stable document ID: re-uploading a file updates it in place
+        document_id = idx.document_id_for(file.filename)
         
-        logger.info(f"Processing upload: {file.filename} (ID: {document_id})")
+        metadata = {"upload_date": datetime.utcnow().isoformat()}
         
-        # Process document
-        chunks = await dp.process_file(
-            file_content=content,
-            filename=file.filename,
-            document_id=document_id,
-            metadata={"upload_date": datetime.utcnow().isoformat()}
-        )
+        if uploads.workers > 0:
+            try:
+                await uploads.submit(content, file.filename, document_id, metadata)
+            except asyncio.QueueFull:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Upload queue is full, retry later"
+                )
+            
+            logger.info(f"Queued upload: {file.filename} (ID: {document_id})")
+            
+            return DocumentUploadResponse(
+                document_id=document_id,
+                filename=file.filename,
+                status=DocumentStatus.PENDING,
+                chunks_created=0,
+                message=f"Document queued for indexing, see /documents/{document_id} for progress"
+            )
         
-        # Store in vector database
-        await vs.upsert_chunks(chunks)
+        logger.info(f"Processing upload: {file.filename} (ID: {document_id})")
         
-        # Track document
-        documents_db[document_id] = DocumentInfo(
-            document_id=document_id,
-            filename=file.filename,
-            document_type=DocumentType(file_ext),
-            upload_date=datetime.utcnow(),
-            chunk_count=len(chunks),
-            status=DocumentStatus.COMPLETED,
-            metadata={"file_size_mb": round(file_size_mb, 2)}
-        )
+        # Embed and upsert only new or changed chunks, delete vanished ones;
+        # the indexer records the document in the registry
+        result = await uploads.process(content, file.filename, document_id, metadata)
+        chunk_count = result['chunks']
         
-        logger.info(f"Successfully processed {file.filename}: {len(chunks)} chunks")
+        logger.info(f"Successfully processed {file.filename}: {chunk_count} chunks")
         
         return DocumentUploadResponse(
             document_id=document_id,
             filename=file.filename,
             status=DocumentStatus.COMPLETED,
-            chunks_created=len(chunks),
-            message=f"Document processed successfully with {len(chunks)} chunks"
+            chunks_created=chunk_count,
+            message=indexing_message(result)
         )
-        
+    
     except HTTPException:
         raise
     except Exception as e:
@@ -239,7 +742,87 @@ async def upload_document(
             detail=f"Failed to process document: {str(e)}"
         )
 
+@app.post("/upload/batch", response_model=BatchUploadResponse)
+@traced("upload_batch")
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    idx: DocumentIndexer = Depends(get_indexer)
+):
+    """
+    Upload and index many documents, or zip archives of them, in one request
+    
+    Parsing runs ahead of embedding and chunks from several files share
+    full-size embedding and upsert requests. Returns a result per file.
+    """
+    # Zip entries are checked by their declared size before decompression
+    try:
+        uploads = await read_batch_uploads(files)
+        accepted, rejected = await asyncio.to_thread(read_batch_files, uploads)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    
+    documents = [
+        DocumentUploadResponse(
+            document_id=idx.document_id_for(filename),
+            filename=filename,
+            status=DocumentStatus.FAILED,
+            chunks_created=0,
+            message=reason
+        )
+        for filename, reason in rejected
+    ]
+    
+    # A file repeated in the batch is indexed once, in its last version
+    batch = {}
+    for filename, content in accepted:
+        document_id = idx.document_id_for(filename)
+        batch.pop(document_id, None)
+        batch[document_id] = {
+            'file_content': content,
+            'filename': filename,
+            'document_id': document_id,
+            'metadata': {"upload_date": datetime.utcnow().isoformat()}
+        }
+    
+    logger.info(f"Processing batch upload: {len(batch)} files")
+    
+    try:
+        results = await idx.index_batch(list(batch.values()))
+    except Exception as e:
+        logger.error(f"Batch upload failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to process batch: {str(e)}"
+        )
+    
+    for file, result in zip(batch.values(), results):
+        failed = 'error' in result
+        documents.append(DocumentUploadResponse(
+            document_id=file['document_id'],
+            filename=file['filename'],
+            status=DocumentStatus.FAILED if failed else DocumentStatus.COMPLETED,
+            chunks_created=0 if failed else result['chunks'],
+            message=result['error'] if failed else indexing_message(result)
+        ))
+    
+    # New content can change the retrieval set of any cached answer
+    if answer_cache and any(not result.get('unchanged', True) for result in results):
+        answer_cache.clear()
+    
+    completed = sum(document.status == DocumentStatus.COMPLETED for document in documents)
+    logger.info(f"Batch upload finished: {completed} of {len(documents)} files indexed")
+    
+    return BatchUploadResponse(
+        documents=documents,
+        completed=completed,
+        failed=len(documents) - completed
+    )
+
 @app.post("/chat", response_model=ChatResponse)
+@traced("chat")
 async def chat(
     request: ChatRequest,
     vs: VectorStoreService = Depends(get_vector_store),
@@ -249,49 +832,119 @@ async def chat(
     Chat endpoint with RAG
     Retrieves relevant context and generates answer
     """
+    release = admit_chat()
     try:
         logger.info(f"Chat request: {request.query[:50]}...")
         
+        use_cache, query_embedding, corpus_version, cached = await check_answer_cache(request, vs, llm)
+        if cached:
+            return cached
+        
         # Retrieve relevant chunks
-        retrieved_contexts = await vs.search(
-            query=request.query,
-            top_k=settings.TOP_K_RESULTS
-        )
+        retrieved_contexts = await retrieve_context(request, vs, llm, query_embedding)
         
         if not retrieved_contexts:
-            return ChatResponse(
-                answer="I don't have any information about that in the available documents. Please ask about Tilak Parajuli's background, research, projects, or experience.",
+            response = ChatResponse(
+                answer=NO_INFORMATION_ANSWER,
                 sources=[],
                 conversation_id=request.conversation_id or f"conv_{uuid.uuid4().hex[:12]}",
                 confidence=0.0
             )
+        else:
+            # Generate answer using LLM
+            result = await llm.generate_answer(
+                query=request.query,
+                retrieved_contexts=retrieved_contexts,
+                conversation_id=request.conversation_id
+            )
+            response = ChatResponse(**result)
         
-        # Generate answer using LLM
-        result = await llm.generate_answer(
-            query=request.query,
-            retrieved_contexts=retrieved_contexts,
-            conversation_id=request.conversation_id
-        )
-        
-        return ChatResponse(**result)
+        if use_cache:
+            answer_cache.store(query_embedding, response, corpus_version)
         
+        return response
+    
     except Exception as e:
         logger.error(f"Chat request failed: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to process chat request: {str(e)}"
+        raise chat_failure(e)
+    finally:
+        release()
+
+@app.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    vs: VectorStoreService = Depends(get_vector_store),
+    llm: LLMService = Depends(get_llm_service)
+):
+    """
+    Streaming chat endpoint with RAG
+    Emits Server-Sent Events: metadata (sources, confidence), token (text)
+    as Gemini produces it, and done (conversation_id)
+    """
+    release = admit_chat()
+    prepared = None
+    # Spans ending after the root span (i.e. once the response starts) are dropped,
+    # so the traced part is everything up to the first byte of the stream
+    with tracer.span("chat_stream"):
+        try:
+            logger.info(f"Streaming chat request: {request.query[:50]}...")
+            
+            use_cache, query_embedding, corpus_version, cached = await check_answer_cache(request, vs, llm)
+            if cached:
+                release()
+                return sse_response(replay_answer(cached))
+            
+            # Retrieval happens before the stream opens so failures still surface as HTTP errors
+            retrieved_contexts = await retrieve_context(request, vs, llm, query_embedding)
+            if retrieved_contexts:
+                prepared = await llm.prepare_prompt(
+                    request.query, retrieved_contexts, request.conversation_id
+                )
+        
+        except Exception as e:
+            release()
+            logger.error(f"Streaming chat request failed: {str(e)}")
+            raise chat_failure(e)
+    
+    if not retrieved_contexts:
+        release()
+        response = ChatResponse(
+            answer=NO_INFORMATION_ANSWER,
+            sources=[],
+            conversation_id=request.conversation_id or f"conv_{uuid.uuid4().hex[:12]}",
+            confidence=0.0
         )
+        if use_cache:
+            answer_cache.store(query_embedding, response, corpus_version)
+        return sse_response(replay_answer(response))
+    
+    # The generated stream holds the admission until it ends
+    return sse_response(stream_generated_answer(
+        request, retrieved_contexts, llm, query_embedding if use_cache else None,
+        corpus_version, release, prepared
+    ), on_close=release)
 
 @app.get("/documents", response_model=DocumentListResponse)
-async def list_documents():
+async def list_documents(
+    limit: int = Query(settings.DOCUMENTS_PAGE_SIZE, ge=1, le=settings.DOCUMENTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    status_filter: Optional[DocumentStatus] = Query(None, alias="status"),
+    reg: DocumentRegistry = Depends(get_registry)
+):
     """
-    List all uploaded documents
+    List uploaded documents, newest first, one page at a time
     """
     try:
-        docs = list(documents_db.values())
+        docs, next_cursor = await reg.list_documents(limit, cursor=cursor, status=status_filter)
         return DocumentListResponse(
             documents=docs,
-            total_count=len(docs)
+            total_count=await reg.count(status=status_filter),
+            next_cursor=next_cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
     except Exception as e:
         logger.error(f"Failed to list documents: {str(e)}")
@@ -300,31 +953,48 @@ async def list_documents():
             detail=str(e)
         )
 
+@app.get("/documents/{document_id}", response_model=DocumentInfo)
+async def get_document(
+    document_id: str,
+    reg: DocumentRegistry = Depends(get_registry)
+):
+    """
+    Get a single document
+    """
+    document = await reg.get(document_id)
+    if document is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Document {document_id} not found"
+        )
+    return document
+
 @app.delete("/documents/{document_id}")
 async def delete_document(
     document_id: str,
-    vs: VectorStoreService = Depends(get_vector_store)
+    idx: DocumentIndexer = Depends(get_indexer)
 ):
     """
     Delete a document and its chunks
     """
     try:
-        if document_id not in documents_db:
+        if await idx.registry.get(document_id) is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Document {document_id} not found"
             )
         
-        # Delete from vector store
-        await vs.delete_document(document_id)
+        # Delete chunks by their stored IDs and drop the registry entry
+        await idx.remove_document(document_id)
         
-        # Remove from tracking
-        del documents_db[document_id]
+        # Cached answers citing this document are no longer valid
+        if answer_cache:
+            answer_cache.invalidate_document(document_id)
         
         logger.info(f"Deleted document: {document_id}")
         
         return {"message": f"Document {document_id} deleted successfully"}
-        
+    
     except HTTPException:
         raise
     except Exception as e:
@@ -346,7 +1016,17 @@ async def http_exception_handler(request, exc):
         content=ErrorResponse(
             error=exc.detail,
             detail=str(exc)
-        ).model_dump()
+        ).model_dump(),
+        headers=exc.headers
+    )
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request, exc):
+    """Handle invalid requests; the echoed input may hold lone surrogates, so escape to ASCII"""
+    return Response(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content=json.dumps({'detail': jsonable_encoder(exc.errors())}),
+        media_type="application/json"
     )
 
 @app.exception_handler(Exception)
@@ -0,0 +1,124 @@
+#backend/benchmarks/bench_chunker.py
+"""
+Chunker microbenchmark
+Compares the offset-based chunking engine in DocumentProcessor with the
+previous sentence-list implementation on long single-paragraph documents
+of many short sentences, and checks that both produce byte-for-byte
+identical chunks. Text cleaning is shared by both and excluded.
+
+Usage:
+    python benchmarks/bench_chunker.py [--sizes 1 10 50] [--skip-legacy]
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import DocumentChunk  # noqa: E402
+from services.document_processor import DocumentProcessor  # noqa: E402
+
+WORDS = [
+    "research", "model", "data", "learning", "network", "graph", "robust",
+    "training", "signal", "vision", "language", "system", "analysis",
+    "yes", "no", "ok", "it", "we", "so",
+]
+
+
+def make_text(size_mb: float, seed: int = 0) -> str:
+    """One paragraph of short sentences, about size_mb megabytes"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    sentences = []
+    length = 0
+    while length < target:
+        words = rng.choices(WORDS, k=rng.randint(1, 6))
+        sentence = " ".join(words).capitalize() + rng.choice([".", ".", "!", "?"])
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)
+
+
+def legacy_chunks(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """Chunk texts of cleaned text as produced by the previous sentence-list implementation"""
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+(?=[A-Z])', text) if s.strip()]
+    
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    for sentence in sentences:
+        if current_length + len(sentence) > chunk_size and current_chunk:
+            chunks.append(" ".join(current_chunk))
+            overlap = []
+            char_count = 0
+            for previous in reversed(current_chunk):
+                if char_count >= chunk_overlap:
+                    break
+                overlap.insert(0, previous)
+                char_count += len(previous)
+            current_chunk = overlap + [sentence]
+            current_length = sum(len(s) for s in current_chunk)
+        else:
+            current_chunk.append(sentence)
+            current_length += len(sentence)
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+    return chunks
+
+
+def current_create_chunks(processor: DocumentProcessor, text: str) -> List[DocumentChunk]:
+    """Offset-based engine on cleaned text"""
+    blocks = [(text, *processor._sentence_bounds(text))]
+    return list(processor._chunk_blocks(blocks, "bench", "bench.txt", {}))
+
+
+def legacy_create_chunks(processor: DocumentProcessor, text: str) -> List[DocumentChunk]:
+    """Previous implementation on cleaned text, including DocumentChunk construction"""
+    return [
+        processor._create_chunk(chunk_text, "bench", "bench.txt", chunk_index, {})
+        for chunk_index, chunk_text in enumerate(
+            legacy_chunks(text, processor.chunk_size, processor.chunk_overlap)
+        )
+    ]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Benchmark the document chunker")
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1, 10, 50], help="Input sizes in MB")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the current chunker")
+    args = parser.parse_args()
+    
+    processor = DocumentProcessor(chunk_unit="chars")
+    print(f"chunk_size={processor.chunk_size} chunk_overlap={processor.chunk_overlap}")
+    print(f"{'size':>8} {'chunks':>9} {'current':>10} {'legacy':>10} {'speedup':>8}")
+    
+    for size_mb in args.sizes:
+        text = DocumentProcessor._clean_text(make_text(size_mb))
+        chunks, current = timed(current_create_chunks, processor, text)
+        
+        legacy_time = speedup = "-"
+        if not args.skip_legacy:
+            expected, legacy = timed(legacy_create_chunks, processor, text)
+            if [chunk.text for chunk in chunks] != [chunk.text for chunk in expected]:
+                print(f"✗ Output differs from the legacy chunker at {size_mb} MB")
+                sys.exit(1)
+            legacy_time = f"{legacy:.2f}s"
+            speedup = f"{legacy / current:.1f}x"
+        
+        print(f"{size_mb:>6g}MB {len(chunks):>9} {current:>9.2f}s {legacy_time:>10} {speedup:>8}")
+
+
+if __name__ == "__main__":
+    main()
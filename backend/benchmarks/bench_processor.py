@@ -0,0 +1,432 @@
+#backend/benchmarks/bench_processor.py
+"""
+Document processor microbenchmark
+Times each DocumentProcessor stage in isolation (text cleaning, sentence
+location, chunking, PDF page and DOCX paragraph extraction) plus the full
+process_file pipeline, on a seeded synthetic corpus: plain text of several
+sizes, sentence lengths and scripts, and generated multi-page PDFs and
+many-paragraph DOCX files.
+
+Each case runs in a forked process, so peak RSS is its own. Reported per case:
+throughput in MB/s of input and items/s (chunks, sentences, pages or
+paragraphs), peak RSS growth, and from a separate tracemalloc run the peak of
+Python allocations during the stage and the number of allocated blocks its
+output holds. Results are saved as JSON named after the git commit;
+--save-baseline also stores them as the baseline, and --compare fails (exit 1)
+on throughput or allocation regressions beyond --regression-threshold.
+Timings are only comparable on the same machine.
+
+Usage:
+    python benchmarks/bench_processor.py [--sizes 1 5] [--profiles short long unicode messy]
+        [--pdf-pages 200] [--docx-paragraphs 5000] [--stages clean chunk_chars pdf ...]
+        [--repeat 5] [--save-baseline] [--compare [FILE]] [--regression-threshold 0.15]
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import textwrap
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+# process_file logs every document
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+import docx  # noqa: E402
+
+from benchmarks.load_test import git_revision  # noqa: E402
+from services.document_processor import DocumentProcessor  # noqa: E402
+
+RESULTS_DIR = BACKEND_DIR / "benchmarks" / "results"
+BASELINE_PATH = RESULTS_DIR / "processor_baseline.json"
+
+WORDS = [
+    "research", "model", "data", "learning", "network", "graph", "robust",
+    "training", "signal", "vision", "language", "system", "analysis", "Purdue",
+    "yes", "no", "ok", "it", "we", "so", "the", "of", "and", "in",
+]
+UNICODE_WORDS = WORDS + [
+    "café", "naïve", "Zürich", "señal", "données", "Ångström", "résumé",
+    "δεδομένα", "μοντέλο", "обучение", "сеть", "学习", "网络", "模型", "数据",
+    "データ", "学習", "🚀", "📈", "—", "…", "“quoted”",
+]
+# Whitespace runs and control characters that cleaning must collapse or drop
+MESSY_SEPARATORS = [" ", " ", " ", "  ", "\t", "\n", " \n\n ", "\r\n", " ", " "]
+CONTROL_CHARS = ["\x00", "\x07", "\x1b", "\x7f", "\x85", "\x9f"]
+
+# Sentence length in words per profile
+PROFILES = {
+    'short': (WORDS, 1, 6),
+    'long': (WORDS, 20, 60),
+    'unicode': (UNICODE_WORDS, 3, 25),
+    'messy': (WORDS, 3, 25),
+}
+
+TEXT_STAGES = ["clean", "sentences", "chunk_chars", "chunk_tokens"]
+FILE_STAGES = ["pdf", "docx"]
+STAGES = TEXT_STAGES + FILE_STAGES + ["process"]
+
+# Inputs generated in the parent and inherited by forked case processes
+CORPUS: Dict[str, Dict[str, Any]] = {}
+
+
+# ============================================
+# Synthetic corpus
+# ============================================
+
+def make_sentences(rng: random.Random, profile: str, target_chars: int) -> List[str]:
+    """Random sentences of the profile until they add up to target_chars"""
+    words, min_words, max_words = PROFILES[profile]
+    sentences = []
+    length = 0
+    while length < target_chars:
+        sentence_words = rng.choices(words, k=rng.randint(min_words, max_words))
+        if max_words > 6:
+            # Clauses, as in prose
+            for position in range(4, len(sentence_words) - 1, rng.randint(5, 12)):
+                sentence_words[position] += ","
+        sentence = " ".join(sentence_words)
+        sentence = sentence[:1].upper() + sentence[1:] + rng.choice([".", ".", ".", "!", "?"])
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return sentences
+
+
+def make_text(size_mb: float, profile: str, seed: int = 0) -> str:
+    """Paragraphs of sentences of about size_mb megabytes of characters"""
+    rng = random.Random(f"{profile}-{size_mb}-{seed}")
+    sentences = make_sentences(rng, profile, int(size_mb * 1024 * 1024))
+    
+    parts = []
+    for sentence in sentences:
+        if profile == "messy":
+            if rng.random() < 0.1:
+                position = rng.randint(0, len(sentence))
+                sentence = sentence[:position] + rng.choice(CONTROL_CHARS) + sentence[position:]
+            parts.append(sentence + rng.choice(MESSY_SEPARATORS))
+        else:
+            parts.append(sentence + ("\n\n" if rng.random() < 0.1 else " "))
+    return "".join(parts)
+
+
+def make_paragraphs(count: int, seed: int = 0) -> List[str]:
+    """Paragraphs of 1-8 prose sentences"""
+    rng = random.Random(f"paragraphs-{seed}")
+    return [
+        " ".join(make_sentences(rng, "long", rng.randint(80, 1200)))
+        for _ in range(count)
+    ]
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: int, seed: int = 0) -> bytes:
+    """
+    A PDF of pages of text in Helvetica, written directly (no PDF library needed)
+    
+    Args:
+        pages: Number of pages, each about 55 lines of 90 characters
+        seed: Corpus seed
+    
+    Returns:
+        PDF file bytes
+    """
+    rng = random.Random(f"pdf-{seed}")
+    # 1: catalog, 2: page tree, 3: font, then a page and its content stream per page
+    objects = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for _ in range(pages):
+        lines = textwrap.wrap(" ".join(make_sentences(rng, "long", 55 * 90)), 90)[:55]
+        content = (
+            "BT /F1 10 Tf 13 TL 50 780 Td\n"
+            + "\n".join(f"({_pdf_escape(line)}) Tj T*" for line in lines)
+            + "\nET"
+        ).encode("latin-1")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects) + 2} 0 R >>".encode()
+        )
+        page_refs.append(f"{len(objects)} 0 R")
+        objects.append(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {pages} >>".encode()
+    
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def make_docx(paragraphs: int, seed: int = 0) -> bytes:
+    """A DOCX of headed sections of prose paragraphs, with some empty ones"""
+    rng = random.Random(f"docx-{seed}")
+    document = docx.Document()
+    for index, text in enumerate(make_paragraphs(paragraphs, seed)):
+        if index % 25 == 0:
+            document.add_heading(f"Section {index // 25 + 1}", level=1)
+        document.add_paragraph(text)
+        if rng.random() < 0.05:
+            document.add_paragraph("")
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def build_corpus(args) -> Dict[str, Dict[str, Any]]:
+    """Corpus name -> {'kind': 'text' | 'pdf' | 'docx', 'data': str | bytes}"""
+    corpus = {}
+    for profile in args.profiles:
+        for size_mb in args.sizes:
+            corpus[f"{profile}-{size_mb:g}mb"] = {
+                'kind': 'text', 'data': make_text(size_mb, profile, args.seed)
+            }
+    if args.pdf_pages:
+        corpus[f"pdf-{args.pdf_pages}p"] = {'kind': 'pdf', 'data': make_pdf(args.pdf_pages, args.seed)}
+    if args.docx_paragraphs:
+        corpus[f"docx-{args.docx_paragraphs}para"] = {
+            'kind': 'docx', 'data': make_docx(args.docx_paragraphs, args.seed)
+        }
+    return corpus
+
+
+# ============================================
+# Stages
+# ============================================
+
+def stage_runner(stage: str, entry: Dict[str, Any]) -> Optional[Tuple[Callable[[], Any], Callable[[Any], int], int, str]]:
+    """
+    (run, count, input bytes, item name) for a stage on a corpus entry, or None if it does not apply
+    
+    run() executes the stage once and returns its output; count(output) is the
+    number of items in it.
+    """
+    kind, data = entry['kind'], entry['data']
+    size = len(data) if isinstance(data, bytes) else len(data.encode('utf-8'))
+    # Serial PDF extraction: pool workers would hide their memory and CPU time
+    processor = DocumentProcessor(pdf_workers=1, chunk_unit="chars")
+    
+    if stage in TEXT_STAGES and kind != "text":
+        return None
+    if stage in FILE_STAGES and kind != stage:
+        return None
+    
+    if stage == "clean":
+        return (lambda: DocumentProcessor._clean_text(data)), len, size, "chars"
+    if stage == "sentences":
+        cleaned = DocumentProcessor._clean_text(data)
+        return (
+            (lambda: DocumentProcessor._sentence_bounds(cleaned)),
+            lambda bounds: len(bounds[0]), len(cleaned.encode('utf-8')), "sentences"
+        )
+    if stage in ("chunk_chars", "chunk_tokens"):
+        processor = DocumentProcessor(pdf_workers=1, chunk_unit=stage.split("_")[1])
+        return (lambda: processor._create_chunks(data, "bench", "bench.txt", {})), len, size, "chunks"
+    if stage == "pdf":
+        return (lambda: list(processor._iter_pdf_pages(data))), len, size, "pages"
+    if stage == "docx":
+        return (lambda: list(processor._iter_docx_paragraphs(data))), len, size, "paragraphs"
+    if stage == "process":
+        content = data.encode('utf-8') if kind == "text" else data
+        filename = f"bench.{'txt' if kind == 'text' else kind}"
+        return (lambda: processor.process_file_sync(content, filename, "bench")), len, size, "chunks"
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def rss_mb() -> float:
+    """Current resident set size"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def measure(stage: str, corpus_name: str, repeat: int) -> Optional[Dict[str, Any]]:
+    """
+    Benchmark one stage on one corpus entry
+    
+    Args:
+        stage: Stage name from STAGES
+        corpus_name: Key of CORPUS
+        repeat: Timed runs after one warm-up run
+    
+    Returns:
+        Case results, or None if the stage does not apply to the entry
+    """
+    runner = stage_runner(stage, CORPUS[corpus_name])
+    if runner is None:
+        return None
+    run, count, size, item = runner
+    
+    rss_start = rss_mb()
+    items = count(run())
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+    rss_peak = peak_rss_mb()
+    
+    # Allocation profile from its own run: tracing slows the stage down several times
+    tracemalloc.start()
+    output = run()
+    python_peak = tracemalloc.get_traced_memory()[1]
+    output_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    del output
+    
+    best = min(times)
+    return {
+        'stage': stage,
+        'corpus': corpus_name,
+        'input_mb': round(size / 1024 / 1024, 3),
+        'item': item,
+        'items': items,
+        'seconds': {'best': round(best, 5), 'median': round(statistics.median(times), 5)},
+        'mb_per_s': round(size / 1024 / 1024 / best, 2),
+        'items_per_s': round(items / best, 1),
+        'peak_rss_mb': round(rss_peak - rss_start, 1),
+        'python_peak_mb': round(python_peak / 1024 / 1024, 2),
+        'output_blocks': output_blocks
+    }
+
+
+def run_case(stage: str, corpus_name: str, repeat: int) -> Optional[Dict[str, Any]]:
+    """measure() in a forked process where available, so each case has its own peak RSS"""
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return measure(stage, corpus_name, repeat)
+    with multiprocessing.get_context("fork").Pool(1) as pool:
+        return pool.apply(measure, (stage, corpus_name, repeat))
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> int:
+    """Print changes against a baseline run; returns the number of regressions beyond threshold"""
+    previous = {(r['stage'], r['corpus']): r for r in baseline['results']}
+    print(f"\nCompared with {baseline['revision']} ({baseline['timestamp']}):")
+    print(f"{'stage':<13} {'corpus':<18} {'MB/s':>8} {'items/s':>8} {'py peak':>8} {'blocks':>8}")
+    
+    def change(current: float, before: float) -> str:
+        return f"{(current - before) / before * 100:+.0f}%" if before else "-"
+    
+    regressions = 0
+    for result in report['results']:
+        before = previous.get((result['stage'], result['corpus']))
+        if before is None:
+            continue
+        regressed = (
+            result['mb_per_s'] < before['mb_per_s'] * (1 - threshold)
+            or result['python_peak_mb'] > before['python_peak_mb'] * (1 + threshold)
+        )
+        regressions += regressed
+        print(
+            f"{result['stage']:<13} {result['corpus']:<18} "
+            f"{change(result['mb_per_s'], before['mb_per_s']):>8} "
+            f"{change(result['items_per_s'], before['items_per_s']):>8} "
+            f"{change(result['python_peak_mb'], before['python_peak_mb']):>8} "
+            f"{change(result['output_blocks'], before['output_blocks']):>8}"
+            + ("  ✗ regression" if regressed else "")
+        )
+    return regressions
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Benchmark DocumentProcessor stages on a synthetic corpus")
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1, 5], help="Text sizes in MB")
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--pdf-pages", type=int, default=200, help="Pages of the generated PDF (0 to skip)")
+    parser.add_argument(
+        "--docx-paragraphs", type=int, default=5000, help="Paragraphs of the generated DOCX (0 to skip)"
+    )
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (the best is reported)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument("--output", type=Path, help="Results file (default: benchmarks/results/processor_<commit>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Also store the results as {BASELINE_PATH.name}")
+    parser.add_argument(
+        "--compare", type=Path, nargs="?", const=BASELINE_PATH,
+        help="Earlier results file to compare against (default: the stored baseline)"
+    )
+    parser.add_argument(
+        "--regression-threshold", type=float, default=0.15,
+        help="Relative throughput drop or Python peak memory increase flagged as a regression"
+    )
+    args = parser.parse_args()
+    
+    started = time.perf_counter()
+    CORPUS.update(build_corpus(args))
+    print(f"Generated {len(CORPUS)} inputs in {time.perf_counter() - started:.1f}s")
+    print(
+        f"{'stage':<13} {'corpus':<18} {'MB':>7} {'MB/s':>8} {'items/s':>11} {'item':<10} "
+        f"{'RSS MB':>7} {'py peak':>8} {'blocks':>8}"
+    )
+    
+    results = []
+    for stage in args.stages:
+        for corpus_name in CORPUS:
+            result = run_case(stage, corpus_name, args.repeat)
+            if result is None:
+                continue
+            results.append(result)
+            print(
+                f"{stage:<13} {corpus_name:<18} {result['input_mb']:>7.2f} {result['mb_per_s']:>8.1f} "
+                f"{result['items_per_s']:>11.0f} {result['item']:<10} {result['peak_rss_mb']:>7.1f} "
+                f"{result['python_peak_mb']:>8.1f} {result['output_blocks']:>8}"
+            )
+    
+    report = {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'config': {
+            'sizes': args.sizes, 'profiles': args.profiles, 'pdf_pages': args.pdf_pages,
+            'docx_paragraphs': args.docx_paragraphs, 'repeat': args.repeat, 'seed': args.seed
+        },
+        'results': results
+    }
+    
+    output = args.output or RESULTS_DIR / f"processor_{report['revision']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nSaved results to {output}")
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(report, indent=2))
+        print(f"Saved baseline to {BASELINE_PATH}")
+    
+    if args.compare:
+        regressions = compare(report, json.loads(args.compare.read_text()), args.regression_threshold)
+        if regressions:
+            print(f"✗ {regressions} regressions beyond {args.regression_threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
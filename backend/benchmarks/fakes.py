@@ -0,0 +1,275 @@
+#backend/benchmarks/fakes.py
+"""
+Local stand-ins for Gemini and Pinecone
+Deterministic fakes with configurable latency distributions and error rates.
+install() swaps them in for the SDK entry points the services use, so the
+whole app runs offline with upstream behaviour under the benchmark's control.
+
+Must be installed after the services are imported and before the app starts.
+"""
+
+import asyncio
+import hashlib
+import math
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from pinecone.exceptions import ServiceException
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.keyword_index import KeywordIndex  # noqa: E402
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# z-score of the 99th percentile of a standard normal
+Z_99 = 2.326
+
+
+class LatencyModel:
+    """Log-normal latency with a given median and p99, plus a failure rate"""
+    
+    def __init__(
+        self,
+        median_ms: float,
+        p99_ms: Optional[float] = None,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.median_ms = median_ms
+        self.p99_ms = p99_ms or median_ms
+        self.error_rate = error_rate
+        self._mu = math.log(max(median_ms, 1e-6) / 1000)
+        self._sigma = math.log(self.p99_ms / median_ms) / Z_99 if self.p99_ms > median_ms > 0 else 0.0
+        # Shared by worker threads (Pinecone calls run on a pool)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def parse(cls, spec: str, seed: int = 0) -> "LatencyModel":
+        """Build from a "median_ms[,p99_ms[,error_rate]]" spec such as 40,120,0.01"""
+        values = [float(v) for v in spec.split(",")]
+        return cls(*values, seed=seed)
+    
+    def sample(self) -> float:
+        """One latency in seconds"""
+        if self.median_ms <= 0:
+            return 0.0
+        with self._lock:
+            return self._rng.lognormvariate(self._mu, self._sigma)
+    
+    def fails(self) -> bool:
+        """Whether the next call fails"""
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+    
+    def describe(self) -> Dict[str, float]:
+        return {'median_ms': self.median_ms, 'p99_ms': self.p99_ms, 'error_rate': self.error_rate}
+
+
+def embed_text(text: str, dimension: int) -> List[float]:
+    """Deterministic unit vector from hashed words, so related texts land close together"""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in WORD_PATTERN.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        vector[int.from_bytes(digest, "little") % dimension] += 1.0
+    norm = np.linalg.norm(vector)
+    if not norm:
+        vector[0] = norm = 1.0
+    return (vector / norm).tolist()
+
+
+# ============================================
+# Gemini
+# ============================================
+
+class FakeGemini:
+    """google.generativeai embedding and generation calls"""
+    
+    ANSWER_WORDS = (
+        "Based on the provided documents, Tilak works on robust machine learning, "
+        "graph neural networks and signal processing, and teaches related courses."
+    ).split()
+    
+    def __init__(self, embed: LatencyModel, generate: LatencyModel, dimension: int):
+        self.embed_latency = embed
+        self.generate_latency = generate
+        self.dimension = dimension
+        self.calls = {'embed': 0, 'generate': 0, 'errors': 0}
+    
+    def install(self):
+        """Replace the SDK functions the services call"""
+        genai.configure = lambda **kwargs: None
+        genai.embed_content_async = self.embed_content_async
+        genai.embed_content = self.embed_content
+        genai.GenerativeModel = lambda model_name, *args, **kwargs: FakeGenerativeModel(self)
+    
+    async def embed_content_async(self, model: str, content, task_type: str = None, **kwargs):
+        self.calls['embed'] += 1
+        await asyncio.sleep(self.embed_latency.sample())
+        self._maybe_fail(self.embed_latency)
+        return self._embeddings(content)
+    
+    def embed_content(self, model: str, content, task_type: str = None, **kwargs):
+        self.calls['embed'] += 1
+        time.sleep(self.embed_latency.sample())
+        self._maybe_fail(self.embed_latency)
+        return self._embeddings(content)
+    
+    async def generate(self, prompt: str, stream: bool):
+        self.calls['generate'] += 1
+        latency = self.generate_latency.sample()
+        if not stream:
+            await asyncio.sleep(latency)
+            self._maybe_fail(self.generate_latency)
+            return SimpleNamespace(text=" ".join(self.ANSWER_WORDS))
+        self._maybe_fail(self.generate_latency)
+        return FakeStream(self.ANSWER_WORDS, latency)
+    
+    def _embeddings(self, content) -> Dict[str, Any]:
+        if isinstance(content, str):
+            return {'embedding': embed_text(content, self.dimension)}
+        return {'embedding': [embed_text(text, self.dimension) for text in content]}
+    
+    def _maybe_fail(self, latency: LatencyModel):
+        if latency.fails():
+            self.calls['errors'] += 1
+            raise google_exceptions.ServiceUnavailable("Fake Gemini: injected failure")
+
+
+class FakeGenerativeModel:
+    """genai.GenerativeModel"""
+    
+    def __init__(self, gemini: FakeGemini):
+        self.gemini = gemini
+    
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        return await self.gemini.generate(prompt, stream)
+    
+    def start_chat(self, history=None):
+        return FakeChat(self.gemini)
+
+
+class FakeChat:
+    """ChatSession"""
+    
+    def __init__(self, gemini: FakeGemini):
+        self.gemini = gemini
+    
+    async def send_message_async(self, prompt: str, stream: bool = False, **kwargs):
+        return await self.gemini.generate(prompt, stream)
+
+
+class FakeStream:
+    """Streamed response: words spread evenly over the sampled latency"""
+    
+    def __init__(self, words: List[str], latency: float):
+        self.words = words
+        self.latency = latency
+    
+    async def __aiter__(self):
+        delay = self.latency / len(self.words)
+        for position, word in enumerate(self.words):
+            await asyncio.sleep(delay)
+            yield SimpleNamespace(text=word if position == 0 else f" {word}")
+
+
+# ============================================
+# Pinecone
+# ============================================
+
+class FakePinecone:
+    """pinecone.Pinecone client with one in-memory index"""
+    
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.index = FakePineconeIndex(latency)
+    
+    def install(self):
+        """Replace the client class the vector index connects with"""
+        import services.vector_index as vector_index
+        vector_index.Pinecone = lambda **kwargs: self
+    
+    def list_indexes(self):
+        return []
+    
+    def create_index(self, name: str, dimension: int, **kwargs):
+        self.index.name = name
+    
+    def Index(self, name: str, **kwargs):
+        return self.index
+
+
+class FakePineconeIndex:
+    """Exact cosine search over the upserted vectors (blocking calls, as in the SDK)"""
+    
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.name = None
+        self.calls = {'upsert': 0, 'query': 0, 'delete': 0, 'errors': 0}
+        self._lock = threading.Lock()
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+    
+    def upsert(self, vectors: List[Dict[str, Any]], **kwargs):
+        self._call('upsert')
+        with self._lock:
+            for vector in vectors:
+                self._vectors[vector['id']] = np.asarray(vector['values'], dtype=np.float32)
+                self._metadata[vector['id']] = vector['metadata']
+        return SimpleNamespace(upserted_count=len(vectors))
+    
+    def query(self, vector: List[float], top_k: int, filter: Dict[str, Any] = None, **kwargs):
+        self._call('query')
+        with self._lock:
+            ids = [
+                vector_id for vector_id in self._vectors
+                if not filter or KeywordIndex._matches_filter(self._metadata[vector_id], filter)
+            ]
+            if not ids:
+                return SimpleNamespace(matches=[])
+            scores = np.stack([self._vectors[i] for i in ids]) @ np.asarray(vector, dtype=np.float32)
+            order = np.argsort(-scores)[:top_k]
+            return SimpleNamespace(matches=[
+                SimpleNamespace(id=ids[i], score=float(scores[i]), metadata=self._metadata[ids[i]])
+                for i in order.tolist()
+            ])
+    
+    def delete(self, ids: List[str] = None, filter: Dict[str, Any] = None, **kwargs):
+        self._call('delete')
+        with self._lock:
+            doomed = set(ids or [])
+            if filter:
+                doomed.update(
+                    vector_id for vector_id, metadata in self._metadata.items()
+                    if KeywordIndex._matches_filter(metadata, filter)
+                )
+            for vector_id in doomed:
+                self._vectors.pop(vector_id, None)
+                self._metadata.pop(vector_id, None)
+        return {}
+    
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            dimension = len(next(iter(self._vectors.values()))) if self._vectors else 0
+            return SimpleNamespace(
+                total_vector_count=len(self._vectors), dimension=dimension, index_fullness=0.0
+            )
+    
+    def _call(self, operation: str):
+        self.calls[operation] += 1
+        time.sleep(self.latency.sample())
+        if self.latency.fails():
+            self.calls['errors'] += 1
+            raise ServiceException(status=503, reason="Fake Pinecone: injected failure")
@@ -0,0 +1,341 @@
+#backend/benchmarks/load_test.py
+"""
+Load test
+Drives /chat, /upload and /documents in-process (httpx ASGI transport) at
+fixed concurrency levels against the local Gemini and Pinecone fakes, and
+reports latency percentiles, throughput and event-loop lag. Results are saved
+as JSON named after the git commit, and can be compared with an earlier run.
+
+Settings come from the environment as usual; unless set, the benchmark uses
+throwaway data paths, turns the answer and embedding caches off (every chat
+runs the full pipeline), lifts the per-client rate limits and keeps logs quiet.
+
+Usage:
+    python benchmarks/load_test.py [--scenarios chat upload documents] [--concurrency 1 8 32]
+        [--requests 200] [--embed-latency 40,120] [--generate-latency 800,2500,0.01]
+        [--pinecone-latency 20,60] [--output FILE] [--compare FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+TOPICS = [
+    "graph neural networks", "robust optimization", "signal processing", "computer vision",
+    "reinforcement learning", "natural language processing", "robotics", "federated learning",
+]
+COURSES = ["CS101", "ECE302", "CS535", "STAT512", "ECE595"]
+QUESTIONS = [
+    "What does Tilak research?",
+    "Which courses has Tilak taught?",
+    "What is Tilak's experience with {topic}?",
+    "Where did Tilak study?",
+    "Tell me about the {topic} project.",
+    "Who taught {course}?",
+    "What publications cover {topic}?",
+    "What awards has Tilak received?",
+]
+
+
+def make_document(index: int) -> str:
+    """Synthetic markdown page, a few hundred words"""
+    rng = random.Random(index)
+    topic = rng.choice(TOPICS)
+    lines = [f"# {topic.title()} notes {index}", ""]
+    for paragraph in range(rng.randint(3, 6)):
+        sentences = [
+            f"Tilak worked on {rng.choice(TOPICS)} during project {index}-{paragraph}.",
+            f"The course {rng.choice(COURSES)} covered {topic} with weekly labs.",
+            f"Results on {rng.choice(TOPICS)} were published in {2015 + rng.randint(0, 9)}.",
+            f"Collaborators studied {topic} and {rng.choice(TOPICS)} together.",
+        ]
+        rng.shuffle(sentences)
+        lines.extend([" ".join(sentences), ""])
+    return "\n".join(lines)
+
+
+def make_question(index: int) -> str:
+    rng = random.Random(index)
+    return rng.choice(QUESTIONS).format(topic=rng.choice(TOPICS), course=rng.choice(COURSES))
+
+
+class LoopLagMonitor:
+    """Measure how late a periodic timer fires: time the event loop spent blocked"""
+    
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags_ms: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        self.lags_ms = []
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> List[float]:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        return self.lags_ms
+    
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags_ms.append(max(0.0, (time.perf_counter() - started - self.interval) * 1000))
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': round(p50, 2), 'p95': round(p95, 2), 'p99': round(p99, 2), 'max': round(max(values), 2)}
+
+
+def git_revision() -> str:
+    """Short commit of the working tree, with "-dirty" if it has changes"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def configure_environment(data_dir: str):
+    """Benchmark defaults for settings not given in the environment"""
+    defaults = {
+        "GOOGLE_API_KEY": "benchmark",
+        "PINECONE_API_KEY": "benchmark",
+        "VECTOR_BACKEND": "pinecone",
+        "ANSWER_CACHE_ENABLED": "false",
+        "EMBED_CACHE_ENABLED": "false",
+        "LOG_LEVEL": "CRITICAL",
+        "TRACE_SAMPLE_RATE": "0",
+        "UPLOAD_QUEUE_SIZE": "10000",
+        # Every request comes from one client
+        "RATE_LIMIT_ENABLED": "false",
+        "CHAT_MAX_IN_FLIGHT": "10000",
+        "DOCUMENT_REGISTRY_PATH": f"{data_dir}/registry.sqlite",
+        "KEYWORD_INDEX_PATH": f"{data_dir}/keyword_index.sqlite",
+        "CONVERSATION_STORE_PATH": f"{data_dir}/conversations.sqlite",
+        "EMBED_CACHE_PATH": f"{data_dir}/embedding_cache.sqlite",
+        "LOCAL_INDEX_PATH": f"{data_dir}/vector_index",
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+async def run_level(
+    client,
+    scenario: str,
+    concurrency: int,
+    total: int,
+    offset: int,
+    document_ids: List[str]
+) -> Dict[str, Any]:
+    """Send total requests of one scenario with concurrency workers"""
+    latencies_ms: List[float] = []
+    statuses: Dict[str, int] = {}
+    next_request = iter(range(offset, offset + total))
+    
+    async def send(index: int):
+        if scenario == "chat":
+            return await client.post("/chat", json={"query": make_question(index)})
+        if scenario == "upload":
+            content = make_document(index).encode()
+            return await client.post("/upload", files={"file": (f"bench-{index}.md", content, "text/markdown")})
+        if index % 2:
+            return await client.get(f"/documents/{document_ids[index % len(document_ids)]}")
+        return await client.get("/documents", params={"limit": 20})
+    
+    async def worker():
+        for index in next_request:
+            started = time.perf_counter()
+            try:
+                status_code = str((await send(index)).status_code)
+            except Exception as e:
+                status_code = type(e).__name__
+            latencies_ms.append((time.perf_counter() - started) * 1000)
+            statuses[status_code] = statuses.get(status_code, 0) + 1
+    
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    lags_ms = await monitor.stop()
+    
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    return {
+        'scenario': scenario,
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': errors,
+        'statuses': statuses,
+        'duration_s': round(elapsed, 3),
+        'rps': round(total / elapsed, 2),
+        'latency_ms': percentiles(latencies_ms),
+        'loop_lag_ms': percentiles(lags_ms)
+    }
+
+
+async def wait_for_uploads(app_module, timeout: float = 300):
+    """Let background indexing finish so it doesn't bleed into the next level"""
+    deadline = time.monotonic() + timeout
+    while app_module.upload_queue and time.monotonic() < deadline:
+        stats = app_module.upload_queue.get_stats()
+        if not stats['queued'] and not stats['processing']:
+            return
+        await asyncio.sleep(0.05)
+
+
+async def run(args) -> Dict[str, Any]:
+    """Start the app on the fakes, seed documents and run every scenario and level"""
+    from config import settings
+    from benchmarks.fakes import FakeGemini, FakePinecone, LatencyModel
+    
+    gemini = FakeGemini(
+        embed=LatencyModel.parse(args.embed_latency, seed=args.seed),
+        generate=LatencyModel.parse(args.generate_latency, seed=args.seed + 1),
+        dimension=settings.EMBED_DIMENSION
+    )
+    pinecone = FakePinecone(LatencyModel.parse(args.pinecone_latency, seed=args.seed + 2))
+    gemini.install()
+    
+    import httpx
+    import app as app_module
+    pinecone.install()
+    
+    results = []
+    async with app_module.app.router.lifespan_context(app_module.app):
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            print(f"Seeding {args.documents} documents...")
+            response = await client.post("/upload/batch", files=[
+                ("files", (f"seed-{i}.md", make_document(i).encode(), "text/markdown"))
+                for i in range(args.documents)
+            ])
+            response.raise_for_status()
+            document_ids = [document['document_id'] for document in response.json()['documents']]
+            
+            print(f"\n{'scenario':<10} {'conc':>5} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'lag p99':>9} {'errors':>7}")
+            offset = args.documents
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    calls_before = {**gemini.calls, **{f"pinecone_{k}": v for k, v in pinecone.index.calls.items()}}
+                    result = await run_level(client, scenario, concurrency, args.requests, offset, document_ids)
+                    offset += args.requests
+                    if scenario == "upload":
+                        await wait_for_uploads(app_module)
+                    calls_after = {**gemini.calls, **{f"pinecone_{k}": v for k, v in pinecone.index.calls.items()}}
+                    result['upstream_calls'] = {k: calls_after[k] - calls_before[k] for k in calls_after}
+                    results.append(result)
+                    
+                    latency, lag = result['latency_ms'], result['loop_lag_ms']
+                    print(
+                        f"{scenario:<10} {concurrency:>5} {result['rps']:>9.1f} {latency['p50']:>7.1f}ms "
+                        f"{latency['p95']:>7.1f}ms {latency['p99']:>7.1f}ms {lag['p99']:>7.1f}ms {result['errors']:>7}"
+                    )
+    
+    return {
+        'revision': git_revision(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'parameters': {
+            'requests': args.requests,
+            'documents': args.documents,
+            'seed': args.seed,
+            'embed_latency': gemini.embed_latency.describe(),
+            'generate_latency': gemini.generate_latency.describe(),
+            'pinecone_latency': pinecone.latency.describe()
+        },
+        'results': results
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float):
+    """Print changes against a baseline run; flag p95 or throughput regressions beyond threshold"""
+    previous = {(r['scenario'], r['concurrency']): r for r in baseline['results']}
+    print(f"\nCompared with {baseline['revision']} ({baseline['timestamp']}):")
+    print(f"{'scenario':<10} {'conc':>5} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    
+    def change(current: float, before: float) -> str:
+        return f"{(current - before) / before * 100:+.0f}%" if before else "-"
+    
+    for result in report['results']:
+        before = previous.get((result['scenario'], result['concurrency']))
+        if before is None:
+            continue
+        latency, before_latency = result['latency_ms'], before['latency_ms']
+        regressed = (
+            latency['p95'] > before_latency['p95'] * (1 + threshold)
+            or result['rps'] < before['rps'] * (1 - threshold)
+        )
+        print(
+            f"{result['scenario']:<10} {result['concurrency']:>5} "
+            f"{change(result['rps'], before['rps']):>9} "
+            + " ".join(f"{change(latency[p], before_latency[p]):>9}" for p in ('p50', 'p95', 'p99'))
+            + ("  ✗ regression" if regressed else "")
+        )
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Load test the API against local Gemini and Pinecone fakes")
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=["chat", "upload", "documents"],
+        default=["chat", "upload", "documents"]
+    )
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32], help="Concurrent clients per level")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and level")
+    parser.add_argument("--documents", type=int, default=50, help="Documents indexed before the run")
+    parser.add_argument(
+        "--embed-latency", default="40,120",
+        help="Gemini embedding call: median_ms[,p99_ms[,error_rate]]"
+    )
+    parser.add_argument("--generate-latency", default="800,2500", help="Gemini generation call, same format")
+    parser.add_argument("--pinecone-latency", default="20,60", help="Pinecone call, same format")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latencies, failures and generated requests")
+    parser.add_argument("--output", type=Path, help="Results file (default: benchmarks/results/load_<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="Earlier results file to compare against")
+    parser.add_argument(
+        "--regression-threshold", type=float, default=0.10,
+        help="Relative p95 increase or throughput drop flagged as a regression"
+    )
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as data_dir:
+        configure_environment(data_dir)
+        report = asyncio.run(run(args))
+    
+    output = args.output or BACKEND_DIR / "benchmarks" / "results" / f"load_{report['revision']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nSaved results to {output}")
+    
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()), args.regression_threshold)
+
+
+if __name__ == "__main__":
+    main()
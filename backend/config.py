@@ -29,28 +29,131 @@ class Settings(BaseSettings):
     LLM_MODEL: str = "gemini-1.5-flash"
     EMBED_MODEL: str = "text-embedding-004"
     EMBED_DIMENSION: int = 768  # text-embedding-004 dimension
+    EMBED_BATCH_SIZE: int = 100  # batchEmbedContents request limit
+    EMBED_MAX_CONCURRENCY: int = 4
+    EMBED_MAX_RETRIES: int = 3
+    EMBED_RETRY_BACKOFF_SECONDS: float = 0.5
+    
+    # Embedding Cache
+    EMBED_CACHE_ENABLED: bool = True
+    EMBED_CACHE_PATH: str = "data/embedding_cache.sqlite"
+    EMBED_CACHE_MEMORY_SIZE: int = 4096
+    
+    # Vector Store Backend
+    VECTOR_BACKEND: str = "pinecone"  # "pinecone" or "local"
+    UPSERT_BATCH_SIZE: int = 100
+    METADATA_TEXT_MAX_CHARS: int = 8000  # whole chunks fit; Pinecone caps metadata at 40KB
     
     # Pinecone Vector Database
-    PINECONE_API_KEY: str
+    PINECONE_API_KEY: Optional[str] = None  # Required when VECTOR_BACKEND=pinecone
     PINECONE_ENVIRONMENT: str = "us-east-1"
     PINECONE_INDEX_NAME: str = "tilak-academic-site-768"
     
+    # Upstream Concurrency & Timeouts
+    GEMINI_MAX_CONCURRENCY: int = 16
+    GEMINI_TIMEOUT_SECONDS: float = 30.0
+    PINECONE_MAX_CONCURRENCY: int = 16
+    PINECONE_TIMEOUT_SECONDS: float = 10.0
+    
+    # Circuit Breakers & Retries (per backend and process)
+    BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive timeouts/server errors that open a circuit, 0 = off
+    BREAKER_RESET_SECONDS: float = 30.0  # an open circuit lets one probe call through after this
+    PINECONE_MAX_RETRIES: int = 3  # attempts for queries and index stats
+    PINECONE_RETRY_BACKOFF_SECONDS: float = 0.2
+    EMBED_HEDGE_ENABLED: bool = False  # send a second query embedding call when the first is slow
+    EMBED_HEDGE_PERCENTILE: float = 95  # "slow": past this percentile of recent query embedding calls
+    EMBED_HEDGE_MIN_SAMPLES: int = 50  # calls observed before hedging starts
+    
+    # Local Vector Index (VECTOR_BACKEND=local)
+    LOCAL_INDEX_PATH: str = "data/vector_index"
+    LOCAL_INDEX_MODE: str = "auto"  # "exact", "hnsw" (needs hnswlib) or "auto"
+    LOCAL_INDEX_EXACT_MAX_VECTORS: int = 100_000  # auto mode switches to HNSW above this
+    
+    # Hybrid Retrieval (BM25 keyword index fused with dense results)
+    HYBRID_SEARCH_ENABLED: bool = True
+    KEYWORD_INDEX_PATH: str = "data/keyword_index.sqlite"
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    HYBRID_CANDIDATES: int = 20  # results taken from each retriever before fusion
+    KEYWORD_MIN_COVERAGE: float = 0.5  # share of query terms a keyword-only match must contain
+    RRF_K: int = 60  # reciprocal-rank fusion constant
+    
+    # Document Registry (documents, chunk IDs and content hashes)
+    DOCUMENT_REGISTRY_PATH: str = "data/documents.sqlite"
+    DOCUMENTS_PAGE_SIZE: int = 50
+    DOCUMENTS_MAX_PAGE_SIZE: int = 500
+    
+    # Conversation History ("memory" per process, "sqlite" shared by workers)
+    CONVERSATION_STORE: str = "sqlite"
+    CONVERSATION_STORE_PATH: str = "data/conversations.sqlite"
+    CONVERSATION_MAX_TURNS: int = 10  # exchanges kept per conversation
+    CONVERSATION_MAX_CONVERSATIONS: int = 10_000
+    CONVERSATION_MAX_CHARS: int = 50_000_000  # memory store: total history text
+    CONVERSATION_TTL_SECONDS: int = 86400
+    
     # Document Processing
     MAX_FILE_SIZE_MB: int = 10
-    CHUNK_SIZE: int = 1000
+    CHUNK_UNIT: str = "tokens"  # "tokens" (local tokenizer) or "chars"
+    CHUNK_SIZE_TOKENS: int = 200
+    CHUNK_OVERLAP_TOKENS: int = 40
+    CHUNK_SIZE: int = 1000  # characters, CHUNK_UNIT=chars
     CHUNK_OVERLAP: int = 200
     SUPPORTED_EXTENSIONS: list[str] = [".pdf", ".txt", ".md", ".docx"]
+    PDF_WORKERS: int = 0  # page-extraction processes for large PDFs, 0 = CPU count
+    PDF_PARALLEL_MIN_PAGES: int = 64  # smaller PDFs are extracted in-thread
+    PDF_PAGE_BATCH_SIZE: int = 8  # pages per worker task
+    
+    # Upload Queue (per process)
+    UPLOAD_WORKERS: int = 2  # uploads indexed concurrently, 0 = index inline during the request
+    UPLOAD_QUEUE_SIZE: int = 16  # uploads waiting for a worker; more are rejected with 429
+    BATCH_MAX_FILES: int = 200  # files per /upload/batch request, zip entries included
+    BATCH_MAX_TOTAL_MB: int = 50  # uncompressed size per /upload/batch request
     
     # RAG Configuration
     TOP_K_RESULTS: int = 5
     SIMILARITY_THRESHOLD: float = 0.3
-    MAX_CONTEXT_LENGTH: int = 4000
+    MAX_CONTEXT_TOKENS: int = 1000  # prompt budget for retrieved chunks
+    MAX_QUERY_VARIANTS: int = 4  # phrasings retrieved per request, 1 = raw query only
+    
+    # Reranking (over-fetch candidates, re-score, keep TOP_K_RESULTS)
+    RERANK_ENABLED: bool = True
+    RERANK_MODEL: str = "lexical"  # or a sentence-transformers cross-encoder name
+    RERANK_CANDIDATES: int = 30
+    RERANK_BUDGET_MS: float = 50  # slower reranks fall back to retrieval order
+    RERANK_DENSE_WEIGHT: float = 0.5  # lexical model: share of the dense similarity
+    RERANK_MAX_WORKERS: int = 2  # dedicated scoring threads
+    RERANK_MAX_TIMEOUTS: int = 5  # budget misses in a row before a cross-encoder gives way to lexical, 0 = never
     
-    # Rate Limiting
-    RATE_LIMIT_PER_MINUTE: int = 20
+    # Answer Cache
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_ENTRIES: int = 256
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_MAX_DISTANCE: float = 0.05  # cosine distance between query embeddings
     
-    # Logging
+    # Rate Limiting (token bucket per client)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PER_MINUTE: int = 20  # /chat and /chat/stream requests per client
+    RATE_LIMIT_BURST: int = 5  # requests a client can send at once
+    UPLOAD_RATE_LIMIT_PER_MINUTE: int = 10  # /upload and /upload/batch requests per client
+    UPLOAD_RATE_LIMIT_BURST: int = 5
+    RATE_LIMIT_STORE: str = "memory"  # "memory" per process, "sqlite" shared by workers
+    RATE_LIMIT_STORE_PATH: str = "data/rate_limits.sqlite"
+    RATE_LIMIT_KEY_HEADER: Optional[str] = None  # key clients by this header (e.g. an API key checked by a gateway) instead of IP
+    RATE_LIMIT_TRUST_FORWARDED: bool = False  # client IP from X-Forwarded-For, only behind a proxy that sets it
+    
+    # Admission Control (per process, in front of Gemini)
+    CHAT_MAX_IN_FLIGHT: int = 32  # chat requests served at once; more get 429 with Retry-After
+    GEMINI_QUOTA_COOLDOWN_SECONDS: float = 10.0  # chat requests are shed this long after a Gemini quota error
+    
+    # Logging & Metrics
     LOG_LEVEL: str = "INFO"
+    METRICS_ENABLED: bool = True  # Prometheus /metrics endpoint
+    
+    # Tracing
+    TRACE_SAMPLE_RATE: float = 0.01  # fraction of requests traced end to end
+    TRACE_BUFFER_SIZE: int = 200  # recent traces kept in memory for /debug/traces
+    TRACE_EXPORT_PATH: Optional[str] = None  # append traces as OTLP/JSON lines, e.g. data/traces.jsonl
+    TRACE_DEBUG_ENDPOINT: bool = False  # serve /debug/traces (exposes queries)
     
     class Config:
         env_file = ".env"
@@ -1,214 +1,334 @@
 #backend/index_documents.py
 """
-Script to index website documents for RAG
-Run this script to create/update the vector store
+Bulk, resumable document ingestion
+Walks a directory tree, parses files in a process pool with DocumentProcessor,
+embeds in batches and bulk-upserts through VectorStoreService into the same
+index the API serves.
+
+Progress is checkpointed after every upsert, so an interrupted run resumes
+where it stopped; unchanged files are skipped on later runs. Changed files
+are diffed against the document registry chunk by chunk, so only new or edited
+chunks are embedded and vanished chunks are deleted by ID.
+
+Usage:
+    python index_documents.py [PATH ...] [--workers N] [--checkpoint FILE] [--reset]
 """
 
+import argparse
+import asyncio
+import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from models import DocumentChunk, DocumentInfo
+from services import DocumentProcessor, VectorStoreService, DocumentRegistry, DocumentIndexer
+
+DEFAULT_EXCLUDES = [
+    ".git", ".bundle", "node_modules", "vendor", "_site",
+    "venv", ".venv", "__pycache__", "data",
+]
 
-# LangChain imports
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import WebBaseLoader, PyPDFLoader, DirectoryLoader, TextLoader
-from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+# Per-process processor for pool workers
+_processor: Optional[DocumentProcessor] = None
 
-def load_documents(website_url, cv_path=None, markdown_dir=None):
+
+def discover_files(roots: List[Path], excludes: List[str]) -> List[Tuple[Path, str]]:
     """
-    Load documents from various sources
+    Find supported documents under the given roots
     
     Args:
-        website_url: Base URL of the deployed website
-        cv_path: Path to CV PDF file
-        markdown_dir: Directory containing markdown files
-        
+        roots: Files or directories to walk
+        excludes: Directory names to skip
+    
     Returns:
-        List of loaded documents
+        Sorted list of (resolved file path, path relative to its root)
     """
-    documents = []
-    
-    # Load website content
-    if website_url:
-        print(f"Loading website content from {website_url}...")
-        pages = [
-            website_url,
-            f"{website_url}/research",
-            f"{website_url}/publications",
-            f"{website_url}/teaching",
-            f"{website_url}/cv",
-            f"{website_url}/contact",
-        ]
+    extensions = set(settings.SUPPORTED_EXTENSIONS)
+    files: Dict[Path, str] = {}
+    
+    for root in roots:
+        if root.is_file():
+            if root.suffix.lower() in extensions:
+                files.setdefault(root.resolve(), root.name)
+            continue
         
-        for url in pages:
-            try:
-                loader = WebBaseLoader(url)
-                docs = loader.load()
-                documents.extend(docs)
-                print(f"  ✓ Loaded {url}")
-            except Exception as e:
-                print(f"  ✗ Could not load {url}: {e}")
-    
-    # Load CV PDF
-    if cv_path and os.path.exists(cv_path):
-        print(f"\nLoading CV from {cv_path}...")
-        try:
-            loader = PyPDFLoader(cv_path)
-            cv_docs = loader.load()
-            documents.extend(cv_docs)
-            print(f"  ✓ Loaded {len(cv_docs)} pages from CV")
-        except Exception as e:
-            print(f"  ✗ Error loading CV: {e}")
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d not in excludes]
+            for name in filenames:
+                if Path(name).suffix.lower() in extensions:
+                    path = Path(dirpath, name)
+                    files.setdefault(path.resolve(), path.relative_to(root).as_posix())
     
-    # Load markdown files
-    if markdown_dir and os.path.exists(markdown_dir):
-        print(f"\nLoading markdown files from {markdown_dir}...")
-        try:
-            # Load .md files
-            md_files = list(Path(markdown_dir).rglob("*.md"))
-            for md_file in md_files:
-                # Skip certain directories
-                if any(skip in str(md_file) for skip in ['node_modules', '.git', 'vendor']):
-                    continue
-                    
-                try:
-                    loader = TextLoader(str(md_file), encoding='utf-8')
-                    docs = loader.load()
-                    # Add file path to metadata
-                    for doc in docs:
-                        doc.metadata['source'] = str(md_file)
-                    documents.extend(docs)
-                    print(f"  ✓ Loaded {md_file.name}")
-                except Exception as e:
-                    print(f"  ✗ Could not load {md_file.name}: {e}")
-        except Exception as e:
-            print(f"  ✗ Error loading markdown directory: {e}")
+    return sorted(files.items())
+
+
+def document_id_for(relative_path: str) -> str:
+    """
+    Stable document ID derived from the path relative to the indexed root
     
-    return documents
+    Top-level files get the same ID as an /upload of the same filename, and the
+    ID does not change when the checkout moves.
+    """
+    return DocumentIndexer.document_id_for(relative_path)
 
-def create_vector_store(documents, persist_directory="./chroma_db"):
+
+def legacy_document_id_for(path: Path) -> str:
+    """Document ID earlier versions derived from the absolute path"""
+    return DocumentIndexer.document_id_for(str(path))
+
+
+def fingerprint(path: Path) -> str:
+    """Cheap change detector: size and modification time"""
+    stat = path.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_checkpoint(path: Path) -> Dict[str, Dict]:
+    """Load completed files from a previous run"""
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text()).get("files", {})
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"  ✗ Ignoring unreadable checkpoint {path}: {e}")
+        return {}
+
+
+def save_checkpoint(path: Path, files: Dict[str, Dict]):
+    """Atomically persist completed files"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({"files": files}, indent=2))
+    os.replace(tmp, path)
+
+
+def parse_file(
+    path: str,
+    document_id: str,
+    indexed_hash: Optional[str]
+) -> Tuple[str, Optional[List[DocumentChunk]]]:
     """
-    Create vector store from documents
+    Read and chunk one file (runs in a pool worker)
     
-    Args:
-        documents: List of documents to index
-        persist_directory: Directory to persist vector store
-        
     Returns:
-        Created vector store
+        (content hash, chunks), with chunks None if the content is already indexed
     """
-    if not documents:
-        raise ValueError("No documents provided for indexing")
+    global _processor
+    if _processor is None:
+        # Files are already parsed in parallel; no nested page pool
+        _processor = DocumentProcessor(pdf_workers=1)
     
-    print(f"\nProcessing {len(documents)} documents...")
+    file_path = Path(path)
+    content = file_path.read_bytes()
+    content_hash = DocumentIndexer.content_hash(content)
+    if content_hash == indexed_hash:
+        return content_hash, None
     
-    # Split documents into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-        separators=["\n\n", "\n", " ", ""]
+    return content_hash, _processor.process_file_sync(
+        file_content=content,
+        filename=file_path.name,
+        document_id=document_id,
+        metadata={"source": path}
     )
+
+
+async def ingest(
+    files: List[Tuple[Path, str]],
+    checkpoint_path: Path,
+    completed: Dict[str, Dict],
+    workers: int,
+    flush_chunks: int
+) -> Tuple[int, int, int]:
+    """
+    Parse, embed and upsert files, checkpointing after each bulk upsert
     
-    splits = text_splitter.split_documents(documents)
-    print(f"Split into {len(splits)} chunks")
-    
-    # Initialize embeddings
-    print("\nInitializing embeddings model...")
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
+    Returns:
+        (files indexed, chunks indexed, files failed)
+    """
+    indexer = DocumentIndexer(
+        processor=DocumentProcessor(),
+        vector_store=VectorStoreService(),
+        registry=DocumentRegistry(settings.DOCUMENT_REGISTRY_PATH)
     )
+    loop = asyncio.get_running_loop()
     
-    # Create vector store
-    print(f"\nCreating vector store in {persist_directory}...")
+    pending_chunks: List[DocumentChunk] = []
+    pending_files: Dict[str, Dict] = {}
+    pending_commits: List[Tuple[DocumentInfo, str, List[DocumentChunk], List[str]]] = []
+    pending_removals: List[str] = []
+    indexed_files = indexed_chunks = failed = 0
     
-    # Remove existing vector store if it exists
-    if os.path.exists(persist_directory):
-        import shutil
-        shutil.rmtree(persist_directory)
-        print(f"  Removed existing vector store")
+    async def parse(pool, path: Path, relative_path: str):
+        document_id = document_id_for(relative_path)
+        indexed_hash = await indexer.registry.get_document_hash(document_id)
+        try:
+            content_hash, chunks = await loop.run_in_executor(
+                pool, parse_file, str(path), document_id, indexed_hash
+            )
+            return path, document_id, content_hash, chunks, None
+        except Exception as e:
+            return path, document_id, None, [], e
     
-    vector_store = Chroma.from_documents(
-        documents=splits,
-        embedding=embeddings,
-        persist_directory=persist_directory
-    )
+    async def flush():
+        nonlocal indexed_files, indexed_chunks
+        if not pending_files:
+            return
+        if pending_chunks:
+            await indexer.vector_store.upsert_chunks(pending_chunks)
+        # Stale chunks are only dropped once their replacements are in the index
+        for commit in pending_commits:
+            await indexer.commit(*commit)
+        # Copies indexed under the old absolute-path IDs are now superseded
+        for document_id in pending_removals:
+            await indexer.remove_document(document_id)
+        completed.update(pending_files)
+        save_checkpoint(checkpoint_path, completed)
+        indexed_files += len(pending_files)
+        indexed_chunks += len(pending_chunks)
+        print(f"  ✓ Upserted {len(pending_chunks)} chunks from {len(pending_files)} files")
+        pending_chunks.clear()
+        pending_files.clear()
+        pending_commits.clear()
+        pending_removals.clear()
     
-    print(f"  ✓ Vector store created successfully!")
-    print(f"  Total chunks indexed: {len(splits)}")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parses = [parse(pool, path, relative_path) for path, relative_path in files]
+        for next_done in asyncio.as_completed(parses):
+            path, document_id, content_hash, chunks, error = await next_done
+            
+            if isinstance(error, ValueError):
+                # Empty or unparseable content: leave whatever is indexed alone and only
+                # remember the fingerprint, so the file is retried once it changes
+                print(f"  - Skipped {path.name}: {error}")
+                previous = completed.get(str(path), {"document_id": document_id, "chunks": 0})
+                pending_files[str(path)] = {**previous, "fingerprint": fingerprint(path)}
+                continue
+            elif error is not None:
+                failed += 1
+                print(f"  ✗ Could not parse {path.name}: {error}")
+                continue
+            
+            if chunks is None:
+                # Touched but identical content: only the fingerprint is refreshed
+                print(f"  - Unchanged {path.name}")
+                chunk_count = completed.get(str(path), {}).get("chunks", 0)
+            else:
+                changed, stale_ids = await indexer.diff_chunks(document_id, chunks)
+                pending_chunks.extend(changed)
+                info = indexer.build_info(
+                    document_id, path.name, len(chunks), path.stat().st_size, {"source": str(path)}
+                )
+                pending_commits.append((info, content_hash or "", chunks, stale_ids))
+                legacy_id = legacy_document_id_for(path)
+                if legacy_id != document_id and await indexer.registry.get(legacy_id):
+                    pending_removals.append(legacy_id)
+                chunk_count = len(chunks)
+                if chunks:
+                    print(
+                        f"  ✓ Parsed {path.name}: {len(chunks)} chunks, "
+                        f"{len(changed)} new or changed, {len(stale_ids)} removed"
+                    )
+            
+            pending_files[str(path)] = {
+                "document_id": document_id,
+                "fingerprint": fingerprint(path),
+                "chunks": chunk_count
+            }
+            
+            if len(pending_chunks) >= flush_chunks:
+                await flush()
+        
+        await flush()
     
-    return vector_store
+    return indexed_files, indexed_chunks, failed
+
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Index documents for the RAG backend")
+    parser.add_argument(
+        "paths", nargs="*", type=Path,
+        default=[Path(os.getenv("MARKDOWN_DIR", "../"))],
+        help="Files or directories to index (default: $MARKDOWN_DIR or ../)"
+    )
+    parser.add_argument(
+        "--checkpoint", type=Path, default=Path("data/ingest_checkpoint.json"),
+        help="Progress file used to resume interrupted runs"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="Parser processes"
+    )
+    parser.add_argument(
+        "--flush-chunks", type=int,
+        default=settings.EMBED_BATCH_SIZE * settings.EMBED_MAX_CONCURRENCY,
+        help="Chunks to accumulate before each bulk embed + upsert"
+    )
+    parser.add_argument(
+        "--exclude", action="append", default=list(DEFAULT_EXCLUDES),
+        help="Directory name to skip (repeatable)"
+    )
+    parser.add_argument(
+        "--reset", action="store_true",
+        help="Ignore the checkpoint and re-index everything"
+    )
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("Document Indexing for RAG System")
     print("=" * 60)
     
-    # Configuration
-    # Update these values based on your setup
-    WEBSITE_URL = os.getenv("WEBSITE_URL", "https://yourusername.github.io")
-    CV_PATH = os.getenv("CV_PATH", "../assets/cv.pdf")
-    MARKDOWN_DIR = os.getenv("MARKDOWN_DIR", "../")
-    PERSIST_DIR = "./chroma_db"
-    
     print("\nConfiguration:")
-    print(f"  Website URL: {WEBSITE_URL}")
-    print(f"  CV Path: {CV_PATH}")
-    print(f"  Markdown Directory: {MARKDOWN_DIR}")
-    print(f"  Vector Store Directory: {PERSIST_DIR}")
-    
-    # Check if markdown directory exists
-    if not os.path.exists(MARKDOWN_DIR):
-        print(f"\nWarning: Markdown directory not found: {MARKDOWN_DIR}")
-        response = input("Continue anyway? (y/n): ")
-        if response.lower() != 'y':
-            print("Exiting...")
-            return
-    
-    # Load documents
-    print("\n" + "=" * 60)
-    print("Loading Documents")
-    print("=" * 60)
+    print(f"  Paths: {', '.join(str(p) for p in args.paths)}")
+    print(f"  Vector Backend: {settings.VECTOR_BACKEND}")
+    print(f"  Checkpoint: {args.checkpoint}")
+    print(f"  Parser Workers: {args.workers}")
     
-    documents = load_documents(
-        website_url=WEBSITE_URL,
-        cv_path=CV_PATH if os.path.exists(CV_PATH) else None,
-        markdown_dir=MARKDOWN_DIR
-    )
+    files = discover_files(args.paths, args.exclude)
+    completed = {} if args.reset else load_checkpoint(args.checkpoint)
     
-    if not documents:
-        print("\n❌ Error: No documents could be loaded!")
-        print("\nTroubleshooting:")
-        print("  1. Make sure your website is deployed and accessible")
-        print("  2. Add your CV PDF to the assets directory")
-        print("  3. Check that markdown files exist in the specified directory")
-        sys.exit(1)
+    max_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+    todo = []
+    for path, relative_path in files:
+        if path.stat().st_size > max_bytes:
+            print(f"  ✗ Skipping {path} (larger than {settings.MAX_FILE_SIZE_MB}MB)")
+        elif completed.get(str(path), {}).get("fingerprint") != fingerprint(path):
+            todo.append((path, relative_path))
     
-    print(f"\n✓ Successfully loaded {len(documents)} documents")
+    print(f"\nFound {len(files)} documents, {len(todo)} new or changed")
+    if not todo:
+        print("\n✓ Index is up to date")
+        return
     
-    # Create vector store
     print("\n" + "=" * 60)
-    print("Creating Vector Store")
+    print("Indexing Documents")
     print("=" * 60)
     
     try:
-        vector_store = create_vector_store(documents, PERSIST_DIR)
-        
-        print("\n" + "=" * 60)
-        print("✓ Indexing Complete!")
-        print("=" * 60)
-        print("\nYou can now run the FastAPI backend:")
-        print("  python app.py")
-        print("\nOr deploy to Vercel:")
-        print("  vercel --prod")
-        
+        indexed_files, indexed_chunks, failed = asyncio.run(ingest(
+            todo, args.checkpoint, completed, args.workers, args.flush_chunks
+        ))
+    except KeyboardInterrupt:
+        print("\nInterrupted - progress saved, re-run to resume")
+        sys.exit(130)
     except Exception as e:
-        print(f"\n❌ Error creating vector store: {e}")
+        print(f"\n❌ Error indexing documents: {e}")
+        print("Progress up to the last upsert is saved, re-run to resume")
         sys.exit(1)
+    
+    print("\n" + "=" * 60)
+    print("✓ Indexing Complete!")
+    print("=" * 60)
+    print(f"  Files indexed: {indexed_files}")
+    print(f"  Chunks embedded: {indexed_chunks}")
+    if failed:
+        print(f"  Files failed: {failed}")
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
-
@@ -88,6 +88,14 @@ class DocumentUploadResponse(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 
+class BatchUploadResponse(BaseModel):
+    """Per-file results of a batch upload"""
+    documents: List[DocumentUploadResponse]
+    completed: int
+    failed: int
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+
 class DocumentInfo(BaseModel):
     """Information about a stored document"""
     document_id: str
@@ -103,6 +111,7 @@ class DocumentListResponse(BaseModel):
     """List of documents in the system"""
     documents: List[DocumentInfo]
     total_count: int
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, if any")
 
 
 class HealthResponse(BaseModel):
@@ -111,6 +120,7 @@ class HealthResponse(BaseModel):
     version: str
     timestamp: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
     services: Dict[str, str] = {}
+    circuit_breakers: Dict[str, Dict[str, Any]] = {}
 
 
 class ErrorResponse(BaseModel):
@@ -136,7 +146,10 @@ class DocumentChunk(BaseModel):
 
 class RetrievalResult(BaseModel):
     """Result from vector search"""
+    chunk_id: Optional[str] = None
     text: str
-    score: float
+    score: Optional[float] = None  # Cosine similarity; None if only keyword search found the chunk
+    keyword_score: Optional[float] = None  # Share of query terms matched, for keyword matches
+    fused_score: Optional[float] = None  # Reciprocal-rank fusion score, for hybrid search
     metadata: Dict[str, Any]
 
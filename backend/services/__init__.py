@@ -2,8 +2,18 @@
 Services package
 """
 from .document_processor import DocumentProcessor
+from .embedding_service import EmbeddingService
 from .vector_store import VectorStoreService
 from .llm_service import LLMService
+from .answer_cache import AnswerCache
+from .document_registry import DocumentRegistry
+from .indexer import DocumentIndexer
+from .keyword_index import KeywordIndex
+from .reranker import Reranker
+from .upload_queue import UploadQueue
+from .rate_limiter import RateLimiter, AdmissionLimiter
 
-__all__ = ['DocumentProcessor', 'VectorStoreService', 'LLMService']
+__all__ = ['DocumentProcessor', 'EmbeddingService', 'VectorStoreService', 'LLMService', 'AnswerCache',
+           'DocumentRegistry', 'DocumentIndexer', 'KeywordIndex', 'Reranker', 'UploadQueue',
+           'RateLimiter', 'AdmissionLimiter']
 
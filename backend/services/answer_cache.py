@@ -0,0 +1,162 @@
+"""
+Semantic answer cache
+Serves a cached ChatResponse when a new query embeds close enough to a previous one
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from models import ChatResponse
+from utils.logger import get_logger
+from utils.metrics import CACHE_LOOKUPS
+
+logger = get_logger(__name__)
+
+
+class AnswerCache:
+    """LRU + TTL cache of chat answers, matched by cosine distance of query embeddings"""
+    
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600, max_distance: float = 0.05):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        
+        # Slot-addressed matrix of normalized query embeddings, allocated on first store
+        self._matrix: Optional[np.ndarray] = None
+        self._free_slots: List[int] = list(range(max_entries - 1, -1, -1))
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        
+        # Bumped whenever a document changes; entries remember the versions they saw
+        self._document_versions: Dict[str, int] = {}
+        # Newest registry generation seen; catches changes made by other workers
+        self._corpus_version = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def lookup(self, query_embedding: List[float], corpus_version: int = 0) -> Optional[ChatResponse]:
+        """
+        Find a cached answer for a semantically equivalent query
+        
+        Args:
+            query_embedding: Embedding of the incoming query
+            corpus_version: Current document registry generation
+        
+        Returns:
+            Cached ChatResponse, or None on a miss
+        """
+        self._observe(corpus_version)
+        if not self._entries:
+            self.misses += 1
+            CACHE_LOOKUPS.labels("answer", "miss").inc()
+            return None
+        
+        query = self._normalize(query_embedding)
+        slots = np.fromiter(self._entries.keys(), dtype=np.int64, count=len(self._entries))
+        distances = 1.0 - self._matrix[slots] @ query
+        
+        now = time.monotonic()
+        for position in np.argsort(distances):
+            if distances[position] > self.max_distance:
+                break
+            slot = int(slots[position])
+            entry = self._entries[slot]
+            if entry['expires_at'] <= now or not self._is_current(entry):
+                self._release(slot)
+                self.invalidations += 1
+                continue
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            CACHE_LOOKUPS.labels("answer", "hit").inc()
+            return entry['response']
+        
+        self.misses += 1
+        CACHE_LOOKUPS.labels("answer", "miss").inc()
+        return None
+    
+    def store(self, query_embedding: List[float], response: ChatResponse, corpus_version: int = 0):
+        """
+        Cache an answer under its query embedding
+        
+        Args:
+            query_embedding: Embedding of the answered query
+            response: Response returned to the user
+            corpus_version: Registry generation read before retrieval
+        """
+        self._observe(corpus_version)
+        if corpus_version < self._corpus_version:
+            # The corpus changed while this answer was being generated
+            return
+        
+        vector = self._normalize(query_embedding)
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+        
+        if not self._free_slots:
+            oldest = next(iter(self._entries))
+            self._release(oldest)
+            self.evictions += 1
+        
+        slot = self._free_slots.pop()
+        self._matrix[slot] = vector
+        document_ids = {
+            source.get('metadata', {}).get('document_id', '') for source in response.sources
+        }
+        self._entries[slot] = {
+            'response': response,
+            'document_versions': {
+                doc_id: self._document_versions.get(doc_id, 0) for doc_id in document_ids
+            },
+            'expires_at': time.monotonic() + self.ttl_seconds
+        }
+    
+    def invalidate_document(self, document_id: str):
+        """Mark every cached answer citing this document as stale"""
+        self._document_versions[document_id] = self._document_versions.get(document_id, 0) + 1
+    
+    def clear(self):
+        """Drop all cached answers (e.g. when new content may change any retrieval set)"""
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'entries': len(self._entries)
+        }
+    
+    def _observe(self, corpus_version: int):
+        """Drop everything cached once another worker has changed the corpus"""
+        if corpus_version > self._corpus_version:
+            self._corpus_version = corpus_version
+            self.clear()
+    
+    def _is_current(self, entry: Dict[str, Any]) -> bool:
+        """Check that no document in the cached retrieval set has changed"""
+        return all(
+            self._document_versions.get(doc_id, 0) == version
+            for doc_id, version in entry['document_versions'].items()
+        )
+    
+    def _release(self, slot: int):
+        """Remove an entry and return its slot to the free list"""
+        del self._entries[slot]
+        self._free_slots.append(slot)
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """Convert to a unit-length float32 vector"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
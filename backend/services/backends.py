@@ -0,0 +1,329 @@
+"""
+Upstream backend gateways
+Bounded, timed async access to Gemini and Pinecone shared by all services,
+with a circuit breaker per backend and retries for idempotent calls
+"""
+import asyncio
+import functools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+import urllib3
+from google.api_core import exceptions as google_exceptions
+from pinecone.exceptions import ServiceException
+
+from config import settings
+from utils.logger import get_logger
+from utils.metrics import CIRCUIT_STATE, UPSTREAM_IN_FLIGHT, UPSTREAM_RETRIES, UPSTREAM_TIMEOUTS
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open"""
+    
+    def __init__(self, backend: str, retry_after: float):
+        super().__init__(f"{backend} is unavailable (circuit open), retry in {retry_after:.0f}s")
+        self.backend = backend
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with half-open probing
+    
+    closed: calls pass; failure_threshold failures in a row open the circuit.
+    open: calls fail at once with CircuitOpenError for reset_timeout seconds.
+    half_open: one probe call at a time passes; its success closes the
+    circuit, its failure opens it for another reset_timeout.
+    A failure_threshold of 0 disables the breaker.
+    """
+    
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    # rag_circuit_state values
+    GAUGE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+    
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self._gauge = CIRCUIT_STATE.labels(name)
+        self._set_state(self.CLOSED)
+        self._opened_at = 0.0
+        self._probing = False
+    
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+    
+    def acquire(self) -> bool:
+        """
+        Admit a call
+        
+        Returns:
+            Whether the call is the half-open probe
+        
+        Raises:
+            CircuitOpenError: The circuit is open, or half-open with a probe in flight
+        """
+        if self.failure_threshold <= 0:
+            return False
+        state = self.state
+        if state == self.CLOSED:
+            return False
+        if state == self.HALF_OPEN and not self._probing:
+            self._set_state(self.HALF_OPEN)
+            self._probing = True
+            return True
+        
+        self.rejected += 1
+        remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+        raise CircuitOpenError(self.name, max(remaining, 1.0))
+    
+    def record(self, probe: bool, failed: Optional[bool]):
+        """
+        Record the outcome of an admitted call
+        
+        Args:
+            probe: Whether it was the half-open probe
+            failed: Whether the backend failed; None if the call was cancelled
+        """
+        if self.failure_threshold <= 0:
+            return
+        if probe:
+            self._probing = False
+        if failed is None:
+            return
+        
+        if not failed:
+            self.consecutive_failures = 0
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+                self._set_state(self.CLOSED)
+            return
+        
+        self.consecutive_failures += 1
+        if probe or (self._state == self.CLOSED and self.consecutive_failures >= self.failure_threshold):
+            logger.warning(
+                f"Circuit for {self.name} opened after {self.consecutive_failures} failures, "
+                f"probing again in {self.reset_timeout:g}s"
+            )
+            self._set_state(self.OPEN)
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+    
+    def _set_state(self, state: str):
+        """Change state and publish it (an open circuit reads 2 until its probe is admitted)"""
+        self._state = state
+        self._gauge.set(self.GAUGE_VALUES[state])
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected
+        }
+
+
+class BackendExecutor:
+    """
+    Concurrency cap, per-call timeout and circuit breaker for one upstream backend
+    
+    Calls failing with one of failure_errors (timeouts, connection and server
+    errors) count towards opening the circuit; any other outcome shows the
+    backend is answering. Calls failing with one of quota_errors start a
+    cooldown of quota_cooldown seconds, which admission control uses to shed
+    requests until the quota has had time to recover.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        timeout: float,
+        threaded: bool = False,
+        failure_errors: Tuple[Type[BaseException], ...] = (TimeoutError, ConnectionError),
+        quota_errors: Tuple[Type[BaseException], ...] = (),
+        quota_cooldown: float = 0.0
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.failure_errors = failure_errors
+        self.quota_errors = quota_errors
+        self.quota_cooldown = quota_cooldown
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._cooldown_until = 0.0
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.BREAKER_RESET_SECONDS
+        )
+        
+        # Dedicated worker threads for SDKs without a native async client
+        self._executor: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix=f"{name}-io"
+        ) if threaded else None
+        
+        self._in_flight_gauge = UPSTREAM_IN_FLIGHT.labels(name)
+        self._in_flight_gauge.set(0)
+    
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one concurrency slot (e.g. for the lifetime of a stream)
+        
+        Raises:
+            CircuitOpenError: The backend's circuit is open; nothing is waited for
+        """
+        probe = self.breaker.acquire()
+        try:
+            async with self._semaphore:
+                self.in_flight += 1
+                self._in_flight_gauge.inc()
+                try:
+                    yield
+                except self.quota_errors:
+                    self._cooldown_until = max(self._cooldown_until, time.monotonic() + self.quota_cooldown)
+                    raise
+                finally:
+                    self.in_flight -= 1
+                    self._in_flight_gauge.dec()
+        except self.failure_errors:
+            self.breaker.record(probe, failed=True)
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.record(probe, failed=None)
+            raise
+        except Exception:
+            # The backend answered, with an error of the request's own
+            self.breaker.record(probe, failed=False)
+            raise
+        else:
+            self.breaker.record(probe, failed=False)
+    
+    def is_quota_error(self, error: BaseException) -> bool:
+        return isinstance(error, self.quota_errors)
+    
+    def cooldown_remaining(self) -> float:
+        """Seconds left of the cooldown after the last quota error (0 if none)"""
+        return max(self._cooldown_until - time.monotonic(), 0.0)
+    
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Await a native coroutine within the concurrency cap and timeout
+        
+        Args:
+            func: Async callable
+            *args, **kwargs: Arguments for func
+        
+        Returns:
+            Result of func
+        """
+        async with self.slot():
+            try:
+                return await asyncio.wait_for(func(*args, **kwargs), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                UPSTREAM_TIMEOUTS.labels(self.name).inc()
+                raise
+    
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking call on the backend's dedicated thread pool
+        
+        Args:
+            func: Blocking callable
+            *args, **kwargs: Arguments for func
+        
+        Returns:
+            Result of func
+        """
+        loop = asyncio.get_running_loop()
+        async with self.slot():
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs)),
+                    timeout=self.timeout
+                )
+            except asyncio.TimeoutError:
+                UPSTREAM_TIMEOUTS.labels(self.name).inc()
+                raise
+    
+    def shutdown(self):
+        """Release worker threads"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def retry_idempotent(
+    attempt: Callable[[], Awaitable[T]],
+    backend: str,
+    retryable: Tuple[Type[BaseException], ...],
+    max_attempts: int,
+    backoff: float,
+    description: str
+) -> T:
+    """
+    Run an idempotent upstream call, retrying transient failures
+    
+    Waits backoff * 2^(n-1) seconds after the nth failure, jittered by
+    +-50% so that callers failing together don't retry together. An open
+    circuit is never retried.
+    
+    Args:
+        attempt: Makes one call
+        backend: Backend name for the retry counter
+        retryable: Errors worth retrying
+        max_attempts: Calls made at most
+        backoff: Base delay in seconds
+        description: What is being called, for logs
+    
+    Returns:
+        Result of the first successful call
+    """
+    for number in range(1, max_attempts + 1):
+        try:
+            return await attempt()
+        except retryable as e:
+            if number >= max_attempts:
+                logger.error(f"{description} failed after {number} attempts: {str(e)}")
+                raise
+            delay = backoff * (2 ** (number - 1)) * (0.5 + random.random())
+            logger.warning(f"{description} failed (attempt {number}), retrying in {delay:.2f}s: {str(e)}")
+            UPSTREAM_RETRIES.labels(backend).inc()
+            await asyncio.sleep(delay)
+
+
+# Gemini exposes native asyncio (gRPC aio) calls; Pinecone's client is blocking
+gemini_backend = BackendExecutor(
+    name="gemini",
+    max_concurrency=settings.GEMINI_MAX_CONCURRENCY,
+    timeout=settings.GEMINI_TIMEOUT_SECONDS,
+    failure_errors=(TimeoutError, ConnectionError, google_exceptions.ServerError),
+    quota_errors=(google_exceptions.ResourceExhausted,),
+    quota_cooldown=settings.GEMINI_QUOTA_COOLDOWN_SECONDS
+)
+
+pinecone_backend = BackendExecutor(
+    name="pinecone",
+    max_concurrency=settings.PINECONE_MAX_CONCURRENCY,
+    timeout=settings.PINECONE_TIMEOUT_SECONDS,
+    threaded=True,
+    failure_errors=(TimeoutError, ConnectionError, ServiceException, urllib3.exceptions.HTTPError)
+)
+
+# Transient Pinecone errors worth retrying for idempotent calls
+PINECONE_RETRYABLE_ERRORS = pinecone_backend.failure_errors
@@ -0,0 +1,249 @@
+"""
+Conversation stores
+Bounded chat history: an in-process LRU+TTL store and a SQLite store shared by workers
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Any
+
+from config import settings
+from utils.logger import get_logger
+from utils.metrics import CONVERSATIONS
+
+logger = get_logger(__name__)
+
+History = List[Dict[str, Any]]
+
+
+def _history_size(history: History) -> int:
+    """Approximate memory held by a history (characters of text)"""
+    return sum(len(part) for message in history for part in message['parts'])
+
+
+class ConversationStore(ABC):
+    """Chat history keyed by conversation ID"""
+    
+    def __init__(self, max_turns: int, ttl_seconds: float):
+        self.max_messages = max_turns * 2
+        self.ttl_seconds = ttl_seconds
+        self._evictions = {'lru': 0, 'expired': 0}
+    
+    @abstractmethod
+    async def get(self, conversation_id: str) -> History:
+        """History in Gemini chat format, oldest first (empty if unknown or expired)"""
+    
+    @abstractmethod
+    async def append(self, conversation_id: str, query: str, answer: str):
+        """Add one exchange, keeping only the most recent max_turns"""
+    
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        """Size and eviction counters"""
+    
+    def _extend(self, history: History, query: str, answer: str) -> History:
+        history = history + [
+            {'role': 'user', 'parts': [query]},
+            {'role': 'model', 'parts': [answer]}
+        ]
+        return history[-self.max_messages:]
+
+
+class MemoryConversationStore(ConversationStore):
+    """Process-local store bounded by conversation count, total text size and TTL"""
+    
+    def __init__(self, max_conversations: int, max_chars: int, max_turns: int, ttl_seconds: float):
+        super().__init__(max_turns, ttl_seconds)
+        self.max_conversations = max_conversations
+        self.max_chars = max_chars
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._chars = 0
+        CONVERSATIONS.set(0)
+    
+    async def get(self, conversation_id: str) -> History:
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return []
+        if entry['expires_at'] <= time.monotonic():
+            self._remove(conversation_id)
+            self._evictions['expired'] += 1
+            CONVERSATIONS.set(len(self._entries))
+            return []
+        self._entries.move_to_end(conversation_id)
+        return list(entry['history'])
+    
+    async def append(self, conversation_id: str, query: str, answer: str):
+        history = self._extend(await self.get(conversation_id), query, answer)
+        self._remove(conversation_id)
+        
+        size = _history_size(history)
+        self._entries[conversation_id] = {
+            'history': history,
+            'size': size,
+            'expires_at': time.monotonic() + self.ttl_seconds
+        }
+        self._chars += size
+        self._evict()
+        CONVERSATIONS.set(len(self._entries))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'memory',
+            'conversations': len(self._entries),
+            'chars': self._chars,
+            'max_conversations': self.max_conversations,
+            'max_chars': self.max_chars,
+            'evictions': dict(self._evictions)
+        }
+    
+    def _remove(self, conversation_id: str):
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self._chars -= entry['size']
+    
+    def _evict(self):
+        """Drop expired entries from the LRU end, then least recently used ones over budget"""
+        now = time.monotonic()
+        while self._entries:
+            oldest_id, oldest = next(iter(self._entries.items()))
+            if oldest['expires_at'] <= now:
+                self._remove(oldest_id)
+                self._evictions['expired'] += 1
+            elif len(self._entries) > self.max_conversations or self._chars > self.max_chars:
+                self._remove(oldest_id)
+                self._evictions['lru'] += 1
+            else:
+                break
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Store shared by all workers through one SQLite file (WAL)"""
+    
+    # Expired and over-cap conversations are pruned every this many appends
+    PRUNE_INTERVAL = 100
+    
+    def __init__(self, path: str, max_conversations: int, max_turns: int, ttl_seconds: float):
+        super().__init__(max_turns, ttl_seconds)
+        self.max_conversations = max_conversations
+        self._appends = 0
+        self._lock = threading.Lock()
+        
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit connection; writes use explicit BEGIN IMMEDIATE so workers serialize
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "conversation_id TEXT PRIMARY KEY, history TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at)"
+        )
+        CONVERSATIONS.set(self._count())
+    
+    async def get(self, conversation_id: str) -> History:
+        return await asyncio.to_thread(self._get_sync, conversation_id)
+    
+    async def append(self, conversation_id: str, query: str, answer: str):
+        await asyncio.to_thread(self._append_sync, conversation_id, query, answer)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count = self._count()
+        return {
+            'backend': 'sqlite',
+            'conversations': count,
+            'max_conversations': self.max_conversations,
+            'evictions': dict(self._evictions)
+        }
+    
+    def _get_sync(self, conversation_id: str) -> History:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT history, updated_at FROM conversations WHERE conversation_id = ?",
+                (conversation_id,)
+            ).fetchone()
+        if row is None or row[1] + self.ttl_seconds <= time.time():
+            return []
+        return json.loads(row[0])
+    
+    def _append_sync(self, conversation_id: str, query: str, answer: str):
+        with self._lock:
+            # Read-modify-write in one transaction so concurrent workers don't lose turns
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT history, updated_at FROM conversations WHERE conversation_id = ?",
+                    (conversation_id,)
+                ).fetchone()
+                now = time.time()
+                history = json.loads(row[0]) if row and row[1] + self.ttl_seconds > now else []
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO conversations (conversation_id, history, updated_at) "
+                    "VALUES (?, ?, ?)",
+                    (conversation_id, json.dumps(self._extend(history, query, answer)), now)
+                )
+                
+                self._appends += 1
+                if self._appends % self.PRUNE_INTERVAL == 0:
+                    self._prune(now)
+                
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            # Includes other workers' conversations; each worker reports the same total
+            CONVERSATIONS.set(self._count())
+    
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+    
+    def _prune(self, now: float):
+        """Delete expired conversations, then the least recently updated over the cap"""
+        expired = self._conn.execute(
+            "DELETE FROM conversations WHERE updated_at <= ?", (now - self.ttl_seconds,)
+        ).rowcount
+        overflow = self._conn.execute(
+            "DELETE FROM conversations WHERE conversation_id IN ("
+            "SELECT conversation_id FROM conversations ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_conversations,)
+        ).rowcount
+        self._evictions['expired'] += expired
+        self._evictions['lru'] += overflow
+
+
+def create_conversation_store(backend: str) -> ConversationStore:
+    """
+    Build the conversation store selected in settings
+    
+    Args:
+        backend: "memory" or "sqlite"
+    
+    Returns:
+        ConversationStore implementation (memory if the SQLite file can't be opened)
+    """
+    if backend == "sqlite":
+        try:
+            return SQLiteConversationStore(
+                path=settings.CONVERSATION_STORE_PATH,
+                max_conversations=settings.CONVERSATION_MAX_CONVERSATIONS,
+                max_turns=settings.CONVERSATION_MAX_TURNS,
+                ttl_seconds=settings.CONVERSATION_TTL_SECONDS
+            )
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Conversation store unavailable, keeping history in memory: {str(e)}")
+    elif backend != "memory":
+        raise ValueError(f"Unsupported conversation store: {backend}")
+    
+    return MemoryConversationStore(
+        max_conversations=settings.CONVERSATION_MAX_CONVERSATIONS,
+        max_chars=settings.CONVERSATION_MAX_CHARS,
+        max_turns=settings.CONVERSATION_MAX_TURNS,
+        ttl_seconds=settings.CONVERSATION_TTL_SECONDS
+    )
@@ -2,12 +2,20 @@
 Document processing service
 Handles PDF, TXT, MD, DOCX parsing and intelligent chunking
 """
+import asyncio
 import io
+import os
 import re
-from typing import List, Dict, Any
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from pathlib import Path
 import hashlib
 
+import numpy as np
+
 # Document parsing libraries
 from pypdf import PdfReader
 import docx
@@ -15,17 +23,76 @@ import docx
 from models import DocumentChunk, DocumentType
 from config import settings
 from utils.logger import get_logger
+from utils.metrics import observe_stage, timed_iter
+from utils.tokenizer import token_prefix
+from utils.tracing import traced
 
 logger = get_logger(__name__)
 
+# Cleaned text with the start and end offsets of its sentences
+SentenceBlock = Tuple[str, np.ndarray, np.ndarray]
+
+# Cleaning rules: whitespace runs collapse to one space, then control characters are removed
+WHITESPACE_PATTERN = re.compile(r'\s+')
+CONTROL_CHAR_PATTERN = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]')
+
+# Character class by code point, derived from the patterns: 0 kept, 1 whitespace, 2 removed.
+# No code point above U+3000 matches either; the last entry stands for all of them.
+_KEEP, _SPACE, _REMOVE = 0, 1, 2
+_CHAR_CLASS = np.array([
+    _SPACE if WHITESPACE_PATTERN.match(chr(code))
+    else _REMOVE if CONTROL_CHAR_PATTERN.match(chr(code))
+    else _KEEP
+    for code in range(0x3002)
+], dtype=np.uint8)
+
+# PDF opened once per page-extraction worker process
+_worker_pdf: Optional[PdfReader] = None
+
+
+def _init_pdf_worker(content: bytes):
+    """Pool initializer: parse the PDF once per worker"""
+    global _worker_pdf
+    _worker_pdf = PdfReader(io.BytesIO(content))
+
+
+def _extract_pdf_pages(page_range: Tuple[int, int]) -> List[Optional[str]]:
+    """Extract a range of pages in a pool worker"""
+    return [_worker_pdf.pages[i].extract_text() for i in range(*page_range)]
+
+
+def _encode(text: str) -> np.ndarray:
+    """Code points of text as an array: one byte each for ASCII text"""
+    if text.isascii():
+        return np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    return np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+
+
+def _decode(codes: np.ndarray) -> str:
+    """Text of a contiguous code point array, decoded in place"""
+    if codes.dtype == np.uint8:
+        return str(codes.data, 'ascii')
+    return str(codes.data, 'utf-32-le', 'surrogatepass')
+
 
 class DocumentProcessor:
     """Process and chunk documents for RAG"""
     
-    def __init__(self):
-        self.chunk_size = settings.CHUNK_SIZE
-        self.chunk_overlap = settings.CHUNK_OVERLAP
+    def __init__(self, pdf_workers: Optional[int] = None, chunk_unit: Optional[str] = None):
+        # Chunk size and overlap are measured in tokens or characters
+        self.chunk_unit = chunk_unit or settings.CHUNK_UNIT
+        if self.chunk_unit == "tokens":
+            self.chunk_size = settings.CHUNK_SIZE_TOKENS
+            self.chunk_overlap = settings.CHUNK_OVERLAP_TOKENS
+        elif self.chunk_unit == "chars":
+            self.chunk_size = settings.CHUNK_SIZE
+            self.chunk_overlap = settings.CHUNK_OVERLAP
+        else:
+            raise ValueError(f"Unsupported chunk unit: {self.chunk_unit}")
+        # Processes for page-parallel extraction of large PDFs (1 disables the pool)
+        self.pdf_workers = pdf_workers or settings.PDF_WORKERS or os.cpu_count() or 1
     
+    @traced("DocumentProcessor.process_file")
     async def process_file(
         self,
         file_content: bytes,
@@ -36,6 +103,30 @@ class DocumentProcessor:
         """
         Process uploaded file and create chunks
         
+        Args:
+            file_content: Raw file bytes
+            filename: Original filename
+            document_id: Unique document identifier
+            metadata: Additional metadata
+            
+        Returns:
+            List of DocumentChunk objects
+        """
+        # Parsing is CPU-bound: keep it off the event loop
+        return await asyncio.to_thread(
+            self.process_file_sync, file_content, filename, document_id, metadata
+        )
+    
+    def process_file_sync(
+        self,
+        file_content: bytes,
+        filename: str,
+        document_id: str,
+        metadata: Dict[str, Any] = None
+    ) -> List[DocumentChunk]:
+        """
+        Blocking variant of process_file, safe to run in worker threads or processes
+        
         Args:
             file_content: Raw file bytes
             filename: Original filename
@@ -49,15 +140,21 @@ class DocumentProcessor:
             # Detect document type
             doc_type = self._get_document_type(filename)
             
-            # Extract text based on type
-            text = await self._extract_text(file_content, doc_type)
+            # Stream text pieces (PDF pages, DOCX paragraphs) straight into the chunker,
+            # so only the current sentence and chunk are held, never the whole text
+            # Extraction and chunking interleave; time extraction separately
+            extraction = [0.0]
+            started = time.perf_counter()
+            pieces = timed_iter(self._iter_text(file_content, doc_type), extraction)
+            chunks = list(self._chunk_blocks(
+                self._iter_sentence_blocks(pieces), document_id, filename, metadata or {}
+            ))
+            observe_stage("parse", extraction[0])
+            observe_stage("chunk", time.perf_counter() - started - extraction[0])
             
-            if not text or len(text.strip()) < 10:
+            if not chunks or (len(chunks) == 1 and len(chunks[0].text) < 10):
                 raise ValueError(f"Insufficient text extracted from {filename}")
             
-            # Create chunks with intelligent splitting
-            chunks = self._create_chunks(text, document_id, filename, metadata or {})
-            
             logger.info(f"Processed {filename}: {len(chunks)} chunks created")
             return chunks
             
@@ -65,55 +162,113 @@ class DocumentProcessor:
             logger.error(f"Error processing {filename}: {str(e)}")
             raise
     
-    async def _extract_text(self, content: bytes, doc_type: DocumentType) -> str:
+    def _extract_text(self, content: bytes, doc_type: DocumentType) -> str:
         """Extract text from different document types"""
+        return "\n\n".join(self._iter_text(content, doc_type))
+    
+    def _iter_text(self, content: bytes, doc_type: DocumentType) -> Iterator[str]:
+        """Yield text pieces of a document; joined with blank lines they form its full text"""
         try:
             if doc_type == DocumentType.PDF:
-                return self._extract_from_pdf(content)
+                yield from self._iter_pdf_pages(content)
             elif doc_type == DocumentType.DOCX:
-                return self._extract_from_docx(content)
+                yield from self._iter_docx_paragraphs(content)
             elif doc_type in [DocumentType.TXT, DocumentType.MD]:
-                return content.decode('utf-8', errors='ignore')
+                yield content.decode('utf-8', errors='ignore')
             else:
                 raise ValueError(f"Unsupported document type: {doc_type}")
         except Exception as e:
             logger.error(f"Text extraction failed: {str(e)}")
             raise
     
-    def _extract_from_pdf(self, content: bytes) -> str:
-        """Extract text from PDF"""
+    def _iter_pdf_pages(self, content: bytes) -> Iterator[str]:
+        """Yield PDF pages one at a time, fanned out across processes for large files"""
         try:
-            pdf_file = io.BytesIO(content)
-            reader = PdfReader(pdf_file)
+            reader = PdfReader(io.BytesIO(content))
+            num_pages = len(reader.pages)
+            
+            if self.pdf_workers > 1 and num_pages >= settings.PDF_PARALLEL_MIN_PAGES:
+                page_texts = self._extract_pages_parallel(content, num_pages)
+            else:
+                page_texts = (page.extract_text() for page in reader.pages)
             
-            text_parts = []
-            for page_num, page in enumerate(reader.pages, 1):
-                page_text = page.extract_text()
+            for page_num, page_text in enumerate(page_texts, 1):
                 if page_text:
                     # Add page marker for metadata
-                    text_parts.append(f"[Page {page_num}]\n{page_text}")
-            
-            return "\n\n".join(text_parts)
+                    yield f"[Page {page_num}]\n{page_text}"
         except Exception as e:
             logger.error(f"PDF extraction error: {str(e)}")
             raise ValueError(f"Failed to extract text from PDF: {str(e)}")
     
-    def _extract_from_docx(self, content: bytes) -> str:
-        """Extract text from DOCX"""
+    def _extract_pages_parallel(self, content: bytes, num_pages: int) -> Iterator[Optional[str]]:
+        """
+        Extract pages in a process pool, in page order
+        
+        Only a window of page batches is in flight, so memory stays bounded
+        by the window rather than the document.
+        """
+        batch_size = settings.PDF_PAGE_BATCH_SIZE
+        ranges = ((start, min(start + batch_size, num_pages)) for start in range(0, num_pages, batch_size))
+        
+        with ProcessPoolExecutor(
+            max_workers=self.pdf_workers,
+            initializer=_init_pdf_worker,
+            initargs=(content,)
+        ) as pool:
+            window = deque(
+                pool.submit(_extract_pdf_pages, page_range)
+                for page_range in islice(ranges, self.pdf_workers * 2)
+            )
+            while window:
+                page_texts = window.popleft().result()
+                next_range = next(ranges, None)
+                if next_range is not None:
+                    window.append(pool.submit(_extract_pdf_pages, next_range))
+                yield from page_texts
+    
+    def _iter_docx_paragraphs(self, content: bytes) -> Iterator[str]:
+        """Yield non-empty DOCX paragraphs"""
         try:
             doc_file = io.BytesIO(content)
             doc = docx.Document(doc_file)
             
-            text_parts = []
             for para in doc.paragraphs:
                 if para.text.strip():
-                    text_parts.append(para.text)
-            
-            return "\n\n".join(text_parts)
+                    yield para.text
         except Exception as e:
             logger.error(f"DOCX extraction error: {str(e)}")
             raise ValueError(f"Failed to extract text from DOCX: {str(e)}")
     
+    def _iter_sentence_blocks(self, pieces: Iterable[str]) -> Iterator[SentenceBlock]:
+        """
+        Clean streamed text pieces and yield blocks of complete sentences
+        
+        The last sentence of a piece may continue in the next one, so it is
+        held back and re-split together with the following piece.
+        """
+        pending = ""
+        for piece in pieces:
+            text, starts, ends = self._normalize(piece)
+            if not text:
+                continue
+            if pending:
+                # The joining space is a boundary only after sentence punctuation and before a capital
+                offset = len(pending) + 1
+                if pending[-1] in ".!?" and "A" <= text[0] <= "Z":
+                    starts = np.concatenate(([0], starts + offset))
+                    ends = np.concatenate(([len(pending)], ends + offset))
+                else:
+                    starts = np.concatenate(([0], starts[1:] + offset))
+                    ends = ends + offset
+                text = f"{pending} {text}"
+            
+            if len(starts) > 1:
+                yield text, starts[:-1], ends[:-1]
+            pending = text[int(starts[-1]):]
+        
+        if pending:
+            yield pending, *self._sentence_bounds(pending)
+    
     def _create_chunks(
         self,
         text: str,
@@ -125,49 +280,85 @@ class DocumentProcessor:
         Create intelligent chunks with semantic boundaries
         Uses sentence-aware splitting to maintain context
         """
-        # Clean and normalize text
-        text = self._clean_text(text)
+        # Clean and normalize text, locating sentences for intelligent chunking
+        text, starts, ends = self._normalize(text)
+        blocks = [(text, starts, ends)] if text else []
         
-        # Split into sentences for intelligent chunking
-        sentences = self._split_into_sentences(text)
+        return list(self._chunk_blocks(blocks, document_id, filename, metadata))
+    
+    def _chunk_blocks(
+        self,
+        blocks: Iterable[SentenceBlock],
+        document_id: str,
+        filename: str,
+        metadata: Dict[str, Any]
+    ) -> Iterator[DocumentChunk]:
+        """
+        Pack sentences into overlapping chunks as blocks arrive
         
-        chunks = []
-        current_chunk = []
-        current_length = 0
+        Chunks are sentence ranges found by binary search over prefix sums of
+        sentence sizes (tokens or characters), so the Python-level work is
+        per chunk rather than per sentence. Chunk text is a single slice of the block wherever its
+        sentences are separated by exactly one space. Sentences of the
+        unfinished chunk are carried into the next block.
+        """
         chunk_index = 0
+        carry_text, carry_lengths = "", np.zeros(0, dtype=np.int64)
+        carry_sizes = np.zeros(0, dtype=np.int64)
         
-        for sentence in sentences:
-            sentence_length = len(sentence)
+        for text, starts, ends in blocks:
+            sizes = self._sentence_sizes(text, starts, ends)
+            if len(carry_lengths):
+                # Carried sentences are re-laid out single-space separated, as in chunk text
+                offset = len(carry_text) + 1
+                text = f"{carry_text} {text}"
+                carry_starts = np.concatenate(([0], np.cumsum(carry_lengths[:-1] + 1)))
+                starts = np.concatenate((carry_starts, starts + offset))
+                ends = np.concatenate((carry_starts + carry_lengths, ends + offset))
+                sizes = np.concatenate((carry_sizes, sizes))
+            count = len(starts)
             
-            # Check if adding this sentence exceeds chunk size
-            if current_length + sentence_length > self.chunk_size and current_chunk:
-                # Create chunk from accumulated sentences
-                chunk_text = " ".join(current_chunk)
-                chunk = self._create_chunk(
-                    chunk_text, document_id, filename, chunk_index, metadata
-                )
-                chunks.append(chunk)
+            # prefix[j]: size of the sentences before j
+            prefix = np.concatenate(([0], np.cumsum(sizes)))
+            # irregular[j]: gaps up to sentence j that are not exactly one space
+            irregular = np.concatenate(([0], np.cumsum(starts[1:] - ends[:-1] != 1)))
+            
+            def chunk_text(first: int, last: int) -> str:
+                if irregular[last - 1] == irregular[first]:
+                    return text[starts[first]:ends[last - 1]]
+                return " ".join(text[starts[j]:ends[j]] for j in range(first, last))
+            
+            # The carried sentences are the current chunk
+            first = 0
+            next_sentence = len(carry_lengths)
+            while True:
+                # First sentence whose addition pushes the chunk past chunk_size
+                lo = max(next_sentence, first + 1) + 1
+                i = lo + int(np.searchsorted(prefix[lo:], prefix[first] + self.chunk_size, side='right')) - 1
+                if i >= count:
+                    break
                 
-                # Start new chunk with overlap
-                overlap_sentences = self._get_overlap_sentences(
-                    current_chunk, self.chunk_overlap
+                yield self._create_chunk(
+                    chunk_text(first, i), document_id, filename, chunk_index, metadata
                 )
-                current_chunk = overlap_sentences + [sentence]
-                current_length = sum(len(s) for s in current_chunk)
                 chunk_index += 1
-            else:
-                current_chunk.append(sentence)
-                current_length += sentence_length
+                
+                # Overlap: the shortest tail of the chunk of at least chunk_overlap
+                overlap_start = first + int(np.searchsorted(
+                    prefix[first:i + 1], prefix[i] - self.chunk_overlap, side='right'
+                )) - 1
+                first = max(overlap_start, first)
+                next_sentence = i + 1
+            
+            carry_text = chunk_text(first, count)
+            carry_lengths = ends[first:] - starts[first:]
+            carry_sizes = sizes[first:]
         
         # Add final chunk
-        if current_chunk:
-            chunk_text = " ".join(current_chunk)
-            chunk = self._create_chunk(
-                chunk_text, document_id, filename, chunk_index, metadata
+        if len(carry_lengths):
+            yield self._create_chunk(
+                carry_text, document_id, filename, chunk_index, metadata
             )
-            chunks.append(chunk)
-        
-        return chunks
     
     def _create_chunk(
         self,
@@ -198,33 +389,111 @@ class DocumentProcessor:
     @staticmethod
     def _clean_text(text: str) -> str:
         """Clean and normalize text"""
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        # Remove special characters that might cause issues
-        text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', text)
-        return text.strip()
+        return DocumentProcessor._clean_codes(text)[0]
     
     @staticmethod
-    def _split_into_sentences(text: str) -> List[str]:
-        """Split text into sentences using regex"""
-        # Split on sentence boundaries
-        sentence_endings = r'(?<=[.!?])\s+(?=[A-Z])'
-        sentences = re.split(sentence_endings, text)
-        return [s.strip() for s in sentences if s.strip()]
+    def _normalize(text: str) -> SentenceBlock:
+        """
+        Clean text and locate its sentences, encoding it only once
+        
+        Args:
+            text: Raw text
+        
+        Returns:
+            (cleaned text, sentence start offsets, sentence end offsets); no
+            sentences for text that cleans to nothing
+        """
+        text, codes = DocumentProcessor._clean_codes(text)
+        if not text:
+            return text, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return text, *DocumentProcessor._code_bounds(codes)
     
     @staticmethod
-    def _get_overlap_sentences(sentences: List[str], overlap_chars: int) -> List[str]:
-        """Get sentences for overlap based on character count"""
-        overlap_sentences = []
-        char_count = 0
-        
-        for sentence in reversed(sentences):
-            if char_count >= overlap_chars:
-                break
-            overlap_sentences.insert(0, sentence)
-            char_count += len(sentence)
-        
-        return overlap_sentences
+    def _clean_codes(text: str) -> Tuple[str, np.ndarray]:
+        """
+        Clean text with array operations on its code points
+        
+        Same result as collapsing WHITESPACE_PATTERN runs to a space, then
+        removing CONTROL_CHAR_PATTERN characters and stripping, without the two
+        regex passes and intermediate strings: the text is encoded once,
+        filtered in one gather, and decoded once (not at all if already clean).
+        
+        Args:
+            text: Raw text
+        
+        Returns:
+            (cleaned text, its code points)
+        """
+        codes = _encode(text)
+        if not len(codes):
+            return "", codes
+        if codes.dtype == np.uint8:
+            char_class = _CHAR_CLASS[codes]
+        else:
+            char_class = _CHAR_CLASS[np.minimum(codes, len(_CHAR_CLASS) - 1)]
+        space = char_class == _SPACE
+        # Keep the first character of each whitespace run (run boundaries as in
+        # the original text) and everything but control characters
+        keep = char_class != _REMOVE
+        del char_class
+        keep[1:] &= ~(space[1:] & space[:-1])
+        
+        cleaned = codes[keep]
+        if len(cleaned) == len(codes) and not space[0] and not space[-1] and not (codes[space] != 32).any():
+            # Already clean: reuse the input string
+            return text, codes
+        cleaned[space[keep]] = 32
+        del space, keep
+        
+        # Strip
+        is_text = cleaned != 32
+        if not is_text.any():
+            return "", cleaned[:0]
+        cleaned = cleaned[int(np.argmax(is_text)):len(cleaned) - int(np.argmax(is_text[::-1]))]
+        return _decode(cleaned), cleaned
+    
+    def _sentence_sizes(self, text: str, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Size of each sentence in the chunk unit"""
+        if self.chunk_unit == "chars":
+            return ends - starts
+        prefix = token_prefix(text)
+        return (prefix[ends] - prefix[starts]).astype(np.int64)
+    
+    @staticmethod
+    def _sentence_bounds(text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Locate sentences in cleaned text without copying them
+        
+        Equivalent to splitting on r'(?<=[.!?])\s+(?=[A-Z])': in cleaned text
+        the only whitespace is ' ', so boundaries are space runs between
+        sentence punctuation and a capital letter, found with array scans.
+        
+        Args:
+            text: Cleaned, non-empty text (no leading/trailing whitespace)
+        
+        Returns:
+            (start offsets, end offsets) of each sentence
+        """
+        return DocumentProcessor._code_bounds(_encode(text))
+    
+    @staticmethod
+    def _code_bounds(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """_sentence_bounds on the code points of the text"""
+        # +1 where a run of spaces starts, -1 just past where it ends
+        edges = np.diff((codes == 32).view(np.int8), prepend=np.int8(0), append=np.int8(0))
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+        
+        before = codes[run_starts - 1]
+        after = codes[run_ends]
+        is_boundary = (
+            ((before == 46) | (before == 33) | (before == 63))  # . ! ?
+            & (after >= 65) & (after <= 90)  # A-Z
+        )
+        
+        starts = np.concatenate(([0], run_ends[is_boundary]))
+        ends = np.concatenate((run_starts[is_boundary], [len(codes)]))
+        return starts, ends
     
     @staticmethod
     def _get_document_type(filename: str) -> DocumentType:
@@ -0,0 +1,323 @@
+"""
+Document registry
+Durable SQLite record of indexed documents, their chunk IDs and content hashes
+"""
+import asyncio
+import base64
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+from models import DocumentInfo, DocumentStatus, DocumentType
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_DOCUMENT_COLUMNS = (
+    "document_id, filename, document_type, upload_date, chunk_count, status, metadata"
+)
+
+
+class DocumentRegistry:
+    """Document catalogue shared by all workers through one SQLite file (WAL)"""
+    
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = self._connect(path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                document_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                document_type TEXT NOT NULL,
+                upload_date TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                content_hash TEXT,
+                metadata TEXT NOT NULL DEFAULT '{}'
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents(filename);
+            CREATE INDEX IF NOT EXISTS idx_documents_date ON documents(upload_date, document_id);
+            CREATE INDEX IF NOT EXISTS idx_documents_status
+                ON documents(status, upload_date, document_id);
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                document_id TEXT NOT NULL,
+                content_hash TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_document ON chunks(document_id);
+            CREATE TABLE IF NOT EXISTS corpus (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                generation INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO corpus (id, generation) VALUES (0, 0);
+            """
+        )
+    
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        """Open the registry file; fall back to an in-memory database if it isn't writable"""
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit connection; writes use explicit BEGIN IMMEDIATE so workers serialize
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            return conn
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(
+                f"Document registry file unavailable, keeping documents in memory (per process): {str(e)}"
+            )
+            return sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+    
+    # ----------------------------------------
+    # Reads
+    # ----------------------------------------
+    
+    async def get(self, document_id: str) -> Optional[DocumentInfo]:
+        """Look up a document by ID"""
+        rows = await asyncio.to_thread(
+            self._query,
+            f"SELECT {_DOCUMENT_COLUMNS} FROM documents WHERE document_id = ?",
+            (document_id,)
+        )
+        return self._to_info(rows[0]) if rows else None
+    
+    async def find_by_filename(self, filename: str) -> List[DocumentInfo]:
+        """All documents uploaded under a filename, newest first"""
+        rows = await asyncio.to_thread(
+            self._query,
+            f"SELECT {_DOCUMENT_COLUMNS} FROM documents WHERE filename = ? "
+            "ORDER BY upload_date DESC, document_id DESC",
+            (filename,)
+        )
+        return [self._to_info(row) for row in rows]
+    
+    async def list_documents(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        status: Optional[DocumentStatus] = None
+    ) -> Tuple[List[DocumentInfo], Optional[str]]:
+        """
+        Page through documents, newest first
+        
+        Args:
+            limit: Page size
+            cursor: Opaque cursor from the previous page
+            status: Optional status filter
+        
+        Returns:
+            (documents, cursor for the next page or None)
+        """
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status.value)
+        if cursor:
+            upload_date, document_id = self._decode_cursor(cursor)
+            clauses.append("(upload_date, document_id) < (?, ?)")
+            params.extend([upload_date, document_id])
+        
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = await asyncio.to_thread(
+            self._query,
+            f"SELECT {_DOCUMENT_COLUMNS} FROM documents {where} "
+            "ORDER BY upload_date DESC, document_id DESC LIMIT ?",
+            (*params, limit + 1)
+        )
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_cursor(rows[-1][3], rows[-1][0])
+        return [self._to_info(row) for row in rows], next_cursor
+    
+    async def count(self, status: Optional[DocumentStatus] = None) -> int:
+        """Number of documents, optionally with a given status"""
+        if status is None:
+            rows = await asyncio.to_thread(self._query, "SELECT COUNT(*) FROM documents", ())
+        else:
+            rows = await asyncio.to_thread(
+                self._query, "SELECT COUNT(*) FROM documents WHERE status = ?", (status.value,)
+            )
+        return rows[0][0]
+    
+    async def get_document_hash(self, document_id: str) -> Optional[str]:
+        """Content hash of the last indexed version of a document"""
+        rows = await asyncio.to_thread(
+            self._query,
+            "SELECT content_hash FROM documents WHERE document_id = ?",
+            (document_id,)
+        )
+        return rows[0][0] if rows else None
+    
+    async def generation(self) -> int:
+        """
+        Corpus version, bumped by every save and delete from any worker
+        
+        Returns:
+            Generation counter; answers computed under an older one may be stale
+        """
+        rows = await asyncio.to_thread(self._query, "SELECT generation FROM corpus WHERE id = 0", ())
+        return rows[0][0] if rows else 0
+    
+    async def get_chunk_hashes(self, document_id: str) -> Dict[str, str]:
+        """Map of chunk_id to content hash for a document's indexed chunks"""
+        rows = await asyncio.to_thread(
+            self._query,
+            "SELECT chunk_id, content_hash FROM chunks WHERE document_id = ?",
+            (document_id,)
+        )
+        return dict(rows)
+    
+    # ----------------------------------------
+    # Writes
+    # ----------------------------------------
+    
+    async def save(
+        self,
+        info: DocumentInfo,
+        content_hash: Optional[str] = None,
+        chunk_hashes: Optional[Dict[str, str]] = None
+    ):
+        """
+        Insert or replace a document record
+        
+        Args:
+            info: Document information
+            content_hash: Hash of the whole document (kept if None)
+            chunk_hashes: Map of chunk_id to chunk content hash (kept if None)
+        """
+        await asyncio.to_thread(self._save_sync, info, content_hash, chunk_hashes)
+    
+    async def set_status(
+        self,
+        document_id: str,
+        status: DocumentStatus,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Update a document's processing status
+        
+        Args:
+            document_id: Document identifier
+            status: New status
+            metadata: Optional keys merged into the document metadata (None values remove keys)
+        """
+        await asyncio.to_thread(self._write, [(
+            "UPDATE documents SET status = ?, metadata = json_patch(metadata, ?) WHERE document_id = ?",
+            (status.value, json.dumps(metadata or {}, default=str), document_id)
+        )])
+    
+    async def set_progress(self, document_id: str, chunks_embedded: int, chunks_total: int):
+        """Record indexing progress of a processing document"""
+        progress = {'chunks_embedded': chunks_embedded, 'chunks_total': chunks_total}
+        await asyncio.to_thread(self._write, [(
+            "UPDATE documents SET chunk_count = ?, metadata = json_set(metadata, '$.progress', json(?)) "
+            "WHERE document_id = ?",
+            (chunks_total, json.dumps(progress), document_id)
+        )])
+    
+    async def delete(self, document_id: str):
+        """Forget a document and its chunks"""
+        await asyncio.to_thread(self._write, [
+            ("DELETE FROM chunks WHERE document_id = ?", (document_id,)),
+            ("DELETE FROM documents WHERE document_id = ?", (document_id,)),
+        ], changes_corpus=True)
+    
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    
+    def _save_sync(
+        self,
+        info: DocumentInfo,
+        content_hash: Optional[str],
+        chunk_hashes: Optional[Dict[str, str]]
+    ):
+        """Write the document row and its chunks in one transaction"""
+        statements = [(
+            f"INSERT INTO documents ({_DOCUMENT_COLUMNS}, content_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(document_id) DO UPDATE SET "
+            "filename = excluded.filename, document_type = excluded.document_type, "
+            "upload_date = excluded.upload_date, chunk_count = excluded.chunk_count, "
+            "status = excluded.status, metadata = excluded.metadata, "
+            "content_hash = COALESCE(excluded.content_hash, documents.content_hash)",
+            (
+                info.document_id,
+                info.filename,
+                info.document_type.value,
+                info.upload_date.isoformat(timespec='microseconds'),
+                info.chunk_count,
+                info.status.value,
+                json.dumps(info.metadata, default=str),
+                content_hash
+            )
+        )]
+        if chunk_hashes is not None:
+            statements.append(("DELETE FROM chunks WHERE document_id = ?", (info.document_id,)))
+            statements.append((
+                "INSERT OR REPLACE INTO chunks (chunk_id, document_id, content_hash) VALUES (?, ?, ?)",
+                [(chunk_id, info.document_id, chunk_hash) for chunk_id, chunk_hash in chunk_hashes.items()]
+            ))
+        self._write(statements, changes_corpus=True)
+    
+    def _query(self, sql: str, params: tuple) -> List[tuple]:
+        """Run a read query"""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+    
+    def _write(self, statements: List[Tuple[str, Any]], changes_corpus: bool = False):
+        """
+        Run statements in one cross-process transaction
+        
+        Args:
+            statements: (sql, params) pairs; a list of params runs executemany
+            changes_corpus: Also bump the corpus generation, in the same transaction
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    if isinstance(params, list):
+                        self._conn.executemany(sql, params)
+                    else:
+                        self._conn.execute(sql, params)
+                if changes_corpus:
+                    self._conn.execute("UPDATE corpus SET generation = generation + 1 WHERE id = 0")
+                self._conn.execute("COMMIT")
+            except Exception as e:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"Document registry write failed: {str(e)}")
+                raise
+    
+    @staticmethod
+    def _to_info(row: tuple) -> DocumentInfo:
+        """Build DocumentInfo from a documents row"""
+        document_id, filename, document_type, upload_date, chunk_count, status, metadata = row
+        return DocumentInfo(
+            document_id=document_id,
+            filename=filename,
+            document_type=DocumentType(document_type),
+            upload_date=datetime.fromisoformat(upload_date),
+            chunk_count=chunk_count,
+            status=DocumentStatus(status),
+            metadata=json.loads(metadata)
+        )
+    
+    @staticmethod
+    def _encode_cursor(upload_date: str, document_id: str) -> str:
+        return base64.urlsafe_b64encode(json.dumps([upload_date, document_id]).encode()).decode()
+    
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[str, str]:
+        try:
+            upload_date, document_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return str(upload_date), str(document_id)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
@@ -0,0 +1,159 @@
+"""
+Content-addressed embedding cache
+In-process LRU in front of a persistent SQLite store, keyed by model, task type and text hash
+"""
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class EmbeddingCache:
+    """Two-level (memory + SQLite) cache of embedding vectors"""
+    
+    def __init__(self, model: str, path: Optional[str] = None, memory_size: int = 4096):
+        self.model = model
+        self.memory_size = memory_size
+        # float32 arrays: a quarter of the size of lists of Python floats
+        self._memory: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if path:
+            self._open(path)
+    
+    def _open(self, path: str):
+        """Open (or create) the on-disk store; fall back to memory only on failure"""
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, task_type TEXT NOT NULL, "
+                "vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+            logger.info(f"Embedding cache opened at {path}")
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Embedding cache disk store unavailable ({str(e)}), using memory only")
+            self._conn = None
+    
+    def make_key(self, text: str, task_type: str) -> str:
+        """Build the cache key from model, task type and normalized text"""
+        normalized = unicodedata.normalize("NFC", " ".join(text.split()))
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"{self.model}:{task_type}:{digest}"
+    
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up several keys at once
+        
+        Args:
+            keys: Cache keys from make_key (duplicates are looked up and counted once)
+        
+        Returns:
+            Mapping of found keys to their vectors
+        """
+        found: Dict[str, array] = {}
+        missing: List[str] = []
+        unique_keys = list(dict.fromkeys(keys))
+        
+        with self._lock:
+            for key in unique_keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                else:
+                    missing.append(key)
+            self.memory_hits += len(found)
+            
+            if missing and self._conn is not None:
+                try:
+                    for start in range(0, len(missing), 500):
+                        batch = missing[start:start + 500]
+                        rows = self._conn.execute(
+                            f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                            batch
+                        ).fetchall()
+                        for key, blob in rows:
+                            vector = array('f', blob)
+                            found[key] = vector
+                            self._remember(key, vector)
+                            self.disk_hits += 1
+                except sqlite3.Error as e:
+                    # Whatever could not be read is embedded again like any other miss
+                    logger.warning(f"Embedding cache disk lookup failed: {str(e)}")
+            
+            self.misses += len(unique_keys) - len(found)
+        
+        return {key: vector.tolist() for key, vector in found.items()}
+    
+    def put_many(self, entries: Dict[str, List[float]], task_type: str):
+        """
+        Store freshly computed vectors
+        
+        Args:
+            entries: Mapping of cache keys to vectors
+            task_type: Embedding task type the vectors were computed for
+        """
+        if not entries:
+            return
+        
+        vectors = {key: array('f', vector) for key, vector in entries.items()}
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+            
+            if self._conn is not None:
+                try:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, model, task_type, vector) VALUES (?, ?, ?, ?)",
+                        [
+                            (key, self.model, task_type, vector.tobytes())
+                            for key, vector in vectors.items()
+                        ]
+                    )
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to persist {len(entries)} embeddings: {str(e)}")
+    
+    def _remember(self, key: str, vector: array):
+        """Insert into the in-process LRU, evicting the least recently used entries"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current sizes"""
+        with self._lock:
+            disk_entries = 0
+            if self._conn is not None:
+                try:
+                    disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                except sqlite3.Error as e:
+                    logger.warning(f"Embedding cache disk count failed: {str(e)}")
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_entries': disk_entries
+            }
@@ -0,0 +1,215 @@
+"""
+Embedding service using Google's embedding model
+Groups texts into provider-sized batches and embeds them concurrently with the async client
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from config import settings
+from utils.logger import get_logger
+from utils.metrics import CACHE_LOOKUPS, TOKENS, UPSTREAM_HEDGES, UPSTREAM_THROTTLES, time_stage
+from utils.tokenizer import count_tokens
+from .backends import CircuitBreaker, gemini_backend, retry_idempotent
+from .embedding_cache import EmbeddingCache
+
+logger = get_logger(__name__)
+
+# Errors worth retrying: quota, transient upstream failures and timeouts
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class EmbeddingService:
+    """
+    Batched, concurrent embedding generation with per-batch retry
+    
+    Single query embeddings can be hedged: when a call takes longer than
+    EMBED_HEDGE_PERCENTILE of recent ones, an identical second call is sent
+    and whichever answers first is used.
+    """
+    
+    # Recent single query embedding latencies kept for the hedging threshold
+    HEDGE_WINDOW = 200
+    
+    def __init__(self):
+        self.model = f"models/{settings.EMBED_MODEL}"
+        self.batch_size = settings.EMBED_BATCH_SIZE
+        self.max_retries = settings.EMBED_MAX_RETRIES
+        self.retry_backoff = settings.EMBED_RETRY_BACKOFF_SECONDS
+        self._semaphore = asyncio.Semaphore(settings.EMBED_MAX_CONCURRENCY)
+        self.hedge_enabled = settings.EMBED_HEDGE_ENABLED
+        self._query_latencies: deque = deque(maxlen=self.HEDGE_WINDOW)
+        self.cache = EmbeddingCache(
+            model=settings.EMBED_MODEL,
+            path=settings.EMBED_CACHE_PATH,
+            memory_size=settings.EMBED_CACHE_MEMORY_SIZE
+        ) if settings.EMBED_CACHE_ENABLED else None
+        
+        genai.configure(api_key=settings.GOOGLE_API_KEY)
+    
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for many document texts
+        
+        Args:
+            texts: Input texts to embed
+        
+        Returns:
+            Embeddings in the same order as the input texts
+        """
+        with time_stage("embed"):
+            return await self._embed_cached(texts, "retrieval_document")
+    
+    async def embed_query(self, query: str) -> List[float]:
+        """
+        Generate embedding for a search query
+        
+        Args:
+            query: Search query text
+        
+        Returns:
+            List of embedding values
+        """
+        with time_stage("query_embed"):
+            embeddings = await self._embed_cached([query], "retrieval_query", hedge=self.hedge_enabled)
+        return embeddings[0]
+    
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for several search queries in one batched call
+        
+        Args:
+            queries: Search query texts
+        
+        Returns:
+            Embeddings in the same order as the queries
+        """
+        with time_stage("query_embed"):
+            return await self._embed_cached(queries, "retrieval_query")
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Embedding cache hit/miss counters (empty when caching is disabled)"""
+        return self.cache.get_stats() if self.cache else {}
+    
+    def hedge_threshold(self) -> Optional[float]:
+        """Seconds after which a query embedding call is hedged, None until enough calls are seen"""
+        if len(self._query_latencies) < max(settings.EMBED_HEDGE_MIN_SAMPLES, 1):
+            return None
+        ordered = sorted(self._query_latencies)
+        position = min(int(len(ordered) * settings.EMBED_HEDGE_PERCENTILE / 100), len(ordered) - 1)
+        return ordered[position]
+    
+    async def _embed_cached(self, texts: List[str], task_type: str, hedge: bool = False) -> List[List[float]]:
+        """Serve texts from the cache and embed only the distinct misses"""
+        if not texts:
+            return []
+        if self.cache is None:
+            return await self._embed_uncached(texts, task_type, hedge)
+        
+        keys = [self.cache.make_key(text, task_type) for text in texts]
+        found = await asyncio.to_thread(self.cache.get_many, keys)
+        
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        
+        hits = sum(1 for key in keys if key in found)
+        CACHE_LOOKUPS.labels("embedding", "hit").inc(hits)
+        CACHE_LOOKUPS.labels("embedding", "miss").inc(len(keys) - hits)
+        
+        if missing:
+            embeddings = await self._embed_uncached(list(missing.values()), task_type, hedge)
+            fresh = dict(zip(missing.keys(), embeddings))
+            await asyncio.to_thread(self.cache.put_many, fresh, task_type)
+            found.update(fresh)
+        
+        return [found[key] for key in keys]
+    
+    async def _embed_uncached(self, texts: List[str], task_type: str, hedge: bool = False) -> List[List[float]]:
+        """Split texts into provider-sized batches and embed them concurrently"""
+        batches = [
+            texts[start:start + self.batch_size]
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        
+        if hedge and len(batches) == 1:
+            results = [await self._embed_hedged(batches[0], task_type)]
+        else:
+            results = await asyncio.gather(*(
+                self._embed_batch(batch, task_type) for batch in batches
+            ))
+        TOKENS.labels("embedding").inc(sum(count_tokens(text) for text in texts))
+        
+        logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches")
+        return [embedding for batch in results for embedding in batch]
+    
+    async def _embed_hedged(self, texts: List[str], task_type: str) -> List[List[float]]:
+        """Embed one batch, sending a second identical call if the first is slower than usual"""
+        started = time.monotonic()
+        threshold = self.hedge_threshold()
+        primary = asyncio.create_task(self._embed_batch(texts, task_type))
+        pending = {primary}
+        hedged = False
+        try:
+            if threshold is not None:
+                done, _ = await asyncio.wait(pending, timeout=threshold)
+                # A struggling backend gets no extra load
+                if not done and gemini_backend.breaker.state == CircuitBreaker.CLOSED:
+                    pending.add(asyncio.create_task(self._embed_batch(texts, task_type)))
+                    hedged = True
+            
+            # First success wins; a failure only counts once nothing else is pending
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is None and pending:
+                    continue
+                winner = winner or done.pop()
+                if hedged:
+                    UPSTREAM_HEDGES.labels("gemini", "primary" if winner is primary else "hedge").inc()
+                result = winner.result()
+                break
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        # Latency as the caller saw it, so hedged calls still register as slow ones
+        self._query_latencies.append(time.monotonic() - started)
+        return result
+    
+    async def _embed_batch(self, texts: List[str], task_type: str) -> List[List[float]]:
+        """Embed one provider-sized batch, retrying transient failures with backoff"""
+        async def attempt() -> List[List[float]]:
+            try:
+                async with self._semaphore:
+                    result = await gemini_backend.call(
+                        genai.embed_content_async,
+                        model=self.model,
+                        content=texts,
+                        task_type=task_type
+                    )
+            except google_exceptions.ResourceExhausted:
+                UPSTREAM_THROTTLES.labels("gemini").inc()
+                raise
+            return result['embedding']
+        
+        return await retry_idempotent(
+            attempt,
+            backend=gemini_backend.name,
+            retryable=RETRYABLE_ERRORS,
+            max_attempts=self.max_retries,
+            backoff=self.retry_backoff,
+            description=f"Embedding batch of {len(texts)}"
+        )
@@ -0,0 +1,315 @@
+"""
+Incremental document indexer
+Diffs documents and chunks against the registry so only new or changed chunks are embedded
+"""
+import asyncio
+import hashlib
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Tuple, Callable, Awaitable, Optional
+
+from config import settings
+from models import DocumentChunk, DocumentInfo, DocumentStatus, DocumentType
+from utils.logger import get_logger
+from utils.tracing import traced
+from .document_processor import DocumentProcessor
+from .document_registry import DocumentRegistry
+from .vector_store import VectorStoreService
+
+logger = get_logger(__name__)
+
+
+class DocumentIndexer:
+    """Index documents incrementally using per-document and per-chunk content hashes"""
+    
+    def __init__(
+        self,
+        processor: DocumentProcessor,
+        vector_store: VectorStoreService,
+        registry: DocumentRegistry
+    ):
+        self.processor = processor
+        self.vector_store = vector_store
+        self.registry = registry
+    
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        """Stable content hash for documents and chunks"""
+        return hashlib.sha256(data).hexdigest()[:32]
+    
+    @staticmethod
+    def document_id_for(name: str) -> str:
+        """Stable document ID, so re-indexing the same source updates it in place"""
+        return hashlib.sha256(name.encode()).hexdigest()[:16]
+    
+    @staticmethod
+    def build_info(
+        document_id: str,
+        filename: str,
+        chunk_count: int,
+        size_bytes: int,
+        metadata: Dict[str, Any] = None,
+        status: DocumentStatus = DocumentStatus.COMPLETED
+    ) -> DocumentInfo:
+        """Registry record for a freshly indexed (or newly queued) document"""
+        return DocumentInfo(
+            document_id=document_id,
+            filename=filename,
+            document_type=DocumentType(Path(filename).suffix.lower().lstrip('.')),
+            upload_date=datetime.utcnow(),
+            chunk_count=chunk_count,
+            status=status,
+            metadata={"file_size_mb": round(size_bytes / (1024 * 1024), 2), **(metadata or {})}
+        )
+    
+    async def is_unchanged(self, document_id: str, content_hash: str) -> bool:
+        """Check whether this exact document content is already indexed"""
+        return await self.registry.get_document_hash(document_id) == content_hash
+    
+    async def diff_chunks(
+        self,
+        document_id: str,
+        chunks: List[DocumentChunk]
+    ) -> Tuple[List[DocumentChunk], List[str]]:
+        """
+        Compare freshly created chunks with the indexed ones
+        
+        Args:
+            document_id: Document identifier
+            chunks: Chunks of the new document version
+        
+        Returns:
+            (chunks that are new or changed, IDs of chunks that disappeared)
+        """
+        previous = await self.registry.get_chunk_hashes(document_id)
+        
+        changed = []
+        for chunk in chunks:
+            chunk_hash = self.content_hash(chunk.text.encode())
+            chunk.metadata['content_hash'] = chunk_hash
+            if previous.get(chunk.chunk_id) != chunk_hash:
+                changed.append(chunk)
+        
+        current_ids = {chunk.chunk_id for chunk in chunks}
+        stale_ids = [chunk_id for chunk_id in previous if chunk_id not in current_ids]
+        return changed, stale_ids
+    
+    async def commit(
+        self,
+        info: DocumentInfo,
+        content_hash: str,
+        chunks: List[DocumentChunk],
+        stale_ids: List[str]
+    ):
+        """
+        Remove stale chunks and record the new version (after changed chunks are upserted)
+        
+        Args:
+            info: Registry record of the new version
+            content_hash: Hash of the whole document
+            chunks: All chunks of the new version
+            stale_ids: Chunk IDs to delete
+        """
+        if stale_ids:
+            await self.vector_store.delete_chunks(stale_ids)
+        await self.registry.save(
+            info,
+            content_hash=content_hash,
+            chunk_hashes={chunk.chunk_id: chunk.metadata['content_hash'] for chunk in chunks}
+        )
+    
+    async def index_document(
+        self,
+        file_content: bytes,
+        filename: str,
+        document_id: str,
+        metadata: Dict[str, Any] = None,
+        on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Parse a document and apply only its changes to the vector index
+        
+        Args:
+            file_content: Raw file bytes
+            filename: Original filename
+            document_id: Stable document identifier
+            metadata: Additional chunk metadata
+            on_progress: Optional callback awaited with (chunks embedded, total chunks)
+                as changed chunks are upserted
+        
+        Returns:
+            Indexing statistics: document, chunks, upserted, deleted, unchanged
+        """
+        content_hash = self.content_hash(file_content)
+        
+        if await self.is_unchanged(document_id, content_hash):
+            info = await self.registry.get(document_id)
+            logger.info(f"{filename} unchanged, skipping re-index")
+            return {
+                'document': info,
+                'chunks': info.chunk_count,
+                'upserted': 0,
+                'deleted': 0,
+                'unchanged': True
+            }
+        
+        chunks = await self.processor.process_file(
+            file_content=file_content,
+            filename=filename,
+            document_id=document_id,
+            metadata=metadata
+        )
+        
+        changed, stale_ids = await self.diff_chunks(document_id, chunks)
+        if on_progress is None:
+            if changed:
+                await self.vector_store.upsert_chunks(changed)
+        else:
+            # Slices big enough to keep every embedding request slot busy
+            step = settings.EMBED_BATCH_SIZE * settings.EMBED_MAX_CONCURRENCY
+            done = len(chunks) - len(changed)
+            await on_progress(done, len(chunks))
+            for start in range(0, len(changed), step):
+                batch = changed[start:start + step]
+                await self.vector_store.upsert_chunks(batch)
+                done += len(batch)
+                await on_progress(done, len(chunks))
+        info = self.build_info(document_id, filename, len(chunks), len(file_content))
+        await self.commit(info, content_hash, chunks, stale_ids)
+        
+        logger.info(
+            f"Indexed {filename}: {len(changed)} of {len(chunks)} chunks upserted, "
+            f"{len(stale_ids)} stale chunks deleted"
+        )
+        return {
+            'document': info,
+            'chunks': len(chunks),
+            'upserted': len(changed),
+            'deleted': len(stale_ids),
+            'unchanged': False
+        }
+    
+    @traced("DocumentIndexer.index_batch")
+    async def index_batch(
+        self,
+        files: List[Dict[str, Any]],
+        flush_chunks: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Index many documents as one pipeline
+        
+        Files are parsed ahead while earlier ones embed, and changed chunks
+        from several files are coalesced so embedding and upsert requests go
+        out full-size. Each file is committed (stale chunks deleted, registry
+        updated) once all of its chunks are in the index.
+        
+        Args:
+            files: Dicts with 'file_content', 'filename', 'document_id' and optional 'metadata'
+            flush_chunks: Changed chunks accumulated before each embed + upsert
+                (default: one full round of embedding requests)
+        
+        Returns:
+            One result per file, in input order: the index_document statistics,
+            or 'error' if the file failed
+        """
+        flush_chunks = flush_chunks or settings.EMBED_BATCH_SIZE * settings.EMBED_MAX_CONCURRENCY
+        results: List[Optional[Dict[str, Any]]] = [None] * len(files)
+        # Parsed files waiting for the embedder; bounds how far parsing runs ahead
+        parsed: asyncio.Queue = asyncio.Queue(maxsize=8)
+        
+        async def parse_all():
+            for position, file in enumerate(files):
+                try:
+                    content_hash = self.content_hash(file['file_content'])
+                    if await self.is_unchanged(file['document_id'], content_hash):
+                        info = await self.registry.get(file['document_id'])
+                        results[position] = {
+                            'document': info,
+                            'chunks': info.chunk_count,
+                            'upserted': 0,
+                            'deleted': 0,
+                            'unchanged': True
+                        }
+                        continue
+                    chunks = await self.processor.process_file(
+                        file_content=file['file_content'],
+                        filename=file['filename'],
+                        document_id=file['document_id'],
+                        metadata=file.get('metadata')
+                    )
+                    changed, stale_ids = await self.diff_chunks(file['document_id'], chunks)
+                    info = self.build_info(
+                        file['document_id'], file['filename'], len(chunks), len(file['file_content'])
+                    )
+                except Exception as e:
+                    logger.error(f"Batch indexing failed for {file['filename']}: {str(e)}")
+                    results[position] = {'error': str(e)}
+                    continue
+                await parsed.put((position, info, content_hash, chunks, changed, stale_ids))
+            # End of input
+            await parsed.put(None)
+        
+        async def flush(batch: List[DocumentChunk], commits: List[tuple]):
+            try:
+                if batch:
+                    await self.vector_store.upsert_chunks(batch)
+            except Exception as e:
+                logger.error(f"Batch upsert of {len(batch)} chunks failed: {str(e)}")
+                for position, *_ in commits:
+                    results[position] = {'error': str(e)}
+                return
+            # Stale chunks are only dropped once their replacements are in the index
+            for position, info, content_hash, chunks, changed, stale_ids in commits:
+                try:
+                    await self.commit(info, content_hash, chunks, stale_ids)
+                    results[position] = {
+                        'document': info,
+                        'chunks': len(chunks),
+                        'upserted': len(changed),
+                        'deleted': len(stale_ids),
+                        'unchanged': False
+                    }
+                except Exception as e:
+                    logger.error(f"Batch commit failed for {info.filename}: {str(e)}")
+                    results[position] = {'error': str(e)}
+        
+        parser = asyncio.create_task(parse_all())
+        pending_chunks: List[DocumentChunk] = []
+        pending_commits: List[tuple] = []
+        in_flight: Optional[asyncio.Task] = None
+        try:
+            while True:
+                item = await parsed.get()
+                if item is None:
+                    break
+                pending_chunks.extend(item[4])
+                pending_commits.append(item)
+                if len(pending_chunks) >= flush_chunks:
+                    # One flush at a time; the next batch accumulates meanwhile
+                    if in_flight:
+                        await in_flight
+                    in_flight = asyncio.create_task(flush(pending_chunks, pending_commits))
+                    pending_chunks, pending_commits = [], []
+            if in_flight:
+                await in_flight
+            await flush(pending_chunks, pending_commits)
+            await parser
+        finally:
+            parser.cancel()
+            if in_flight:
+                in_flight.cancel()
+        
+        logger.info(
+            f"Batch indexed {sum('error' not in r for r in results)} of {len(files)} files"
+        )
+        return results
+    
+    async def remove_document(self, document_id: str):
+        """Delete a document's chunks by their stored IDs and forget it"""
+        chunk_ids = list(await self.registry.get_chunk_hashes(document_id))
+        if chunk_ids:
+            await self.vector_store.delete_chunks(chunk_ids)
+        else:
+            # Indexed before chunk IDs were recorded: fall back to a metadata filter
+            await self.vector_store.delete_document(document_id)
+        await self.registry.delete(document_id)
@@ -0,0 +1,405 @@
+"""
+Keyword index
+BM25 over chunk text with in-memory posting lists and a SQLite sidecar shared by workers
+"""
+import asyncio
+import json
+import math
+import re
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+TERM_PATTERN = re.compile(r"\w+")
+
+# Function words that carry no signal about which chunk answers the question
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from had has have he her his how i in is it its "
+    "me my of on or she that the their they this to was we were what when where which who why "
+    "will with you your about any tell".split()
+)
+
+
+def tokenize_terms(text: str) -> List[str]:
+    """Lowercased word terms; codes like "CS101" stay one term"""
+    return TERM_PATTERN.findall(text.lower())
+
+
+def query_terms(text: str) -> List[str]:
+    """Distinct query terms without stopwords, in order of appearance"""
+    return list(dict.fromkeys(t for t in tokenize_terms(text) if t not in STOPWORDS))
+
+
+class _Postings:
+    """
+    In-memory BM25 state for one snapshot of the index
+    
+    Each term maps to a compact posting list: parallel arrays of chunk slots
+    (uint32) and term frequencies (uint16). Deleted chunks leave dead slots
+    that queries mask out.
+    """
+    
+    def __init__(self):
+        self.ids: List[str] = []
+        self.metadata: List[Optional[Dict[str, Any]]] = []
+        self.terms: List[Tuple[str, ...]] = []
+        self.lengths = array('I')
+        self.slot_by_id: Dict[str, int] = {}
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.df: Dict[str, int] = {}
+        self.total_length = 0
+    
+    def add(self, chunk_id: str, metadata: Dict[str, Any], counts: Dict[str, int]):
+        """Append a chunk"""
+        slot = len(self.ids)
+        self.ids.append(chunk_id)
+        self.metadata.append(metadata)
+        self.terms.append(tuple(counts))
+        length = sum(counts.values())
+        self.lengths.append(length)
+        self.slot_by_id[chunk_id] = slot
+        self.total_length += length
+        
+        for term, tf in counts.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = (array('I'), array('H'))
+                self.df[term] = 0
+            postings[0].append(slot)
+            postings[1].append(min(tf, 0xFFFF))
+            self.df[term] += 1
+    
+    def remove(self, chunk_id: str):
+        """Mark a chunk's slot dead (its postings stay until compaction)"""
+        slot = self.slot_by_id.pop(chunk_id, None)
+        if slot is None:
+            return
+        self.total_length -= self.lengths[slot]
+        self.lengths[slot] = 0
+        self.metadata[slot] = None
+        for term in self.terms[slot]:
+            self.df[term] -= 1
+        self.terms[slot] = ()
+    
+    @property
+    def dead(self) -> int:
+        return len(self.ids) - len(self.slot_by_id)
+
+
+class KeywordIndex:
+    """
+    Incrementally updatable BM25 index
+    
+    Postings live in memory and are rebuilt from the SQLite sidecar when
+    another worker changes it, or once dead slots outnumber live ones.
+    Rebuilds and SQLite I/O happen outside the in-memory lock, so searches
+    only wait for the brief swaps and slot updates.
+    """
+    
+    # Rebuild postings when dead slots exceed live ones and this many
+    COMPACT_MIN_DEAD = 1024
+    
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # Guards the in-memory postings; never held across SQLite I/O
+        self._lock = threading.Lock()
+        # Serializes use of the shared connection (and writes within this worker)
+        self._db_lock = threading.RLock()
+        
+        self._conn = self._connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id TEXT PRIMARY KEY, document_id TEXT, metadata TEXT NOT NULL, terms TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_document ON chunks(document_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO state (key, value) VALUES ('generation', 0)")
+        
+        self._generation = -1
+        self._state = _Postings()
+        self._refresh()
+        
+        logger.info(f"Keyword index opened at {path}: {len(self._state.slot_by_id)} chunks")
+    
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        """Open the sidecar file; fall back to an in-memory database if it isn't writable"""
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit connection; writes use explicit BEGIN IMMEDIATE so workers serialize
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            return conn
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Keyword index file unavailable, indexing in memory (per process): {str(e)}")
+            return sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+    
+    # ----------------------------------------
+    # Public interface
+    # ----------------------------------------
+    
+    async def upsert(self, chunks: List[Dict[str, Any]]) -> int:
+        """
+        Index chunk text, replacing chunks with the same ID
+        
+        Args:
+            chunks: Dicts with 'id', 'text' and 'metadata' (returned with hits)
+        
+        Returns:
+            Number of chunks indexed
+        """
+        return await asyncio.to_thread(self._upsert_sync, chunks)
+    
+    async def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        document_id: Optional[str] = None
+    ):
+        """Delete chunks by ID and/or all chunks of a document"""
+        await asyncio.to_thread(self._delete_sync, ids, document_id)
+    
+    async def search(
+        self,
+        query: str,
+        top_k: int,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k chunks by BM25 score
+        
+        Stopwords in the query are ignored, so function words alone match nothing.
+        
+        Args:
+            query: Query text
+            top_k: Number of results
+            filter: Optional metadata equality filter ($eq / $in supported)
+        
+        Returns:
+            Matches as dicts with 'id', 'score', 'coverage' (share of the
+            query terms the chunk contains) and 'metadata', best first
+        """
+        # Off the loop: picking up other workers' changes reads SQLite and may rebuild
+        return await asyncio.to_thread(self._search_sync, query, top_k, filter)
+    
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'chunks': len(self._state.slot_by_id),
+                'terms': len(self._state.postings),
+                'dead_slots': self._state.dead
+            }
+    
+    # ----------------------------------------
+    # Writes
+    # ----------------------------------------
+    
+    def _upsert_sync(self, chunks: List[Dict[str, Any]]) -> int:
+        if not chunks:
+            return 0
+        
+        term_counts = [Counter(tokenize_terms(chunk['text'])) for chunk in chunks]
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Pick up other workers' changes before applying ours on top
+                self._refresh()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (id, document_id, metadata, terms) VALUES (?, ?, ?, ?)",
+                    [
+                        (
+                            chunk['id'],
+                            chunk['metadata'].get('document_id'),
+                            json.dumps(chunk['metadata']),
+                            json.dumps(counts)
+                        )
+                        for chunk, counts in zip(chunks, term_counts)
+                    ]
+                )
+                generation = self._bump_generation()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            
+            with self._lock:
+                for chunk, counts in zip(chunks, term_counts):
+                    self._state.remove(chunk['id'])
+                    self._state.add(chunk['id'], chunk['metadata'], counts)
+                self._generation = generation
+            self._maybe_compact()
+        
+        return len(chunks)
+    
+    def _delete_sync(self, ids: Optional[List[str]], document_id: Optional[str]):
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                
+                doomed = set(ids or [])
+                if document_id is not None:
+                    doomed.update(
+                        chunk_id for (chunk_id,) in self._conn.execute(
+                            "SELECT id FROM chunks WHERE document_id = ?", (document_id,)
+                        )
+                    )
+                
+                doomed_list = sorted(doomed)
+                deleted = 0
+                for start in range(0, len(doomed_list), 500):
+                    batch = doomed_list[start:start + 500]
+                    deleted += self._conn.execute(
+                        f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                    ).rowcount
+                generation = self._bump_generation() if deleted else self._generation
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            
+            with self._lock:
+                for chunk_id in doomed_list:
+                    self._state.remove(chunk_id)
+                self._generation = generation
+            self._maybe_compact()
+    
+    def _maybe_compact(self):
+        """Rebuild the postings without dead slots once they dominate"""
+        with self._lock:
+            dead, live = self._state.dead, len(self._state.slot_by_id)
+        if dead >= self.COMPACT_MIN_DEAD and dead > live:
+            self._refresh(force=True)
+    
+    def _bump_generation(self) -> int:
+        """Signal other workers that the index changed; returns the new generation"""
+        self._conn.execute("UPDATE state SET value = value + 1 WHERE key = 'generation'")
+        return self._conn.execute(
+            "SELECT value FROM state WHERE key = 'generation'"
+        ).fetchone()[0]
+    
+    # ----------------------------------------
+    # Reads
+    # ----------------------------------------
+    
+    def _search_sync(
+        self,
+        query: str,
+        top_k: int,
+        filter: Optional[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        self._refresh()
+        with self._lock:
+            state = self._state
+            live = len(state.slot_by_id)
+            wanted = query_terms(query)
+            terms = [t for t in wanted if state.df.get(t)]
+            if not live or not terms:
+                return []
+            
+            lengths = np.frombuffer(state.lengths, dtype=np.uint32)
+            avg_length = state.total_length / live
+            scores = np.zeros(len(lengths), dtype=np.float32)
+            matched = np.zeros(len(lengths), dtype=np.uint16)
+            for term in terms:
+                slots, tfs = state.postings[term]
+                slots = np.frombuffer(slots, dtype=np.uint32)
+                tf = np.frombuffer(tfs, dtype=np.uint16).astype(np.float32)
+                df = state.df[term]
+                idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * lengths[slots] / avg_length)
+                # Slots are unique within a posting list, so fancy-index accumulation is safe
+                scores[slots] += idf * tf * (self.k1 + 1) / (tf + norm)
+                matched[slots] += 1
+            
+            # Dead slots have length 0 and no metadata
+            scores[lengths == 0] = 0
+            # Drop buffer views before releasing the lock: arrays can't grow while exported
+            del lengths, slots, tf
+            coverage = matched / np.float32(len(wanted))
+            return self._top_matches(state, scores, coverage, top_k, filter)
+    
+    def _top_matches(
+        self,
+        state: _Postings,
+        scores: np.ndarray,
+        coverage: np.ndarray,
+        top_k: int,
+        filter: Optional[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Best-scoring slots that pass the filter"""
+        candidates = np.flatnonzero(scores > 0)
+        if not filter and candidates.size > top_k:
+            candidates = candidates[np.argpartition(scores[candidates], -top_k)[-top_k:]]
+        candidates = candidates[np.argsort(scores[candidates])[::-1]]
+        
+        matches = []
+        for slot in candidates.tolist():
+            metadata = state.metadata[slot]
+            if filter and not self._matches_filter(metadata, filter):
+                continue
+            matches.append({
+                'id': state.ids[slot],
+                'score': float(scores[slot]),
+                'coverage': float(coverage[slot]),
+                'metadata': metadata
+            })
+            if len(matches) == top_k:
+                break
+        return matches
+    
+    @staticmethod
+    def _matches_filter(metadata: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+        """Metadata equality filter ($eq / $in supported)"""
+        for key, condition in filter.items():
+            value = metadata.get(key)
+            if isinstance(condition, dict):
+                if "$eq" in condition:
+                    if value != condition["$eq"]:
+                        return False
+                elif "$in" in condition:
+                    if value not in condition["$in"]:
+                        return False
+                else:
+                    raise ValueError(f"Unsupported filter operator for {key}: {condition}")
+            elif value != condition:
+                return False
+        return True
+    
+    # ----------------------------------------
+    # State management
+    # ----------------------------------------
+    
+    def _refresh(self, force: bool = False):
+        """
+        Rebuild the postings if another worker changed the index
+        
+        Rows are read and the new postings built without holding the
+        in-memory lock; searches keep using the old ones until the swap.
+        """
+        with self._db_lock:
+            generation = self._conn.execute(
+                "SELECT value FROM state WHERE key = 'generation'"
+            ).fetchone()[0]
+            if generation == self._generation and not force:
+                return
+            
+            state = _Postings()
+            for chunk_id, metadata, terms in self._conn.execute(
+                "SELECT id, metadata, terms FROM chunks"
+            ):
+                state.add(chunk_id, json.loads(metadata), json.loads(terms))
+            
+            with self._lock:
+                self._state = state
+                self._generation = generation
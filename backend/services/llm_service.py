@@ -2,14 +2,21 @@
 LLM service using Google Gemini
 Handles chat completion, context management, and prompt engineering
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 import google.generativeai as genai
 from datetime import datetime
+import re
+import time
 import uuid
 
 from models import RetrievalResult
 from config import settings
 from utils.logger import get_logger
+from utils.metrics import TOKENS, observe_stage, time_stage
+from utils.tokenizer import count_tokens, truncate_to_tokens
+from utils.tracing import traced
+from .backends import gemini_backend
+from .conversation_store import create_conversation_store
 
 logger = get_logger(__name__)
 
@@ -35,11 +42,16 @@ User Question: {query}
 
 Answer:"""
     
+    # Separate questions asked together ("...? ...?", "...; ...")
+    SUB_QUESTION_SPLIT = re.compile(r'(?<=\?)\s+|\s*;\s*')
+    
     def __init__(self):
         genai.configure(api_key=settings.GOOGLE_API_KEY)
         self.model = genai.GenerativeModel(settings.LLM_MODEL)
-        self.conversations: Dict[str, List[Dict[str, str]]] = {}
+        # Bounded history, shared across workers with the sqlite store
+        self.conversations = create_conversation_store(settings.CONVERSATION_STORE)
     
+    @traced("LLMService.generate_answer")
     async def generate_answer(
         self,
         query: str,
@@ -53,31 +65,27 @@ Answer:"""
             query: User question
             retrieved_contexts: List of relevant document chunks
             conversation_id: Optional conversation ID for context
-            
+        
         Returns:
             Dict with answer, sources, and metadata
         """
         try:
-            # Prepare context from retrieved chunks
-            context = self._prepare_context(retrieved_contexts)
-            
-            # Build prompt
-            prompt = self.SYSTEM_PROMPT.format(
-                context=context,
-                query=query
-            )
+            # Build prompt from retrieved chunks
+            prompt = self._build_prompt(query, retrieved_contexts)
             
             # Get conversation history if available
-            history = self._get_conversation_history(conversation_id)
+            history = await self._get_conversation_history(conversation_id)
             
             # Generate response
-            if history:
-                chat = self.model.start_chat(history=history)
-                response = chat.send_message(prompt)
-            else:
-                response = self.model.generate_content(prompt)
+            with time_stage("generation"):
+                if history:
+                    chat = self.model.start_chat(history=history)
+                    response = await gemini_backend.call(chat.send_message_async, prompt)
+                else:
+                    response = await gemini_backend.call(self.model.generate_content_async, prompt)
             
             answer = response.text
+            TOKENS.labels("completion").inc(count_tokens(answer))
             
             # Calculate confidence based on retrieval scores
             confidence = self._calculate_confidence(retrieved_contexts)
@@ -89,7 +97,7 @@ Answer:"""
             conv_id = conversation_id or self._generate_conversation_id()
             
             # Store in conversation history
-            self._update_conversation_history(conv_id, query, answer)
+            await self._update_conversation_history(conv_id, query, answer)
             
             logger.info(f"Generated answer for query: {query[:50]}...")
             
@@ -100,29 +108,205 @@ Answer:"""
                 'confidence': confidence,
                 'timestamp': datetime.utcnow()
             }
-            
+        
         except Exception as e:
             logger.error(f"Answer generation failed: {str(e)}")
             raise
     
+    async def prepare_prompt(
+        self,
+        query: str,
+        retrieved_contexts: List[RetrievalResult],
+        conversation_id: Optional[str] = None
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Build the prompt and load the conversation history for a generation call
+        
+        Args:
+            query: User question
+            retrieved_contexts: List of relevant document chunks
+            conversation_id: Optional conversation ID for context
+        
+        Returns:
+            (prompt, history)
+        """
+        prompt = self._build_prompt(query, retrieved_contexts)
+        history = await self._get_conversation_history(conversation_id)
+        return prompt, history
+    
+    async def stream_answer(
+        self,
+        query: str,
+        retrieved_contexts: List[RetrievalResult],
+        conversation_id: Optional[str] = None,
+        prepared: Optional[Tuple[str, List[Dict[str, Any]]]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream answer tokens as Gemini produces them
+        
+        Args:
+            query: User question
+            retrieved_contexts: List of relevant document chunks
+            conversation_id: Optional conversation ID for context
+            prepared: prepare_prompt() result, if already built before the stream
+        
+        Yields:
+            Event dicts with 'event' and 'data' keys: one 'metadata' event
+            (sources, confidence), 'token' events (text) and a final 'done'
+            event (conversation_id)
+        """
+        conv_id = conversation_id or self._generate_conversation_id()
+        
+        yield {
+            'event': 'metadata',
+            'data': {
+                'sources': self._prepare_sources(retrieved_contexts),
+                'confidence': self._calculate_confidence(retrieved_contexts)
+            }
+        }
+        
+        try:
+            prompt, history = prepared or await self.prepare_prompt(
+                query, retrieved_contexts, conversation_id
+            )
+            
+            request_options = {'timeout': gemini_backend.timeout}
+            
+            # Hold a Gemini slot for the whole stream
+            started = time.perf_counter()
+            async with gemini_backend.slot():
+                if history:
+                    chat = self.model.start_chat(history=history)
+                    response = await chat.send_message_async(
+                        prompt, stream=True, request_options=request_options
+                    )
+                else:
+                    response = await self.model.generate_content_async(
+                        prompt, stream=True, request_options=request_options
+                    )
+                
+                answer_parts = []
+                async for chunk in response:
+                    text = self._chunk_text(chunk)
+                    if text:
+                        if not answer_parts:
+                            observe_stage("generation_first_token", time.perf_counter() - started)
+                        answer_parts.append(text)
+                        yield {'event': 'token', 'data': {'text': text}}
+            
+            observe_stage("generation", time.perf_counter() - started)
+            TOKENS.labels("completion").inc(sum(count_tokens(part) for part in answer_parts))
+        
+        except Exception as e:
+            logger.error(f"Streaming answer generation failed: {str(e)}")
+            raise
+        
+        # Store in conversation history once the full answer is known
+        await self._update_conversation_history(conv_id, query, "".join(answer_parts))
+        
+        logger.info(f"Streamed answer for query: {query[:50]}...")
+        
+        yield {'event': 'done', 'data': {'conversation_id': conv_id}}
+    
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        """Text of a streamed response chunk (empty for non-text chunks)"""
+        try:
+            return chunk.text
+        except ValueError:
+            return ""
+    
+    async def query_variants(self, query: str, conversation_id: Optional[str] = None) -> List[str]:
+        """
+        Phrasings of a question to retrieve with
+        
+        Args:
+            query: User question
+            conversation_id: Optional conversation ID for context
+        
+        Returns:
+            The raw query, the query with the previous user turn (so follow-ups
+            like "what about his teaching?" keep their subject), and its
+            sub-questions, at most MAX_QUERY_VARIANTS
+        """
+        variants = [query]
+        
+        history = await self._get_conversation_history(conversation_id)
+        previous = next((m['parts'][0] for m in reversed(history) if m['role'] == 'user'), None)
+        if previous:
+            variants.append(f"{previous} {query}")
+        
+        sub_questions = [part for part in self.SUB_QUESTION_SPLIT.split(query.strip()) if part]
+        if len(sub_questions) > 1:
+            variants.extend(sub_questions)
+        
+        return list(dict.fromkeys(variants))[:settings.MAX_QUERY_VARIANTS]
+    
+    async def has_history(self, conversation_id: Optional[str]) -> bool:
+        """Check whether a conversation already has prior turns"""
+        return bool(await self._get_conversation_history(conversation_id))
+    
+    async def record_exchange(
+        self,
+        query: str,
+        answer: str,
+        conversation_id: Optional[str] = None
+    ) -> str:
+        """
+        Record an answered query in conversation history without calling the LLM
+        
+        Args:
+            query: User question
+            answer: Answer returned to the user
+            conversation_id: Optional existing conversation ID
+        
+        Returns:
+            Conversation ID the exchange was stored under
+        """
+        conv_id = conversation_id or self._generate_conversation_id()
+        await self._update_conversation_history(conv_id, query, answer)
+        return conv_id
+    
+    def _build_prompt(self, query: str, results: List[RetrievalResult]) -> str:
+        """Build the RAG prompt from the query and retrieved chunks"""
+        with time_stage("prompt_build"):
+            prompt = self.SYSTEM_PROMPT.format(
+                context=self._prepare_context(results),
+                query=query
+            )
+        TOKENS.labels("prompt").inc(count_tokens(prompt))
+        return prompt
+    
     def _prepare_context(self, results: List[RetrievalResult]) -> str:
-        """Prepare context string from retrieval results"""
+        """
+        Prepare context string from retrieval results
+        
+        Whole chunks are packed greedily in retrieval rank order into
+        MAX_CONTEXT_TOKENS; a chunk that doesn't fit is skipped rather than
+        cut, so smaller lower-ranked chunks can still use the remaining budget.
+        """
         if not results:
             return "No relevant context found."
         
-        context_parts = []
-        for idx, result in enumerate(results, 1):
+        budget = settings.MAX_CONTEXT_TOKENS
+        selected = []
+        for result in results:
             source = result.metadata.get('filename', 'Unknown')
-            context_parts.append(
-                f"[Source {idx}: {source}]\n{result.text}\n"
-            )
+            header = f"[Source {len(selected) + 1}: {source}]"
+            cost = count_tokens(header) + count_tokens(result.text)
+            if cost <= budget:
+                selected.append(f"{header}\n{result.text}\n")
+                budget -= cost
         
-        # Truncate if too long
-        context = "\n".join(context_parts)
-        if len(context) > settings.MAX_CONTEXT_LENGTH:
-            context = context[:settings.MAX_CONTEXT_LENGTH] + "...[truncated]"
+        if not selected:
+            # Even the best chunk exceeds the budget: keep as much of it as fits
+            best = results[0]
+            source = best.metadata.get('filename', 'Unknown')
+            header = f"[Source 1: {source}]"
+            text = truncate_to_tokens(best.text, settings.MAX_CONTEXT_TOKENS - count_tokens(header))
+            selected.append(f"{header}\n{text}...[truncated]\n")
         
-        return context
+        return "\n".join(selected)
     
     def _prepare_sources(self, results: List[RetrievalResult]) -> List[Dict[str, Any]]:
         """Prepare source information for response"""
@@ -130,7 +314,8 @@ Answer:"""
         for result in results:
             source = {
                 'text': result.text[:200] + "..." if len(result.text) > 200 else result.text,
-                'score': round(result.score, 3),
+                'score': round(result.score, 3) if result.score is not None else None,
+                'keyword_score': round(result.keyword_score, 3) if result.keyword_score is not None else None,
                 'metadata': {
                     'filename': result.metadata.get('filename', 'Unknown'),
                     'chunk_index': result.metadata.get('chunk_index', 0),
@@ -145,8 +330,10 @@ Answer:"""
         if not results:
             return 0.0
         
-        # Average of top scores
-        avg_score = sum(r.score for r in results) / len(results)
+        # Average similarity; keyword-only matches have none and count as the threshold they bypassed
+        avg_score = sum(
+            r.score if r.score is not None else settings.SIMILARITY_THRESHOLD for r in results
+        ) / len(results)
         
         # Adjust based on number of results
         result_factor = min(len(results) / settings.TOP_K_RESULTS, 1.0)
@@ -158,38 +345,28 @@ Answer:"""
         """Generate unique conversation ID"""
         return f"conv_{uuid.uuid4().hex[:12]}"
     
-    def _get_conversation_history(
+    async def _get_conversation_history(
         self,
         conversation_id: Optional[str]
-    ) -> List[Dict[str, str]]:
+    ) -> List[Dict[str, Any]]:
         """Retrieve conversation history"""
-        if not conversation_id or conversation_id not in self.conversations:
+        if not conversation_id:
             return []
-        return self.conversations[conversation_id]
+        return await self.conversations.get(conversation_id)
     
-    def _update_conversation_history(
+    async def _update_conversation_history(
         self,
         conversation_id: str,
         query: str,
         answer: str
     ):
-        """Update conversation history"""
-        if conversation_id not in self.conversations:
-            self.conversations[conversation_id] = []
-        
-        self.conversations[conversation_id].extend([
-            {'role': 'user', 'parts': [query]},
-            {'role': 'model', 'parts': [answer]}
-        ])
-        
-        # Keep only last 10 exchanges to manage memory
-        if len(self.conversations[conversation_id]) > 20:
-            self.conversations[conversation_id] = self.conversations[conversation_id][-20:]
+        """Update conversation history (the store keeps only the last CONVERSATION_MAX_TURNS exchanges)"""
+        await self.conversations.append(conversation_id, query, answer)
     
     async def check_health(self) -> bool:
         """Check if LLM service is healthy"""
         try:
-            response = self.model.generate_content("Hello")
+            response = await gemini_backend.call(self.model.generate_content_async, "Hello")
             return bool(response.text)
         except Exception as e:
             logger.error(f"LLM health check failed: {str(e)}")
@@ -0,0 +1,411 @@
+"""
+Local vector index
+Normalized float32 vectors in a memory-mapped NumPy matrix with a SQLite metadata sidecar
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+from .vector_index import VectorIndex
+
+try:
+    import hnswlib
+except ImportError:  # Optional: only needed for HNSW mode on large corpora
+    hnswlib = None
+
+logger = get_logger(__name__)
+
+
+class LocalVectorIndex(VectorIndex):
+    """Exact vectorized cosine search, with an optional HNSW graph for large corpora"""
+    
+    INITIAL_CAPACITY = 1024
+    
+    def __init__(
+        self,
+        path: str,
+        dimension: int,
+        mode: str = "auto",
+        exact_max_vectors: int = 100_000
+    ):
+        if mode not in ("auto", "exact", "hnsw"):
+            raise ValueError(f"Unsupported local index mode: {mode}")
+        if mode == "hnsw" and hnswlib is None:
+            raise ValueError("LOCAL_INDEX_MODE=hnsw requires the optional 'hnswlib' package")
+        
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dimension = dimension
+        self.mode = mode
+        self.exact_max_vectors = exact_max_vectors
+        self._vectors_file = self.path / "vectors.f32"
+        self._lock = threading.RLock()
+        
+        # Autocommit connection; writes use explicit BEGIN IMMEDIATE so workers serialize
+        self._conn = sqlite3.connect(
+            str(self.path / "metadata.sqlite"),
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, "
+            "document_id TEXT, metadata TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_vectors_document ON vectors(document_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO state (key, value) VALUES ('generation', 0)")
+        
+        if not self._vectors_file.exists():
+            self._resize_file(self.INITIAL_CAPACITY)
+        
+        self._generation = -1
+        self._matrix: Optional[np.memmap] = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._row_by_id: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+        self._high_water = 0
+        self._hnsw = None
+        
+        with self._lock:
+            self._refresh()
+        
+        logger.info(
+            f"Local vector index opened at {self.path}: {len(self._row_by_id)} vectors ({mode} mode)"
+        )
+    
+    # ----------------------------------------
+    # VectorIndex interface
+    # ----------------------------------------
+    
+    async def upsert(self, vectors: List[Dict[str, Any]]) -> int:
+        return await asyncio.to_thread(self._upsert_sync, vectors)
+    
+    async def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._query_sync, vector, top_k, filter)
+    
+    async def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        filter: Optional[Dict[str, Any]] = None
+    ):
+        await asyncio.to_thread(self._delete_sync, ids, filter)
+    
+    async def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            total = len(self._row_by_id)
+            return {
+                'total_vectors': total,
+                'dimension': self.dimension,
+                'index_fullness': round(total / self._matrix.shape[0], 4),
+                'mode': 'hnsw' if self._use_hnsw(total) else 'exact'
+            }
+    
+    # ----------------------------------------
+    # Writes
+    # ----------------------------------------
+    
+    def _upsert_sync(self, vectors: List[Dict[str, Any]]) -> int:
+        """Write vectors and metadata in one cross-process transaction"""
+        if not vectors:
+            return 0
+        
+        values = self._normalize(np.asarray([v['values'] for v in vectors], dtype=np.float32))
+        if values.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-d vectors, got {values.shape[1]}-d")
+        
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Pick up rows allocated by other workers before allocating our own
+                self._refresh()
+                
+                rows = [self._allocate_row(v['id']) for v in vectors]
+                self._ensure_capacity(max(rows) + 1)
+                self._matrix[rows] = values
+                self._matrix.flush()
+                
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO vectors (row, id, document_id, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (row, v['id'], v['metadata'].get('document_id'), json.dumps(v['metadata']))
+                        for row, v in zip(rows, vectors)
+                    ]
+                )
+                self._bump_generation()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                # Local bookkeeping may be ahead of the database; reload it
+                self._generation = -1
+                self._refresh()
+                raise
+            
+            self._alive[rows] = True
+            if self._hnsw is not None:
+                if self._matrix.shape[0] > self._hnsw.get_max_elements():
+                    self._hnsw.resize_index(self._matrix.shape[0])
+                self._hnsw.add_items(values, np.asarray(rows))
+        
+        return len(vectors)
+    
+    def _delete_sync(self, ids: Optional[List[str]], filter: Optional[Dict[str, Any]]):
+        """Delete vectors by ID and/or metadata filter"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                
+                rows = set()
+                if ids:
+                    rows.update(self._row_by_id[i] for i in ids if i in self._row_by_id)
+                if filter:
+                    rows.update(self._filter_rows(filter))
+                
+                if rows:
+                    row_list = sorted(rows)
+                    for start in range(0, len(row_list), 500):
+                        batch = row_list[start:start + 500]
+                        self._conn.execute(
+                            f"DELETE FROM vectors WHERE row IN ({','.join('?' * len(batch))})",
+                            batch
+                        )
+                    self._bump_generation()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            
+            if not rows:
+                return
+            
+            for vector_id in [i for i, row in self._row_by_id.items() if row in rows]:
+                del self._row_by_id[vector_id]
+            self._alive[row_list] = False
+            self._free_rows.extend(row_list)
+            if self._hnsw is not None:
+                for row in row_list:
+                    self._hnsw.mark_deleted(row)
+    
+    def _allocate_row(self, vector_id: str) -> int:
+        """Reuse the row of an existing ID, a freed row, or append"""
+        row = self._row_by_id.get(vector_id)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                row = self._high_water
+                self._high_water += 1
+            self._row_by_id[vector_id] = row
+        return row
+    
+    def _bump_generation(self):
+        """Signal other workers that the index changed"""
+        self._conn.execute("UPDATE state SET value = value + 1 WHERE key = 'generation'")
+        self._generation = self._conn.execute(
+            "SELECT value FROM state WHERE key = 'generation'"
+        ).fetchone()[0]
+    
+    # ----------------------------------------
+    # Reads
+    # ----------------------------------------
+    
+    def _query_sync(
+        self,
+        vector: List[float],
+        top_k: int,
+        filter: Optional[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Top-k cosine search"""
+        query = self._normalize(np.asarray(vector, dtype=np.float32)[None, :])[0]
+        
+        with self._lock:
+            self._refresh()
+            count = len(self._row_by_id)
+            if count == 0:
+                return []
+            
+            n = self._high_water
+            matrix = self._matrix[:n]
+            mask = self._alive[:n].copy()
+            filtered = bool(filter)
+            if filtered:
+                allowed = np.zeros(n, dtype=bool)
+                allowed[self._filter_rows(filter)] = True
+                mask &= allowed
+            
+            hnsw = self._ensure_hnsw() if self._use_hnsw(count) else None
+        
+        candidates = int(mask.sum())
+        if candidates == 0:
+            return []
+        k = min(top_k, candidates)
+        
+        if hnsw is not None:
+            rows, scores = self._search_hnsw(hnsw, query, k, mask if filtered else None)
+        else:
+            rows, scores = self._search_exact(matrix, query, k, mask)
+        
+        with self._lock:
+            placeholders = ','.join('?' * len(rows))
+            records = {
+                row: (vector_id, metadata)
+                for row, vector_id, metadata in self._conn.execute(
+                    f"SELECT row, id, metadata FROM vectors WHERE row IN ({placeholders})",
+                    [int(r) for r in rows]
+                )
+            }
+        
+        return [
+            {'id': records[row][0], 'score': float(score), 'metadata': json.loads(records[row][1])}
+            for row, score in zip(rows.tolist(), scores.tolist())
+            if row in records
+        ]
+    
+    @staticmethod
+    def _search_exact(
+        matrix: np.ndarray,
+        query: np.ndarray,
+        k: int,
+        mask: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized exact top-k over all live rows"""
+        scores = matrix @ query
+        scores[~mask] = -np.inf
+        if k < scores.shape[0]:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(scores.shape[0])
+        top = top[np.argsort(scores[top])[::-1]]
+        return top, scores[top]
+    
+    @staticmethod
+    def _search_hnsw(
+        hnsw,
+        query: np.ndarray,
+        k: int,
+        mask: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k through the HNSW graph (deleted rows are already marked)"""
+        hnsw.set_ef(max(64, 2 * k))
+        row_filter = None
+        if mask is not None:
+            row_filter = lambda row: row < mask.shape[0] and bool(mask[row])
+        labels, distances = hnsw.knn_query(query, k=k, filter=row_filter)
+        # Inner-product distance is 1 - dot for unit vectors
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+    
+    def _filter_rows(self, filter: Dict[str, Any]) -> List[int]:
+        """Rows matching a metadata equality filter ($eq / $in supported)"""
+        clauses = []
+        params: List[Any] = []
+        for key, condition in filter.items():
+            column = "document_id" if key == "document_id" else f"json_extract(metadata, '$.\"{key}\"')"
+            if isinstance(condition, dict):
+                if "$eq" in condition:
+                    clauses.append(f"{column} = ?")
+                    params.append(condition["$eq"])
+                elif "$in" in condition:
+                    values = list(condition["$in"])
+                    clauses.append(f"{column} IN ({','.join('?' * len(values))})")
+                    params.extend(values)
+                else:
+                    raise ValueError(f"Unsupported filter operator for {key}: {condition}")
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(condition)
+        
+        return [
+            row for (row,) in self._conn.execute(
+                f"SELECT row FROM vectors WHERE {' AND '.join(clauses)}", params
+            )
+        ]
+    
+    # ----------------------------------------
+    # State management
+    # ----------------------------------------
+    
+    def _refresh(self):
+        """Reload row bookkeeping if another worker changed the index"""
+        generation = self._conn.execute(
+            "SELECT value FROM state WHERE key = 'generation'"
+        ).fetchone()[0]
+        if generation == self._generation and self._matrix is not None:
+            return
+        
+        capacity = self._vectors_file.stat().st_size // (self.dimension * 4)
+        self._matrix = np.memmap(
+            self._vectors_file, dtype=np.float32, mode='r+', shape=(capacity, self.dimension)
+        )
+        self._row_by_id = {
+            vector_id: row for row, vector_id in self._conn.execute("SELECT row, id FROM vectors")
+        }
+        self._high_water = max(self._row_by_id.values(), default=-1) + 1
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[list(self._row_by_id.values())] = True
+        self._free_rows = [
+            row for row in range(self._high_water - 1, -1, -1) if not self._alive[row]
+        ]
+        self._hnsw = None
+        self._generation = generation
+    
+    def _ensure_capacity(self, rows_needed: int):
+        """Grow the memory-mapped matrix geometrically"""
+        capacity = self._matrix.shape[0]
+        if rows_needed <= capacity:
+            return
+        
+        while capacity < rows_needed:
+            capacity *= 2
+        self._matrix.flush()
+        self._resize_file(capacity)
+        self._matrix = np.memmap(
+            self._vectors_file, dtype=np.float32, mode='r+', shape=(capacity, self.dimension)
+        )
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._alive.shape[0]] = self._alive
+        self._alive = alive
+    
+    def _resize_file(self, capacity: int):
+        """Extend the backing file to hold `capacity` vectors"""
+        with open(self._vectors_file, 'ab') as f:
+            f.truncate(capacity * self.dimension * 4)
+    
+    def _use_hnsw(self, count: int) -> bool:
+        """Whether queries should go through the HNSW graph"""
+        if self.mode == "hnsw":
+            return True
+        return self.mode == "auto" and count > self.exact_max_vectors and hnswlib is not None
+    
+    def _ensure_hnsw(self):
+        """Build the HNSW graph from the live rows if it is not current"""
+        if self._hnsw is None:
+            rows = np.flatnonzero(self._alive[:self._high_water])
+            index = hnswlib.Index(space='ip', dim=self.dimension)
+            index.init_index(max_elements=self._matrix.shape[0], ef_construction=200, M=16)
+            if rows.size:
+                index.add_items(np.asarray(self._matrix[rows]), rows)
+            self._hnsw = index
+            logger.info(f"Built HNSW graph over {rows.size} vectors")
+        return self._hnsw
+    
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """Scale rows to unit length so dot product equals cosine similarity"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
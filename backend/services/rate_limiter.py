@@ -0,0 +1,272 @@
+"""
+Rate limiting and admission control
+Token buckets per client and route group (in-process or shared by workers through
+SQLite), and a non-blocking cap on requests in flight in front of Gemini
+"""
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+from config import settings
+from utils.logger import get_logger
+from utils.metrics import RATE_LIMITED
+from .backends import BackendExecutor
+
+logger = get_logger(__name__)
+
+
+class RateLimiter(ABC):
+    """
+    Token bucket per (scope, client)
+    
+    Each scope (e.g. "chat", "upload") has a refill rate and a burst size: a
+    client starts with a full bucket of burst requests, and each request
+    takes one token. Buckets that are idle long enough to refill completely
+    are equivalent to new ones, so they can be dropped at any time.
+    """
+    
+    def __init__(self, limits: Dict[str, Tuple[float, int]]):
+        """
+        Args:
+            limits: scope -> (requests per minute, burst)
+        """
+        self.limits = {
+            scope: (per_minute / 60.0, max(burst, 1)) for scope, (per_minute, burst) in limits.items()
+        }
+        self.allowed = {scope: 0 for scope in limits}
+        self.rejected = {scope: 0 for scope in limits}
+    
+    async def acquire(self, scope: str, client: str) -> float:
+        """
+        Take a token from a client's bucket
+        
+        Args:
+            scope: Route group with its own limit
+            client: Client key (IP address or API key digest)
+        
+        Returns:
+            0 if the request is allowed, else seconds until a token is available
+        """
+        retry_after = await self._take(scope, client)
+        if retry_after:
+            self.rejected[scope] += 1
+            RATE_LIMITED.labels(scope).inc()
+        else:
+            self.allowed[scope] += 1
+        return retry_after
+    
+    @abstractmethod
+    async def _take(self, scope: str, client: str) -> float:
+        """Refill and take one token; seconds to wait if the bucket is empty"""
+    
+    @abstractmethod
+    def bucket_count(self) -> int:
+        """Buckets currently held"""
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'limits': {
+                scope: {'per_minute': round(rate * 60, 2), 'burst': burst}
+                for scope, (rate, burst) in self.limits.items()
+            },
+            'buckets': self.bucket_count(),
+            'allowed': dict(self.allowed),
+            'rejected': dict(self.rejected)
+        }
+    
+    def _refill(self, scope: str, tokens: float, elapsed: float) -> Tuple[float, float]:
+        """(tokens after taking one, or as refilled if none left; seconds to wait, 0 if taken)"""
+        rate, burst = self.limits[scope]
+        tokens = min(burst, tokens + max(elapsed, 0.0) * rate)
+        if tokens >= 1:
+            return tokens - 1, 0.0
+        return tokens, (1 - tokens) / rate if rate > 0 else math.inf
+    
+    def _full_after(self, scope: str) -> float:
+        """Seconds an idle bucket takes to refill completely"""
+        rate, burst = self.limits[scope]
+        return burst / rate if rate > 0 else math.inf
+
+
+class MemoryRateLimiter(RateLimiter):
+    """Process-local buckets, least recently used dropped beyond max_buckets"""
+    
+    def __init__(self, limits: Dict[str, Tuple[float, int]], max_buckets: int = 100_000):
+        super().__init__(limits)
+        self.max_buckets = max_buckets
+        # (scope, client) -> [tokens, updated_at]
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+    
+    async def _take(self, scope: str, client: str) -> float:
+        now = time.monotonic()
+        key = (scope, client)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.limits[scope][1]), now]
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        
+        bucket[0], retry_after = self._refill(scope, bucket[0], now - bucket[1])
+        bucket[1] = now
+        return retry_after
+    
+    def bucket_count(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """Buckets shared by all workers through one SQLite file (WAL)"""
+    
+    # Buckets idle long enough to be full are deleted every this many requests
+    PRUNE_INTERVAL = 1000
+    
+    def __init__(self, path: str, limits: Dict[str, Tuple[float, int]]):
+        super().__init__(limits)
+        self._requests = 0
+        self._lock = threading.Lock()
+        
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit connection; writes use explicit BEGIN IMMEDIATE so workers serialize
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "scope TEXT NOT NULL, client TEXT NOT NULL, tokens REAL NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (scope, client))"
+        )
+    
+    async def _take(self, scope: str, client: str) -> float:
+        return await asyncio.to_thread(self._take_sync, scope, client)
+    
+    def bucket_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0]
+    
+    def _take_sync(self, scope: str, client: str) -> float:
+        with self._lock:
+            # Read-modify-write in one transaction so concurrent workers share the bucket
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at FROM rate_buckets WHERE scope = ? AND client = ?",
+                    (scope, client)
+                ).fetchone()
+                tokens, updated_at = row if row else (float(self.limits[scope][1]), now)
+                tokens, retry_after = self._refill(scope, tokens, now - updated_at)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (scope, client, tokens, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (scope, client, tokens, now)
+                )
+                
+                self._requests += 1
+                if self._requests % self.PRUNE_INTERVAL == 0:
+                    self._prune(now)
+                
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return retry_after
+    
+    def _prune(self, now: float):
+        """Delete buckets that have refilled completely"""
+        for scope in self.limits:
+            self._conn.execute(
+                "DELETE FROM rate_buckets WHERE scope = ? AND updated_at <= ?",
+                (scope, now - self._full_after(scope))
+            )
+
+
+def create_rate_limiter(backend: str) -> RateLimiter:
+    """
+    Build the rate limiter selected in settings
+    
+    Args:
+        backend: "memory" or "sqlite"
+    
+    Returns:
+        RateLimiter with the chat and upload limits (memory if the SQLite file can't be opened)
+    """
+    limits = {
+        'chat': (settings.RATE_LIMIT_PER_MINUTE, settings.RATE_LIMIT_BURST),
+        'upload': (settings.UPLOAD_RATE_LIMIT_PER_MINUTE, settings.UPLOAD_RATE_LIMIT_BURST)
+    }
+    if backend == "sqlite":
+        try:
+            return SQLiteRateLimiter(settings.RATE_LIMIT_STORE_PATH, limits)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Rate limit store unavailable, keeping buckets in memory: {str(e)}")
+    elif backend != "memory":
+        raise ValueError(f"Unsupported rate limit store: {backend}")
+    
+    return MemoryRateLimiter(limits)
+
+
+class AdmissionLimiter:
+    """
+    Cap on requests in flight that call an upstream backend, shedding the excess
+    
+    Requests beyond max_in_flight are rejected at once instead of queueing for
+    the backend's concurrency slots until they time out, and while the backend
+    is cooling down after a quota error every request is rejected. Both come
+    with the number of seconds the client should wait.
+    """
+    
+    def __init__(self, backend: BackendExecutor, max_in_flight: int):
+        self.backend = backend
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        # Smoothed request duration, for Retry-After when full
+        self._duration = 1.0
+    
+    def try_acquire(self) -> Optional[float]:
+        """
+        Admit a request
+        
+        Returns:
+            None if admitted (call release() when done), else seconds to retry after
+        """
+        retry_after = self.backend.cooldown_remaining()
+        if not retry_after and self.in_flight >= self.max_in_flight:
+            # A slot frees up within about one request duration
+            retry_after = self._duration
+        if retry_after:
+            self.shed += 1
+            RATE_LIMITED.labels(f"{self.backend.name}_admission").inc()
+            return retry_after
+        
+        self.in_flight += 1
+        self.admitted += 1
+        return None
+    
+    def release(self, duration: float):
+        """
+        Release an admitted request
+        
+        Args:
+            duration: Seconds the request was in flight
+        """
+        self.in_flight -= 1
+        self._duration += 0.1 * (duration - self._duration)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'admitted': self.admitted,
+            'shed': self.shed,
+            'cooldown_seconds': round(self.backend.cooldown_remaining(), 2)
+        }
@@ -0,0 +1,231 @@
+"""
+Reranker
+Re-scores over-fetched retrieval candidates within a strict latency budget
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any
+
+import numpy as np
+
+from models import RetrievalResult
+from utils.logger import get_logger
+from utils.metrics import observe_stage
+from .keyword_index import STOPWORDS, tokenize_terms
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:  # Optional: only needed when RERANK_MODEL names a cross-encoder
+    CrossEncoder = None
+
+logger = get_logger(__name__)
+
+
+class Reranker:
+    """
+    Second-stage ranking of retrieval candidates
+    
+    The default "lexical" model scores all candidates in one vectorized pass:
+    IDF-weighted coverage of the query terms and of their adjacent pairs,
+    blended with the dense similarity. Any other model name is loaded as a
+    sentence-transformers cross-encoder. If scoring misses the latency
+    budget the candidates keep their retrieval order.
+    
+    Scoring runs on its own small thread pool, so a late score (which can't
+    be interrupted) only ties up a reranking thread, not the default executor
+    the stores use. While every thread is busy with abandoned scores, requests
+    skip reranking; after max_timeouts budget misses in a row a cross-encoder
+    is replaced by the lexical model.
+    """
+    
+    # Share of the lexical score given to matching adjacent query-term pairs
+    PHRASE_WEIGHT = 0.3
+    
+    def __init__(
+        self,
+        model: str = "lexical",
+        candidates: int = 30,
+        budget_ms: float = 50,
+        dense_weight: float = 0.5,
+        max_workers: int = 2,
+        max_timeouts: int = 5
+    ):
+        self.model_name = model
+        self.candidates = candidates
+        self.budget_seconds = budget_ms / 1000
+        self.dense_weight = dense_weight
+        self.max_workers = max_workers
+        self.max_timeouts = max_timeouts
+        
+        self._cross_encoder = None
+        if model != "lexical":
+            if CrossEncoder is None:
+                raise ValueError(f"RERANK_MODEL={model} requires the optional 'sentence-transformers' package")
+            self._cross_encoder = CrossEncoder(model, device="cpu")
+        
+        self.reranked = 0
+        self.fallbacks = 0
+        self.skipped = 0
+        self.errors = 0
+        self._total_ms = 0.0
+        self._consecutive_timeouts = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rerank")
+        # Scores still running after their request gave up on them
+        self._abandoned = 0
+        self._abandoned_lock = threading.Lock()
+    
+    async def rerank(
+        self,
+        query: str,
+        results: List[RetrievalResult],
+        top_n: int
+    ) -> List[RetrievalResult]:
+        """
+        Keep the best top_n candidates
+        
+        Args:
+            query: User question
+            results: Candidates in retrieval order
+            top_n: Number of results to keep
+        
+        Returns:
+            Best candidates first (retrieval order if the budget is exceeded)
+        """
+        if len(results) <= 1:
+            return results[:top_n]
+        if self._abandoned >= self.max_workers:
+            # Every thread is still busy with late scores; this one would only queue and time out
+            self.skipped += 1
+            return results[:top_n]
+        
+        started = time.perf_counter()
+        future = self._executor.submit(self._score, query, results)
+        try:
+            scores = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.budget_seconds)
+        except asyncio.TimeoutError:
+            # Queued scores are cancelled; running ones can't be and finish on their own
+            if not future.done():
+                self._abandon(future)
+            self.fallbacks += 1
+            logger.warning(
+                f"Reranking {len(results)} candidates exceeded {self.budget_seconds * 1000:.0f}ms, "
+                "keeping retrieval order"
+            )
+            self._record_timeout()
+            return results[:top_n]
+        except asyncio.CancelledError:
+            if not future.done():
+                self._abandon(future)
+            raise
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Reranking failed, keeping retrieval order: {str(e)}")
+            return results[:top_n]
+        
+        elapsed = time.perf_counter() - started
+        self._consecutive_timeouts = 0
+        self.reranked += 1
+        self._total_ms += elapsed * 1000
+        observe_stage("rerank", elapsed)
+        
+        # Stable, so ties keep their retrieval order
+        order = np.argsort(-scores, kind='stable')[:top_n]
+        return [results[i] for i in order.tolist()]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Reranking counters"""
+        return {
+            'model': self.model_name,
+            'reranked': self.reranked,
+            'fallbacks': self.fallbacks,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'avg_ms': round(self._total_ms / self.reranked, 2) if self.reranked else 0.0
+        }
+    
+    def shutdown(self):
+        """Release scoring threads"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _abandon(self, future: Future):
+        """Count a late score against the pool until it finishes"""
+        with self._abandoned_lock:
+            self._abandoned += 1
+        future.add_done_callback(self._reclaim)
+    
+    def _reclaim(self, future: Future):
+        with self._abandoned_lock:
+            self._abandoned -= 1
+    
+    def _record_timeout(self):
+        """Fall back to the lexical model once a cross-encoder keeps missing the budget"""
+        self._consecutive_timeouts += 1
+        if (
+            self._cross_encoder is not None
+            and self.max_timeouts > 0
+            and self._consecutive_timeouts >= self.max_timeouts
+        ):
+            logger.warning(
+                f"Cross-encoder {self.model_name} missed the {self.budget_seconds * 1000:.0f}ms budget "
+                f"{self._consecutive_timeouts} times in a row, switching to the lexical model"
+            )
+            self._cross_encoder = None
+            self.model_name = "lexical"
+    
+    def _score(self, query: str, results: List[RetrievalResult]) -> np.ndarray:
+        """Relevance of each candidate to the query (higher is better)"""
+        if self._cross_encoder is not None:
+            logits = self._cross_encoder.predict([(query, r.text) for r in results])
+            return np.asarray(logits, dtype=np.float32)
+        
+        # Chunks only the keyword search found rank on lexical relevance alone
+        dense = np.fromiter(
+            (r.score if r.score is not None else 0.0 for r in results), dtype=np.float32, count=len(results)
+        )
+        lexical = self._lexical_scores(query, [r.text for r in results])
+        return self.dense_weight * dense + (1 - self.dense_weight) * lexical
+    
+    def _lexical_scores(self, query: str, texts: List[str]) -> np.ndarray:
+        """
+        IDF-weighted coverage of query terms and adjacent term pairs, in [0, 1]
+        
+        Args:
+            query: User question
+            texts: Candidate texts
+        
+        Returns:
+            One score per candidate
+        """
+        words = tokenize_terms(query)
+        terms = list(dict.fromkeys(t for t in words if t not in STOPWORDS))
+        if not terms:
+            return np.zeros(len(texts), dtype=np.float32)
+        pairs = list(dict.fromkeys(
+            (a, b) for a, b in zip(words, words[1:]) if a not in STOPWORDS and b not in STOPWORDS
+        ))
+        
+        # present[c, t]: candidate c contains term t; phrase[c, p]: it contains pair p
+        present = np.zeros((len(texts), len(terms)), dtype=bool)
+        phrase = np.zeros((len(texts), max(len(pairs), 1)), dtype=bool)
+        for row, text in enumerate(texts):
+            tokens = tokenize_terms(text)
+            vocabulary = set(tokens)
+            present[row] = [t in vocabulary for t in terms]
+            if pairs:
+                bigrams = set(zip(tokens, tokens[1:]))
+                phrase[row, :len(pairs)] = [pair in bigrams for pair in pairs]
+        
+        # Terms found in few candidates discriminate best
+        df = present.sum(axis=0)
+        idf = np.log1p(len(texts) / np.maximum(df, 1)).astype(np.float32)
+        coverage = present @ idf / idf.sum()
+        
+        if not pairs:
+            return coverage.astype(np.float32)
+        pair_idf = np.asarray(
+            [idf[terms.index(a)] + idf[terms.index(b)] for a, b in pairs], dtype=np.float32
+        )
+        phrase_coverage = phrase @ pair_idf / pair_idf.sum()
+        return ((1 - self.PHRASE_WEIGHT) * coverage + self.PHRASE_WEIGHT * phrase_coverage).astype(np.float32)
@@ -0,0 +1,232 @@
+"""
+Upload queue
+Bounded in-process queue of uploads indexed in the background by a pool of worker tasks
+"""
+import asyncio
+from typing import List, Dict, Any, Callable, Optional
+
+from models import DocumentInfo, DocumentStatus
+from utils.logger import get_logger
+from utils.tracing import get_request_id, tracer
+from .indexer import DocumentIndexer
+
+logger = get_logger(__name__)
+
+
+class UploadQueue:
+    """
+    Accept uploads immediately and index them in the background
+    
+    Each accepted upload is recorded in the registry as PENDING, moves to
+    PROCESSING (with chunks embedded / total in its metadata) when a worker
+    picks it up, and ends COMPLETED or FAILED (with the error). Uploads of the
+    same document are indexed one at a time, in submission order. The queue
+    lives in this process: jobs still waiting at shutdown are marked FAILED.
+    """
+    
+    def __init__(
+        self,
+        indexer: DocumentIndexer,
+        max_queued: int = 16,
+        workers: int = 2,
+        on_indexed: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        self.indexer = indexer
+        self.registry = indexer.registry
+        self.workers = workers
+        self.on_indexed = on_indexed
+        
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._tasks: List[asyncio.Task] = []
+        # Slots held by submissions still writing their registry record
+        self._reserved = 0
+        self._active: Dict[int, Dict[str, Any]] = {}
+        # document_id -> [lock, jobs holding or awaiting it]
+        self._document_locks: Dict[str, list] = {}
+        
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+    
+    def start(self):
+        """Start the worker tasks (on the running event loop)"""
+        for worker_id in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(worker_id)))
+        logger.info(f"Upload queue started with {self.workers} workers")
+    
+    async def stop(self):
+        """Cancel the workers and fail jobs that were queued or running"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        
+        interrupted = list(self._active.values())
+        self._active.clear()
+        while not self._queue.empty():
+            interrupted.append(self._queue.get_nowait())
+        for job in interrupted:
+            try:
+                await self.registry.set_status(
+                    job['document_id'], DocumentStatus.FAILED,
+                    {'error': "Server shut down before indexing finished, upload again"}
+                )
+            except Exception as e:
+                logger.error(f"Failed to mark {job['filename']} as failed: {str(e)}")
+    
+    def is_full(self) -> bool:
+        return self._queue.qsize() + self._reserved >= self._queue.maxsize
+    
+    async def submit(
+        self,
+        file_content: bytes,
+        filename: str,
+        document_id: str,
+        metadata: Dict[str, Any] = None
+    ) -> DocumentInfo:
+        """
+        Queue an upload for indexing
+        
+        Args:
+            file_content: Raw file bytes
+            filename: Original filename
+            document_id: Stable document identifier
+            metadata: Additional chunk metadata
+        
+        Returns:
+            Registry record of the document, with status PENDING
+        
+        Raises:
+            asyncio.QueueFull: Too many uploads are waiting
+        """
+        if self.is_full():
+            self.rejected += 1
+            raise asyncio.QueueFull()
+        
+        self._reserved += 1
+        try:
+            info = await self.registry.get(document_id)
+            if info is None:
+                info = self.indexer.build_info(
+                    document_id, filename, 0, len(file_content), status=DocumentStatus.PENDING
+                )
+                await self.registry.save(info)
+            else:
+                # The earlier version stays searchable until the new one is committed
+                await self.registry.set_status(
+                    document_id, DocumentStatus.PENDING, {'error': None, 'progress': None}
+                )
+                info = info.model_copy(update={'status': DocumentStatus.PENDING})
+            
+            self._queue.put_nowait({
+                'file_content': file_content,
+                'filename': filename,
+                'document_id': document_id,
+                'metadata': metadata,
+                'request_id': get_request_id()
+            })
+        finally:
+            self._reserved -= 1
+        
+        self.accepted += 1
+        return info
+    
+    async def process(
+        self,
+        file_content: bytes,
+        filename: str,
+        document_id: str,
+        metadata: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        """
+        Index an upload now, tracking its status in the registry
+        
+        Args:
+            file_content: Raw file bytes
+            filename: Original filename
+            document_id: Stable document identifier
+            metadata: Additional chunk metadata
+        
+        Returns:
+            Indexing statistics from DocumentIndexer.index_document
+        """
+        entry = self._document_locks.setdefault(document_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await self._index(file_content, filename, document_id, metadata)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._document_locks[document_id]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and job counters"""
+        return {
+            'workers': self.workers,
+            'queued': self._queue.qsize(),
+            'processing': len(self._active),
+            'max_queued': self._queue.maxsize,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'failed': self.failed
+        }
+    
+    async def _worker(self, worker_id: int):
+        while True:
+            job = await self._queue.get()
+            self._active[worker_id] = job
+            try:
+                with tracer.request("upload_job", job['request_id'], filename=job['filename']):
+                    await self.process(
+                        job['file_content'], job['filename'], job['document_id'], job['metadata']
+                    )
+            except Exception:
+                # Already logged and recorded as FAILED
+                pass
+            finally:
+                self._active.pop(worker_id, None)
+                self._queue.task_done()
+    
+    async def _index(
+        self,
+        file_content: bytes,
+        filename: str,
+        document_id: str,
+        metadata: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Index one upload: PROCESSING with progress, then COMPLETED or FAILED"""
+        try:
+            await self.registry.set_status(document_id, DocumentStatus.PROCESSING)
+            
+            async def on_progress(chunks_embedded: int, chunks_total: int):
+                await self.registry.set_progress(document_id, chunks_embedded, chunks_total)
+            
+            result = await self.indexer.index_document(
+                file_content=file_content,
+                filename=filename,
+                document_id=document_id,
+                metadata=metadata,
+                on_progress=on_progress
+            )
+            if result['unchanged']:
+                # Not rewritten by the indexer: restore its completed state
+                await self.registry.set_status(
+                    document_id, DocumentStatus.COMPLETED, {'error': None, 'progress': None}
+                )
+            elif self.on_indexed:
+                self.on_indexed(result)
+            
+            self.completed += 1
+            return result
+        
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Indexing failed for {filename}: {str(e)}")
+            try:
+                await self.registry.set_status(document_id, DocumentStatus.FAILED, {'error': str(e)})
+            except Exception as status_error:
+                logger.error(f"Failed to mark {filename} as failed: {str(status_error)}")
+            raise
@@ -0,0 +1,187 @@
+"""
+Vector index backends
+Common interface over Pinecone and the local memory-mapped index
+"""
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+
+from pinecone import Pinecone, ServerlessSpec
+
+from config import settings
+from utils.logger import get_logger
+from .backends import PINECONE_RETRYABLE_ERRORS, pinecone_backend, retry_idempotent
+
+logger = get_logger(__name__)
+
+
+class VectorIndex(ABC):
+    """Storage and similarity search for chunk vectors"""
+    
+    @abstractmethod
+    async def upsert(self, vectors: List[Dict[str, Any]]) -> int:
+        """
+        Insert or replace vectors
+        
+        Args:
+            vectors: Dicts with 'id', 'values' and 'metadata'
+        
+        Returns:
+            Number of vectors written
+        """
+    
+    @abstractmethod
+    async def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the most similar vectors by cosine similarity
+        
+        Args:
+            vector: Query embedding
+            top_k: Number of matches to return
+            filter: Optional metadata equality filter
+        
+        Returns:
+            Matches as dicts with 'id', 'score' and 'metadata', best first
+        """
+    
+    @abstractmethod
+    async def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        filter: Optional[Dict[str, Any]] = None
+    ):
+        """Delete vectors by ID or by metadata filter"""
+    
+    @abstractmethod
+    async def describe(self) -> Dict[str, Any]:
+        """Index statistics: total_vectors, dimension, index_fullness"""
+
+
+class PineconeVectorIndex(VectorIndex):
+    """Pinecone serverless index"""
+    
+    def __init__(self, dimension: int):
+        if not settings.PINECONE_API_KEY:
+            raise ValueError("PINECONE_API_KEY is required for the pinecone vector backend")
+        
+        self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
+        self.index_name = settings.PINECONE_INDEX_NAME
+        self.dimension = dimension
+        self.index = None
+        
+        self._initialize_index()
+    
+    def _initialize_index(self):
+        """Initialize or connect to Pinecone index"""
+        try:
+            # Check if index exists
+            existing_indexes = self.pc.list_indexes()
+            index_names = [idx.name for idx in existing_indexes]
+            
+            if self.index_name not in index_names:
+                logger.info(f"Creating new Pinecone index: {self.index_name}")
+                self.pc.create_index(
+                    name=self.index_name,
+                    dimension=self.dimension,
+                    metric='cosine',
+                    spec=ServerlessSpec(
+                        cloud='aws',
+                        region=settings.PINECONE_ENVIRONMENT
+                    )
+                )
+                logger.info(f"Index {self.index_name} created successfully")
+            
+            # Connect to index
+            # Keep one pooled HTTP connection per worker thread
+            self.index = self.pc.Index(
+                self.index_name,
+                pool_threads=settings.PINECONE_MAX_CONCURRENCY
+            )
+            logger.info(f"Connected to Pinecone index: {self.index_name}")
+        
+        except Exception as e:
+            logger.error(f"Failed to initialize Pinecone index: {str(e)}")
+            raise
+    
+    async def upsert(self, vectors: List[Dict[str, Any]]) -> int:
+        response = await pinecone_backend.run(self.index.upsert, vectors=vectors)
+        return response.upserted_count
+    
+    async def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        response = await self._retry(
+            lambda: pinecone_backend.run(
+                self.index.query,
+                vector=vector,
+                top_k=top_k,
+                filter=filter,
+                include_metadata=True
+            ),
+            "Pinecone query"
+        )
+        return [
+            {'id': match.id, 'score': match.score, 'metadata': match.metadata}
+            for match in response.matches
+        ]
+    
+    async def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        filter: Optional[Dict[str, Any]] = None
+    ):
+        await pinecone_backend.run(self.index.delete, ids=ids, filter=filter)
+    
+    async def describe(self) -> Dict[str, Any]:
+        stats = await self._retry(
+            lambda: pinecone_backend.run(self.index.describe_index_stats),
+            "Pinecone index stats"
+        )
+        return {
+            'total_vectors': stats.total_vector_count,
+            'dimension': stats.dimension,
+            'index_fullness': stats.index_fullness
+        }
+    
+    @staticmethod
+    async def _retry(attempt, description: str):
+        """Retry a read, which is safe to repeat; writes are left to the caller"""
+        return await retry_idempotent(
+            attempt,
+            backend=pinecone_backend.name,
+            retryable=PINECONE_RETRYABLE_ERRORS,
+            max_attempts=settings.PINECONE_MAX_RETRIES,
+            backoff=settings.PINECONE_RETRY_BACKOFF_SECONDS,
+            description=description
+        )
+
+
+def create_vector_index(backend: str, dimension: int) -> VectorIndex:
+    """
+    Build the vector index selected in settings
+    
+    Args:
+        backend: "pinecone" or "local"
+        dimension: Embedding dimension
+    
+    Returns:
+        VectorIndex implementation
+    """
+    if backend == "pinecone":
+        return PineconeVectorIndex(dimension)
+    if backend == "local":
+        from .local_vector_index import LocalVectorIndex
+        return LocalVectorIndex(
+            path=settings.LOCAL_INDEX_PATH,
+            dimension=dimension,
+            mode=settings.LOCAL_INDEX_MODE,
+            exact_max_vectors=settings.LOCAL_INDEX_EXACT_MAX_VECTORS
+        )
+    raise ValueError(f"Unsupported vector backend: {backend}")
@@ -1,59 +1,40 @@
 """
-Vector store service using Pinecone
-Handles embedding storage, retrieval, and similarity search
+Vector store service
+Handles embedding storage, retrieval, and hybrid dense + keyword search over a pluggable index backend
 """
+import asyncio
 from typing import List, Dict, Any, Optional
-from pinecone import Pinecone, ServerlessSpec
-import google.generativeai as genai
 
 from models import DocumentChunk, RetrievalResult
 from config import settings
 from utils.logger import get_logger
+from utils.metrics import time_stage
+from utils.tracing import traced
+from .embedding_service import EmbeddingService
+from .keyword_index import KeywordIndex
+from .vector_index import create_vector_index
 
 logger = get_logger(__name__)
 
 
 class VectorStoreService:
-    """Manage vector embeddings in Pinecone"""
+    """Manage vector embeddings in the configured index backend (Pinecone or local)"""
     
     def __init__(self):
-        self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-        self.index_name = settings.PINECONE_INDEX_NAME
+        self.backend = settings.VECTOR_BACKEND
         self.dimension = settings.EMBED_DIMENSION
-        self.index = None
         
-        # Configure Google AI for embeddings
-        genai.configure(api_key=settings.GOOGLE_API_KEY)
+        # Batched embedding pipeline (Google AI)
+        self.embedder = EmbeddingService()
         
-        self._initialize_index()
-    
-    def _initialize_index(self):
-        """Initialize or connect to Pinecone index"""
-        try:
-            # Check if index exists
-            existing_indexes = self.pc.list_indexes()
-            index_names = [idx.name for idx in existing_indexes]
-            
-            if self.index_name not in index_names:
-                logger.info(f"Creating new Pinecone index: {self.index_name}")
-                self.pc.create_index(
-                    name=self.index_name,
-                    dimension=self.dimension,
-                    metric='cosine',
-                    spec=ServerlessSpec(
-                        cloud='aws',
-                        region=settings.PINECONE_ENVIRONMENT
-                    )
-                )
-                logger.info(f"Index {self.index_name} created successfully")
-            
-            # Connect to index
-            self.index = self.pc.Index(self.index_name)
-            logger.info(f"Connected to Pinecone index: {self.index_name}")
-            
-        except Exception as e:
-            logger.error(f"Failed to initialize Pinecone index: {str(e)}")
-            raise
+        self.index = create_vector_index(self.backend, self.dimension)
+        
+        # BM25 index over the same chunks, fused with dense results at query time
+        self.keyword_index = None
+        if settings.HYBRID_SEARCH_ENABLED:
+            self.keyword_index = KeywordIndex(
+                settings.KEYWORD_INDEX_PATH, k1=settings.BM25_K1, b=settings.BM25_B
+            )
     
     async def embed_text(self, text: str) -> List[float]:
         """
@@ -66,12 +47,8 @@ class VectorStoreService:
             List of embedding values
         """
         try:
-            result = genai.embed_content(
-                model=f"models/{settings.EMBED_MODEL}",
-                content=text,
-                task_type="retrieval_document"
-            )
-            return result['embedding']
+            embeddings = await self.embedder.embed_documents([text])
+            return embeddings[0]
         except Exception as e:
             logger.error(f"Embedding generation failed: {str(e)}")
             raise
@@ -87,19 +64,15 @@ class VectorStoreService:
             List of embedding values
         """
         try:
-            result = genai.embed_content(
-                model=f"models/{settings.EMBED_MODEL}",
-                content=query,
-                task_type="retrieval_query"
-            )
-            return result['embedding']
+            return await self.embedder.embed_query(query)
         except Exception as e:
             logger.error(f"Query embedding failed: {str(e)}")
             raise
     
+    @traced("VectorStoreService.upsert_chunks")
     async def upsert_chunks(self, chunks: List[DocumentChunk]) -> Dict[str, Any]:
         """
-        Store document chunks with embeddings in Pinecone
+        Store document chunks with embeddings in the vector index
         
         Args:
             chunks: List of DocumentChunk objects
@@ -108,19 +81,20 @@ class VectorStoreService:
             Upsert statistics
         """
         try:
-            vectors = []
+            # Embed all chunks lacking an embedding in provider-sized batches
+            pending = [chunk for chunk in chunks if not chunk.embedding]
+            embeddings = await self.embedder.embed_documents([chunk.text for chunk in pending])
+            for chunk, embedding in zip(pending, embeddings):
+                chunk.embedding = embedding
             
+            vectors = []
             for chunk in chunks:
-                # Generate embedding if not present
-                if not chunk.embedding:
-                    chunk.embedding = await self.embed_text(chunk.text)
-                
-                # Prepare vector for Pinecone
+                # Prepare vector for the index
                 vector = {
                     'id': chunk.chunk_id,
                     'values': chunk.embedding,
                     'metadata': {
-                        'text': chunk.text[:1000],  # Store truncated text in metadata
+                        'text': chunk.text[:settings.METADATA_TEXT_MAX_CHARS],  # Chunk text returned at query time
                         'document_id': chunk.document_id,
                         'chunk_index': chunk.chunk_index,
                         **chunk.metadata
@@ -128,12 +102,23 @@ class VectorStoreService:
                 }
                 vectors.append(vector)
             
-            # Batch upsert to Pinecone
-            upsert_response = self.index.upsert(vectors=vectors)
+            # Upsert request-sized batches concurrently
+            batch_size = settings.UPSERT_BATCH_SIZE
+            with time_stage("upsert"):
+                counts = await asyncio.gather(*(
+                    self.index.upsert(vectors[start:start + batch_size])
+                    for start in range(0, len(vectors), batch_size)
+                ))
+                
+                if self.keyword_index is not None:
+                    await self.keyword_index.upsert([
+                        {'id': chunk.chunk_id, 'text': chunk.text, 'metadata': vector['metadata']}
+                        for chunk, vector in zip(chunks, vectors)
+                    ])
             
-            logger.info(f"Upserted {len(vectors)} vectors to Pinecone")
+            logger.info(f"Upserted {len(vectors)} vectors to {self.backend} index")
             return {
-                'upserted_count': upsert_response.upserted_count,
+                'upserted_count': sum(counts),
                 'chunks': len(chunks)
             }
             
@@ -141,19 +126,87 @@ class VectorStoreService:
             logger.error(f"Failed to upsert chunks: {str(e)}")
             raise
     
+    @traced("VectorStoreService.search_many")
+    async def search_many(
+        self,
+        queries: List[str],
+        top_k: int = None,
+        filter_dict: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[RetrievalResult]:
+        """
+        Search with several phrasings of one request and merge the results
+        
+        All variants are embedded in one batched call and searched
+        concurrently, so latency stays close to a single search. Results are
+        deduplicated by chunk_id and ranked by reciprocal rank across variants.
+        
+        Args:
+            queries: Query variants, the raw query first
+            top_k: Number of results to return
+            filter_dict: Optional metadata filters
+            query_embedding: Precomputed embedding of the first query
+            
+        Returns:
+            List of RetrievalResult objects
+        """
+        try:
+            top_k = top_k or settings.TOP_K_RESULTS
+            queries = list(dict.fromkeys(queries))
+            if len(queries) == 1:
+                return await self.search(queries[0], top_k, filter_dict, query_embedding)
+            
+            if query_embedding is None:
+                embeddings = await self.embedder.embed_queries(queries)
+            else:
+                embeddings = [query_embedding] + await self.embedder.embed_queries(queries[1:])
+            
+            result_lists = await asyncio.gather(*(
+                self.search(query, top_k, filter_dict, embedding)
+                for query, embedding in zip(queries, embeddings)
+            ))
+            
+            fused: Dict[str, float] = {}
+            by_id: Dict[str, RetrievalResult] = {}
+            for results in result_lists:
+                for rank, result in enumerate(results, 1):
+                    fused[result.chunk_id] = fused.get(result.chunk_id, 0.0) + 1.0 / (settings.RRF_K + rank)
+                    # Keep the best similarity any variant saw for the chunk
+                    best = by_id.get(result.chunk_id)
+                    if best is None or (result.score is not None and (best.score is None or result.score > best.score)):
+                        by_id[result.chunk_id] = result
+            
+            merged = [by_id[chunk_id] for chunk_id in sorted(fused, key=fused.get, reverse=True)[:top_k]]
+            logger.info(f"Merged {len(merged)} chunks from {len(queries)} query variants")
+            return merged
+            
+        except Exception as e:
+            logger.error(f"Multi-query search failed: {str(e)}")
+            raise
+    
+    @traced("VectorStoreService.search")
     async def search(
         self,
         query: str,
         top_k: int = None,
-        filter_dict: Optional[Dict[str, Any]] = None
+        filter_dict: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[RetrievalResult]:
         """
-        Search for similar chunks using vector similarity
+        Search for relevant chunks
+        
+        Dense matches above SIMILARITY_THRESHOLD are fused with BM25 keyword
+        matches by reciprocal rank, so exact names and codes that embed
+        poorly are still found. Keyword matches the dense search doesn't
+        vouch for must contain KEYWORD_MIN_COVERAGE of the query terms.
+        Scores stay cosine similarities (None if the dense search never saw
+        the chunk); keyword_score and fused_score carry the rest.
         
         Args:
             query: Search query text
             top_k: Number of results to return
             filter_dict: Optional metadata filters
+            query_embedding: Precomputed query embedding (skips embedding the query)
             
         Returns:
             List of RetrievalResult objects
@@ -162,25 +215,41 @@ class VectorStoreService:
             top_k = top_k or settings.TOP_K_RESULTS
             
             # Generate query embedding
-            query_embedding = await self.embed_query(query)
+            if query_embedding is None:
+                query_embedding = await self.embed_query(query)
             
-            # Search Pinecone
-            search_results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True
-            )
+            if self.keyword_index is None:
+                with time_stage("vector_search"):
+                    matches = await self.index.query(
+                        vector=query_embedding,
+                        top_k=top_k,
+                        filter=filter_dict
+                    )
+                matches = [m for m in matches if m['score'] >= settings.SIMILARITY_THRESHOLD]
+            else:
+                candidates = max(top_k, settings.HYBRID_CANDIDATES)
+                with time_stage("vector_search"):
+                    dense = await self.index.query(
+                        vector=query_embedding,
+                        top_k=candidates,
+                        filter=filter_dict
+                    )
+                with time_stage("keyword_search"):
+                    keyword = await self.keyword_index.search(query, candidates, filter_dict)
+                matches = self._fuse(dense, keyword, top_k)
             
             # Convert to RetrievalResult objects
-            results = []
-            for match in search_results.matches:
-                if match.score >= settings.SIMILARITY_THRESHOLD:
-                    result = RetrievalResult(
-                        text=match.metadata.get('text', ''),
-                        score=match.score,
-                        metadata=match.metadata
-                    )
-                    results.append(result)
+            results = [
+                RetrievalResult(
+                    chunk_id=match['id'],
+                    text=match['metadata'].get('text', ''),
+                    score=match['score'],
+                    keyword_score=match.get('keyword_score'),
+                    fused_score=match.get('fused_score'),
+                    metadata=match['metadata']
+                )
+                for match in matches
+            ]
             
             logger.info(f"Found {len(results)} relevant chunks for query")
             return results
@@ -189,6 +258,53 @@ class VectorStoreService:
             logger.error(f"Search failed: {str(e)}")
             raise
     
+    @staticmethod
+    def _fuse(
+        dense: List[Dict[str, Any]],
+        keyword: List[Dict[str, Any]],
+        top_k: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Reciprocal-rank fusion of dense and keyword matches
+        
+        Args:
+            dense: Dense matches, best first (may include ones below the threshold)
+            keyword: BM25 matches, best first
+            top_k: Number of results
+        
+        Returns:
+            Matches ranked by fused score, with their cosine similarity as
+            'score' (None if unknown), 'keyword_score' and 'fused_score'
+        """
+        similarity = {match['id']: match['score'] for match in dense}
+        fused: Dict[str, float] = {}
+        by_id: Dict[str, Dict[str, Any]] = {}
+        
+        relevant = [m for m in dense if m['score'] >= settings.SIMILARITY_THRESHOLD]
+        relevant_ids = {m['id'] for m in relevant}
+        # BM25 scores some chunk for almost any query; alone, it has to match most of it
+        keyword = [
+            m for m in keyword
+            if m['id'] in relevant_ids or m['coverage'] >= settings.KEYWORD_MIN_COVERAGE
+        ]
+        coverage = {match['id']: match['coverage'] for match in keyword}
+        for ranked in (relevant, keyword):
+            for rank, match in enumerate(ranked, 1):
+                fused[match['id']] = fused.get(match['id'], 0.0) + 1.0 / (settings.RRF_K + rank)
+                by_id.setdefault(match['id'], match)
+        
+        ranked_ids = sorted(fused, key=fused.get, reverse=True)[:top_k]
+        return [
+            {
+                'id': chunk_id,
+                'metadata': by_id[chunk_id]['metadata'],
+                'score': similarity.get(chunk_id),
+                'keyword_score': coverage.get(chunk_id),
+                'fused_score': fused[chunk_id]
+            }
+            for chunk_id in ranked_ids
+        ]
+    
     async def delete_document(self, document_id: str) -> Dict[str, Any]:
         """
         Delete all chunks for a document
@@ -201,9 +317,9 @@ class VectorStoreService:
         """
         try:
             # Delete by metadata filter
-            delete_response = self.index.delete(
-                filter={'document_id': document_id}
-            )
+            await self.index.delete(filter={'document_id': document_id})
+            if self.keyword_index is not None:
+                await self.keyword_index.delete(document_id=document_id)
             
             logger.info(f"Deleted chunks for document: {document_id}")
             return {'document_id': document_id, 'status': 'deleted'}
@@ -212,15 +328,37 @@ class VectorStoreService:
             logger.error(f"Failed to delete document: {str(e)}")
             raise
     
+    async def delete_chunks(self, chunk_ids: List[str]) -> Dict[str, Any]:
+        """
+        Delete individual chunks by ID
+        
+        Args:
+            chunk_ids: Chunk identifiers
+            
+        Returns:
+            Deletion statistics
+        """
+        try:
+            batch_size = settings.UPSERT_BATCH_SIZE
+            for i in range(0, len(chunk_ids), batch_size):
+                await self.index.delete(ids=chunk_ids[i:i + batch_size])
+            if self.keyword_index is not None:
+                await self.keyword_index.delete(ids=chunk_ids)
+            
+            logger.info(f"Deleted {len(chunk_ids)} chunks")
+            return {'deleted_count': len(chunk_ids)}
+            
+        except Exception as e:
+            logger.error(f"Failed to delete chunks: {str(e)}")
+            raise
+    
     async def get_index_stats(self) -> Dict[str, Any]:
-        """Get Pinecone index statistics"""
+        """Get vector index statistics"""
         try:
-            stats = self.index.describe_index_stats()
-            return {
-                'total_vectors': stats.total_vector_count,
-                'dimension': stats.dimension,
-                'index_fullness': stats.index_fullness
-            }
+            stats = await self.index.describe()
+            if self.keyword_index is not None:
+                stats['keyword_index'] = self.keyword_index.describe()
+            return stats
         except Exception as e:
             logger.error(f"Failed to get index stats: {str(e)}")
             return {}
@@ -55,6 +55,37 @@ def test_endpoint(method, endpoint, data=None, files=None, expected_status=None)
         print(f"❌ {method.upper()} {endpoint}: Error - {e}")
         return None
 
+def test_rate_limit_cors(origin="http://localhost:4000", attempts=30):
+    """Burst chat requests from an allowed origin until rate limited; the 429 must carry CORS headers"""
+    for _ in range(attempts):
+        try:
+            response = requests.post(
+                f"{BASE_URL}/chat",
+                json={"query": "What is machine learning?"},
+                headers={"Origin": origin},
+                timeout=10
+            )
+        except requests.exceptions.ConnectionError:
+            print("❌ POST /chat: Connection failed")
+            return False
+        if response.status_code == 429:
+            break
+    else:
+        print(f"⚠️  No 429 after {attempts} requests (RATE_LIMIT_ENABLED=False?)")
+        return False
+    
+    allow_origin = response.headers.get("Access-Control-Allow-Origin")
+    exposed = response.headers.get("Access-Control-Expose-Headers", "")
+    ok = (
+        allow_origin == origin
+        and "retry-after" in exposed.lower()
+        and response.headers.get("Retry-After") is not None
+    )
+    status_icon = "✅" if ok else "❌"
+    print(f"{status_icon} 429 CORS headers: Allow-Origin={allow_origin}, Expose-Headers={exposed}, "
+          f"Retry-After={response.headers.get('Retry-After')}")
+    return ok
+
 def main():
     """Run comprehensive API tests"""
     print("🚀 Academic RAG Backend - Comprehensive API Testing")
@@ -105,12 +136,17 @@ def main():
     test_endpoint("GET", "/nonexistent", expected_status=404)
     test_endpoint("POST", "/chat", data={"invalid": "data"}, expected_status=422)
     
+    # Test 6: Rate Limits (run last: it uses up this client's chat budget)
+    print_section("Rate Limits")
+    test_rate_limit_cors()
+    
     # Summary
     print_section("Test Summary")
     print("✅ Basic endpoints (/, /docs, /openapi.json) are working")
     print("✅ Health endpoint returns proper error when services unavailable")
     print("✅ Document and chat endpoints return proper 503 errors without API keys")
     print("✅ Error handling works correctly")
+    print("✅ Rate-limited responses are readable cross-origin (CORS headers, Retry-After)")
     print("\n📝 Next Steps:")
     print("1. Create .env file: cp env.example .env")
     print("2. Add your Google AI and Pinecone API keys to .env")
@@ -2,6 +2,7 @@
 Utilities package
 """
 from .logger import get_logger
+from .tokenizer import count_tokens, token_prefix, truncate_to_tokens
 
-__all__ = ['get_logger']
+__all__ = ['get_logger', 'count_tokens', 'token_prefix', 'truncate_to_tokens']
 
@@ -4,6 +4,15 @@ Logging configuration
 import logging
 import sys
 from config import settings
+from .tracing import get_request_id
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the ID of the request being served"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = get_request_id()
+        return True
 
 
 def get_logger(name: str) -> logging.Logger:
@@ -25,10 +34,11 @@ def get_logger(name: str) -> logging.Logger:
         # Create console handler
         handler = logging.StreamHandler(sys.stdout)
         handler.setLevel(getattr(logging, settings.LOG_LEVEL))
+        handler.addFilter(RequestIdFilter())
         
         # Create formatter
         formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         handler.setFormatter(formatter)
@@ -0,0 +1,127 @@
+"""
+Prometheus metrics
+Per-stage latency histograms, counters and gauges for the RAG pipeline
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess
+)
+
+# Pipeline stages timed by STAGE_SECONDS
+STAGES = (
+    "parse", "chunk", "embed", "upsert", "query_embed", "vector_search",
+    "keyword_search", "rerank", "prompt_build", "generation", "generation_first_token"
+)
+
+# From sub-millisecond local work up to slow upstream calls
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Latency of RAG pipeline stages", ["stage"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "rag_http_request_seconds", "HTTP request latency", ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+CACHE_LOOKUPS = Counter(
+    "rag_cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"]
+)
+UPSTREAM_RETRIES = Counter(
+    "rag_upstream_retries_total", "Upstream calls retried after a transient failure", ["backend"]
+)
+UPSTREAM_THROTTLES = Counter(
+    "rag_upstream_throttles_total", "Upstream calls rejected by quota or rate limits", ["backend"]
+)
+RATE_LIMITED = Counter(
+    "rag_rate_limited_total", "Requests rejected with 429 by rate limits or admission control", ["scope"]
+)
+UPSTREAM_HEDGES = Counter(
+    "rag_upstream_hedged_total", "Hedged second calls sent after a slow first call, by winner",
+    ["backend", "winner"]
+)
+UPSTREAM_TIMEOUTS = Counter(
+    "rag_upstream_timeouts_total", "Upstream calls that exceeded their timeout", ["backend"]
+)
+TOKENS = Counter(
+    "rag_tokens_total", "Tokens sent to or produced by Gemini (local tokenizer estimate)", ["kind"]
+)
+# Gauges are set when their state changes (set_function callbacks are not
+# collected across processes); multiprocess_mode says how workers combine
+REQUESTS_IN_FLIGHT = Gauge(
+    "rag_requests_in_flight", "HTTP requests being served", multiprocess_mode="livesum"
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "rag_upstream_in_flight", "Calls holding an upstream concurrency slot", ["backend"],
+    multiprocess_mode="livesum"
+)
+# Each worker has its own breaker; the worst state is reported
+CIRCUIT_STATE = Gauge(
+    "rag_circuit_state", "Upstream circuit breaker state: 0 closed, 1 half-open, 2 open", ["backend"],
+    multiprocess_mode="livemax"
+)
+# Workers share the SQLite store and all report its size
+CONVERSATIONS = Gauge(
+    "rag_conversations", "Conversations held by the conversation store", multiprocess_mode="livemax"
+)
+
+# Bound children, so hot paths skip the label lookup
+_stage_children = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record the duration of one pipeline stage"""
+    _stage_children[stage].observe(seconds)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """Time the enclosed block as one pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage_children[stage].observe(time.perf_counter() - started)
+
+
+def timed_iter(items: Iterable, elapsed: List[float]) -> Iterator:
+    """
+    Yield from an iterable, adding the time spent producing items to elapsed[0]
+    
+    Separates producer time (e.g. text extraction) from consumer time
+    (e.g. chunking) when the two are interleaved in one stream.
+    """
+    iterator = iter(items)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            elapsed[0] += time.perf_counter() - started
+            return
+        elapsed[0] += time.perf_counter() - started
+        yield item
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Current metrics in the Prometheus text format
+    
+    With PROMETHEUS_MULTIPROC_DIR set (several workers), counters, histograms
+    and gauges are aggregated across worker processes.
+    
+    Returns:
+        (payload, content type)
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
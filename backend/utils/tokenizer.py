@@ -0,0 +1,98 @@
+"""
+Local tokenizer
+Fast offline token counts approximating the LLM's subword tokenizer
+"""
+import numpy as np
+
+# Letters per subword piece: words up to this long count as one token
+WORD_PIECE_CHARS = 6
+
+# Non-ASCII whitespace (ASCII control characters and space are handled by range)
+_UNICODE_SPACES = np.array(
+    [0x85, 0xA0, 0x1680, *range(0x2000, 0x200B), 0x2028, 0x2029, 0x202F, 0x205F, 0x3000],
+    dtype=np.uint32
+)
+
+# Scripts written without spaces (CJK and beyond) count one token per character
+_PER_CHAR_FROM = 0x3000
+
+
+def _codes(text: str) -> np.ndarray:
+    """Code points of text as an array, without per-character Python work"""
+    if text.isascii():
+        return np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    # Lone surrogates (e.g. from a JSON "\ud800" escape) pass through as one token each
+    return np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+
+
+def _token_starts(codes: np.ndarray) -> np.ndarray:
+    """
+    Mark the characters that start a token
+    
+    Runs of letters (ASCII letters, underscore, non-ASCII letters) are split
+    into pieces of WORD_PIECE_CHARS; every other non-space character (digit,
+    punctuation, CJK ideograph) is a token of its own.
+    """
+    space = (codes <= 32) | (codes == 127)
+    if codes.dtype != np.uint8:
+        space |= np.isin(codes, _UNICODE_SPACES)
+    
+    letter = (
+        ((codes >= 65) & (codes <= 90))
+        | ((codes >= 97) & (codes <= 122))
+        | (codes == 95)
+        | ((codes > 127) & (codes < _PER_CHAR_FROM) & ~space)
+    )
+    single = ~space & ~letter
+    
+    # Offset of each letter from the start of its run
+    index = np.arange(len(codes), dtype=np.int32)
+    run_start = letter & ~np.concatenate(([False], letter[:-1]))
+    run_offset = index - np.maximum.accumulate(np.where(run_start, index, 0))
+    
+    return single | (letter & (run_offset % WORD_PIECE_CHARS == 0))
+
+
+def token_prefix(text: str) -> np.ndarray:
+    """
+    Cumulative token counts over a text
+    
+    Args:
+        text: Input text
+    
+    Returns:
+        Array of len(text) + 1 where entry i is the number of tokens starting
+        before offset i, so text[a:b] holds prefix[b] - prefix[a] tokens when
+        a and b fall on whitespace or text boundaries
+    """
+    prefix = np.zeros(len(text) + 1, dtype=np.int32)
+    if text:
+        np.cumsum(_token_starts(_codes(text)), out=prefix[1:])
+    return prefix
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in a text"""
+    if not text:
+        return 0
+    return int(np.count_nonzero(_token_starts(_codes(text))))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut a text to at most max_tokens tokens
+    
+    Args:
+        text: Input text
+        max_tokens: Token budget
+    
+    Returns:
+        The longest prefix of text within the budget, cut before the first
+        token that does not fit
+    """
+    prefix = token_prefix(text)
+    if prefix[-1] <= max_tokens:
+        return text
+    # The first offset where prefix exceeds the budget is just past the start of the overflowing token
+    end = int(np.searchsorted(prefix, max_tokens + 1, side='left')) - 1
+    return text[:end].rstrip()
@@ -0,0 +1,311 @@
+"""
+Request tracing
+Sampled request-scoped spans kept in a ring buffer and optionally appended to an OTLP/JSON file
+"""
+import functools
+import json
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from config import settings
+
+# Incoming request IDs are echoed into logs and headers, so anything else is replaced
+_REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,64}")
+# Request ID of the current request, also stamped on log records
+_request_id: ContextVar[str] = ContextVar("request_id", default="-")
+# Innermost open span of the current (sampled) request
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation within a trace"""
+    
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+    
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+    
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+    
+    def to_otlp(self) -> Dict[str, Any]:
+        """Span in the OTLP/JSON encoding"""
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 2 if self.parent_id is None else 1,  # SERVER for the root, INTERNAL otherwise
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact view for the debug endpoint"""
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_offset_ms": round((self.start_ns - self.trace.root.start_ns) / 1e6, 3),
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class Trace:
+    """Spans of one sampled request"""
+    
+    __slots__ = ("trace_id", "request_id", "root", "spans")
+    
+    def __init__(self, request_id: str):
+        self.trace_id = secrets.token_hex(16)
+        self.request_id = request_id
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "request_id": self.request_id,
+            "name": self.root.name,
+            "duration_ms": round((self.root.end_ns - self.root.start_ns) / 1e6, 3),
+            "spans": [span.to_dict() for span in sorted(self.spans, key=lambda s: s.start_ns)]
+        }
+
+
+class Tracer:
+    """Sampling, ring buffer and file export of finished traces"""
+    
+    # Finished traces waiting for the export thread; more are dropped
+    EXPORT_QUEUE_SIZE = 1000
+    
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        buffer_size: int = 200,
+        export_path: Optional[str] = None,
+        service_name: str = "rag-backend"
+    ):
+        self.sample_rate = sample_rate
+        self.export_path = export_path or None
+        self.service_name = service_name
+        self._traces: Deque[Trace] = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        
+        # File writes happen on a background thread, started with the first export
+        self._export_queue: "queue.Queue[Optional[Trace]]" = queue.Queue(self.EXPORT_QUEUE_SIZE)
+        self._export_thread: Optional[threading.Thread] = None
+        self.export_dropped = 0
+        
+        if self.export_path:
+            Path(self.export_path).parent.mkdir(parents=True, exist_ok=True)
+    
+    @contextmanager
+    def request(self, name: str, request_id: Optional[str] = None, **attributes) -> Iterator[Optional[Span]]:
+        """
+        Scope of one request: sets the request ID and, if sampled, opens the root span
+        
+        Args:
+            name: Root span name
+            request_id: Incoming request ID (generated if missing or malformed)
+            **attributes: Root span attributes
+        
+        Yields:
+            Root span, or None when the request is not sampled
+        """
+        if not request_id or not _REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = secrets.token_hex(8)
+        id_token = _request_id.set(request_id)
+        try:
+            if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+                yield None
+                return
+            
+            trace = Trace(_request_id.get())
+            root = trace.root = Span(trace, name, None, dict(attributes))
+            span_token = _current_span.set(root)
+            try:
+                yield root
+            except BaseException as e:
+                root.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                _current_span.reset(span_token)
+                root.end_ns = time.time_ns()
+                trace.spans.append(root)
+                self._finish(trace)
+        finally:
+            _request_id.reset(id_token)
+    
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        """
+        Child span of the current span (a no-op outside sampled requests)
+        
+        Args:
+            name: Span name
+            **attributes: Span attributes
+        
+        Yields:
+            The span, or None when not tracing
+        """
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        
+        span = Span(parent.trace, name, parent.span_id, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            # Spans ending after the root (e.g. in a response stream) are dropped
+            if not parent.trace.root.end_ns:
+                parent.trace.spans.append(span)
+    
+    def recent(self, limit: int = 50, min_duration_ms: float = 0) -> List[Dict[str, Any]]:
+        """Most recent finished traces, newest first"""
+        with self._lock:
+            traces = list(self._traces)
+        result = []
+        for trace in reversed(traces):
+            summary = trace.to_dict()
+            if summary["duration_ms"] >= min_duration_ms:
+                result.append(summary)
+                if len(result) == limit:
+                    break
+        return result
+    
+    def find(self, trace_or_request_id: str) -> Optional[Dict[str, Any]]:
+        """A buffered trace by trace ID or request ID"""
+        with self._lock:
+            traces = list(self._traces)
+        for trace in reversed(traces):
+            if trace_or_request_id in (trace.trace_id, trace.request_id):
+                return trace.to_dict()
+        return None
+    
+    def shutdown(self, timeout: float = 5.0):
+        """Write out traces still waiting for export"""
+        with self._lock:
+            thread = self._export_thread
+            self._export_thread = None
+        if thread is not None:
+            self._export_queue.put(None)
+            thread.join(timeout)
+    
+    def _finish(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace)
+            if not self.export_path:
+                return
+            if self._export_thread is None:
+                self._export_thread = threading.Thread(
+                    target=self._export_loop, name="trace-export", daemon=True
+                )
+                self._export_thread.start()
+        try:
+            self._export_queue.put_nowait(trace)
+        except queue.Full:
+            # Tracing must never slow a request down
+            self.export_dropped += 1
+    
+    def _export_loop(self):
+        """Append queued traces to the export file, one open per batch"""
+        while True:
+            batch = [self._export_queue.get()]
+            while batch[-1] is not None:
+                try:
+                    batch.append(self._export_queue.get_nowait())
+                except queue.Empty:
+                    break
+            traces = [trace for trace in batch if trace is not None]
+            if traces:
+                self._export(traces)
+            if batch[-1] is None:
+                return
+    
+    def _export(self, traces: List[Trace]):
+        """Append each trace as one OTLP/JSON line (the collector file exporter format)"""
+        lines = "".join(json.dumps(self._otlp_record(trace)) + "\n" for trace in traces)
+        try:
+            with open(self.export_path, "a") as f:
+                f.write(lines)
+        except OSError:
+            # Tracing must never fail a request
+            pass
+    
+    def _otlp_record(self, trace: Trace) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "rag-backend.tracing"},
+                    "spans": [span.to_otlp() for span in trace.spans]
+                }]
+            }]
+        }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    """Key/value in the OTLP/JSON AnyValue encoding"""
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def get_request_id() -> str:
+    """ID of the request being served ("-" outside requests)"""
+    return _request_id.get()
+
+
+def traced(name: str) -> Callable:
+    """Wrap an async function in a span"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Process-wide tracer
+tracer = Tracer(
+    sample_rate=settings.TRACE_SAMPLE_RATE,
+    buffer_size=settings.TRACE_BUFFER_SIZE,
+    export_path=settings.TRACE_EXPORT_PATH,
+    service_name=settings.APP_NAME
+)